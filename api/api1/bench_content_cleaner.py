@@ -0,0 +1,136 @@
+"""
+HTML正文提取、模板内容去除与原正则清理的吞吐量和token用量对比
+
+语料为按新闻网站常见结构生成的页面：head中的meta、样式和脚本，导航和页脚，
+正文由带<p>、<br>、<strong>、<a>、<img>和实体的段落组成，部分页面含写法不规范的标签，
+并带有电头署名、分享按钮、空段落、责任编辑、相关新闻列表等模板内容。
+原方式为改写前content_cleaner中的7次正则替换加空白行合并（只去掉html/head/body/article外层标签）；
+boilerplate为正文提取后再经BoilerplateRemover去除模板内容。
+
+用法: python bench_content_cleaner.py --pages 200 --chunk-size 4096
+"""
+import re
+import time
+import random
+import argparse
+
+from boilerplate import BoilerplateRemover
+from content_cleaner import HTMLTextExtractor, extract_paragraphs, extract_text
+from token_estimator import estimate_tokens
+
+SENTENCES = [
+    '澳门特区政府日前公布新一轮旅游推广计划，将围绕国际客源市场拓展、文旅融合产品开发和智慧旅游建设三个方向推出多项措施。',
+    '旅游局表示，今年推广经费较去年增加约{}成，重点投放东南亚和日韩市场。',
+    '业界认为，新计划有助于提升旅客留宿时间和人均消费，但人手短缺问题仍需关注。',
+    '据统计，上月入境旅客约{}万人次，按年上升百分之{}。',
+    '当局将联同酒店、航空公司和旅行社推出联合优惠，并加强线上宣传。'
+]
+_TAG = re.compile(r'<[^>]+>')
+
+
+def legacy_clean(html_content: str) -> str:
+    """改写前的正则清理"""
+    cleaned_content = re.sub(r'<html[^>]*>', '', html_content, flags=re.IGNORECASE)
+    cleaned_content = re.sub(r'</html>', '', cleaned_content, flags=re.IGNORECASE)
+    cleaned_content = re.sub(r'<head[^>]*>.*?</head>', '', cleaned_content, flags=re.IGNORECASE | re.DOTALL)
+    cleaned_content = re.sub(r'<body[^>]*>', '', cleaned_content, flags=re.IGNORECASE)
+    cleaned_content = re.sub(r'</body>', '', cleaned_content, flags=re.IGNORECASE)
+    cleaned_content = re.sub(r'<article[^>]*>', '', cleaned_content, flags=re.IGNORECASE)
+    cleaned_content = re.sub(r'</article>', '', cleaned_content, flags=re.IGNORECASE)
+    cleaned_content = re.sub(r'\n\s*\n', '\n', cleaned_content)
+    return cleaned_content.strip()
+
+
+def sentence(rng: random.Random) -> str:
+    """随机选一句并填入数字"""
+    template = rng.choice(SENTENCES)
+    return template.format(*(rng.randint(2, 300) for _ in range(template.count('{}'))))
+
+
+def make_page(rng: random.Random) -> str:
+    """生成一篇新闻页面"""
+    paragraphs = []
+    for index in range(rng.randint(4, 30)):
+        text = ''.join(sentence(rng) for _ in range(rng.randint(1, 4)))
+        if rng.random() < 0.3:
+            text = text.replace('旅游', '<strong>旅游</strong>', 1)
+        if rng.random() < 0.2:
+            text = text.replace('，', '，<a href="https://example.com/news/%d">详情</a>&nbsp;' % index, 1)
+        if rng.random() < 0.2:
+            text += '<br>&#12288;（记者 澳门报道）'
+        closing = rng.choice(['</p>', '</p >', ''])
+        paragraphs.append(f'<p style="text-indent:2em">{text}{closing}')
+        if rng.random() < 0.15:
+            paragraphs.append(f'<figure><img src="/img/{index}.jpg" alt="配图"/>'
+                              f'<figcaption>图为旅游推广活动现场</figcaption></figure>')
+    paragraphs[0] = paragraphs[0].replace('<p style="text-indent:2em">', '<p>本报讯（记者 张三）', 1)
+    paragraphs.insert(rng.randint(1, len(paragraphs)), '<p> </p >' * rng.randint(1, 3))
+    related = ''.join(f'<li><a href="/news/{rng.randint(1, 99999)}">{sentence(rng)[:18]}</a></li>'
+                      for _ in range(rng.randint(3, 8)))
+    return ('<!DOCTYPE html><html lang="zh"><head><meta charset="utf-8"><title>澳门公布旅游推广计划</title>'
+            '<link rel="stylesheet" href="/css/main.css"><style>.nav{display:flex}p{line-height:1.8}</style>'
+            '<script>window.dataLayer=[];function track(e){dataLayer.push(e)}</script></head>\n'
+            '<body><nav><ul><li><a href="/">首页</a></li><li><a href="/macau">澳闻</a></li></ul></nav>\n'
+            '<article><h1>澳门公布旅游推广计划</h1>\n<div class="share">分享到：微信 微博 QQ空间</div>\n'
+            + '\n'.join(paragraphs) +
+            f'\n<p>（责任编辑：李四）</p><div class="related"><h3>相关新闻</h3><ul>{related}</ul></div>'
+            '\n</article><footer><p>版权所有 &copy; 2026</p><p>欢迎订阅澳门日报电子版</p></footer></body></html>')
+
+
+def throughput(clean, pages, repeat: int) -> float:
+    """清理全部页面的吞吐量（MB/s，按UTF-8字节数计）"""
+    size = sum(len(page.encode('utf-8')) for page in pages) * repeat
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for page in pages:
+            clean(page)
+    return size / (time.perf_counter() - started) / 1e6
+
+
+def streamed(chunk_size: int):
+    """以固定大小的分片增量输入的提取"""
+    def clean(page: str) -> str:
+        extractor = HTMLTextExtractor()
+        paragraphs = []
+        for start in range(0, len(page), chunk_size):
+            paragraphs.extend(extractor.feed(page[start:start + chunk_size]))
+        paragraphs.extend(extractor.close())
+        return '\n'.join(paragraph.text for paragraph in paragraphs)
+    return clean
+
+
+def boilerplate():
+    """正文提取后去除模板内容"""
+    remover = BoilerplateRemover()
+
+    def clean(page: str) -> str:
+        return '\n'.join(paragraph.text for paragraph in remover.strip(extract_paragraphs(page)))
+    return clean
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTML正文提取与原正则清理对比")
+    parser.add_argument('--pages', type=int, default=200, help="语料页面数")
+    parser.add_argument('--repeat', type=int, default=5, help="吞吐量测试重复次数")
+    parser.add_argument('--chunk-size', type=int, default=4096, help="增量输入的分片大小（字符）")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    pages = [make_page(rng) for _ in range(args.pages)]
+    raw_tokens = sum(estimate_tokens(page) for page in pages)
+    print(f"语料 {len(pages)} 篇, {sum(len(page.encode('utf-8')) for page in pages) / 1e6:.2f} MB, "
+          f"原文预估 {raw_tokens} token")
+
+    cleaners = (('legacy', legacy_clean), ('extract', extract_text), ('stream', streamed(args.chunk_size)),
+                ('boilerplate', boilerplate()))
+    for name, clean in cleaners:
+        outputs = [clean(page) for page in pages]
+        tokens = sum(estimate_tokens(output) for output in outputs)
+        leftover = sum(len(_TAG.findall(output)) for output in outputs)
+        print(f"{name:>11}: {throughput(clean, pages, args.repeat):6.1f} MB/s, "
+              f"输出 {tokens} token（原文的 {tokens / raw_tokens:.0%}），残留标签 {leftover} 个")
+
+
+if __name__ == "__main__":
+    main()
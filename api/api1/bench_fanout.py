@@ -0,0 +1,70 @@
+"""
+单次调用与并发子提示词(fanout)分析模式的端到端延迟对比
+
+使用进程内的模拟上游（mock_upstream.py）按输出字数模拟生成耗时，不访问真实API，不使用缓存。
+用法: python bench_fanout.py --requests 20 --concurrency 5 --chars-per-second 40
+"""
+import time
+import asyncio
+import argparse
+import statistics
+
+import httpx
+
+import silicon_flow_analyzer
+from mock_upstream import create_app
+
+# 约800字的示例新闻
+SAMPLE_CONTENT = ('澳门特区政府日前公布新一轮旅游推广计划，将围绕国际客源市场拓展、文旅融合产品开发和智慧旅游建设三个方向推出多项措施。'
+                  * 12)
+
+
+async def run_mode(mode: str, requests: int, concurrency: int) -> list:
+    """以指定模式分析requests篇文章，返回每次的延迟（秒）"""
+    silicon_flow_analyzer.ANALYSIS_MODE = mode
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i: int) -> None:
+        async with semaphore:
+            started = time.perf_counter()
+            await silicon_flow_analyzer.analyze_with_silicon_flow(f"{i} {SAMPLE_CONTENT}")
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return sorted(latencies)
+
+
+async def bench(args) -> None:
+    upstream = create_app(args.first_token_latency, args.chars_per_second)
+    await silicon_flow_analyzer.start_http_client(transport=httpx.ASGITransport(app=upstream))
+    # 基准测试只关心上游调用耗时，关闭缓存和近似重复检测
+    silicon_flow_analyzer.analysis_cache = None
+    silicon_flow_analyzer.near_duplicate_index = None
+    # 模拟的生成耗时较长，关闭熔断器以免慢调用率触发熔断
+    for backend in silicon_flow_analyzer.silicon_flow_router.backends:
+        backend.breaker = None
+    silicon_flow_analyzer.SILICON_FLOW_API_KEY = silicon_flow_analyzer.SILICON_FLOW_API_KEY or 'sk-bench-mock'
+
+    try:
+        for mode in ('single', 'fanout'):
+            before = upstream.state.requests
+            latencies = await run_mode(mode, args.requests, args.concurrency)
+            print(f"{mode:>7}: 平均 {statistics.mean(latencies):.2f}s, p50 {latencies[len(latencies) // 2]:.2f}s, "
+                  f"p95 {latencies[int(len(latencies) * 0.95)]:.2f}s, 上游调用 {upstream.state.requests - before} 次")
+    finally:
+        await silicon_flow_analyzer.close_http_client()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="单次调用与fanout分析模式延迟对比")
+    parser.add_argument('--requests', type=int, default=20, help="每种模式分析的文章数")
+    parser.add_argument('--concurrency', type=int, default=5, help="并发数")
+    parser.add_argument('--first-token-latency', type=float, default=0.5, help="模拟首字延迟（秒）")
+    parser.add_argument('--chars-per-second', type=float, default=40.0, help="模拟输出速度（字/秒）")
+    args = parser.parse_args()
+    asyncio.run(bench(args))
+
+
+if __name__ == "__main__":
+    main()
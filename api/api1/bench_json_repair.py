@@ -0,0 +1,75 @@
+"""
+容错JSON解析与原解析方式的成功率和耗时对比
+
+原方式：
+  strict  json.loads 直接解析（silicon_flow_analyzer原来的做法，格式有误时整次请求失败）
+  strip   逐字符去掉控制字符后 json.loads（news_summary原来的做法）
+新方式：
+  repair  json_repair.loads（标准解析失败时先截取对象非严格解析，再单遍修复）
+
+成功率按 test_json_repair.py 中的语料统计；耗时按一篇完整分析输出（约800字）的标准、含未转义换行、含代码块标记三种形式重复解析统计。
+用法: python bench_json_repair.py --iterations 2000
+"""
+import json
+import time
+import argparse
+
+import json_repair
+from mock_upstream import SAMPLE_FIELDS
+from test_json_repair import CORPUS
+
+
+def parse_strict(text: str):
+    return json.loads(text)
+
+
+def parse_strip(text: str):
+    return json.loads(''.join(char for char in text if ord(char) >= 32 or char in '\n\r\t'))
+
+
+PARSERS = {'strict': parse_strict, 'strip': parse_strip, 'repair': json_repair.loads}
+
+
+def success_rate(parse) -> tuple:
+    """语料中解析结果与期望一致的条数"""
+    ok = 0
+    for _, raw, expected in CORPUS:
+        try:
+            ok += parse(raw) == expected
+        except ValueError:
+            pass
+    return ok, len(CORPUS)
+
+
+def per_call_microseconds(parse, text: str, iterations: int) -> float:
+    """重复解析text的平均耗时（微秒），解析失败也计入耗时"""
+    started = time.perf_counter()
+    for _ in range(iterations):
+        try:
+            parse(text)
+        except ValueError:
+            pass
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="容错JSON解析对比")
+    parser.add_argument('--iterations', type=int, default=2000, help="每种方式重复解析的次数")
+    args = parser.parse_args()
+
+    output = json.dumps(SAMPLE_FIELDS, ensure_ascii=False)
+    # 模型常在markdown中直接输出换行而不是\n转义
+    raw_newlines = output.replace('\\n', '\n')
+    fenced = f"```json\n{raw_newlines}\n```"
+    print(f"完整输出 {len(output)} 字")
+
+    for name, parse in PARSERS.items():
+        ok, total = success_rate(parse)
+        print(f"{name:>6}: 语料成功 {ok}/{total}, "
+              f"标准输出 {per_call_microseconds(parse, output, args.iterations):.1f}us, "
+              f"含换行 {per_call_microseconds(parse, raw_newlines, args.iterations):.1f}us, "
+              f"含代码块和换行 {per_call_microseconds(parse, fenced, args.iterations):.1f}us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+完整提示词（要求回显原文）与精简提示词的端到端延迟和输出量对比
+
+使用进程内的模拟上游（mock_upstream.py）按输出字数模拟生成耗时，不访问真实API，不使用缓存。
+用法: python bench_lean_prompt.py --requests 20 --concurrency 5 --chars-per-second 40
+"""
+import time
+import asyncio
+import argparse
+import statistics
+
+import httpx
+
+import silicon_flow_analyzer
+from config import config
+from mock_upstream import create_app
+
+# 约800字的示例新闻
+SAMPLE_CONTENT = ('澳门特区政府日前公布新一轮旅游推广计划，将围绕国际客源市场拓展、文旅融合产品开发和智慧旅游建设三个方向推出多项措施。'
+                  * 12)
+
+
+async def run_prompt(lean: bool, requests: int, concurrency: int) -> tuple:
+    """以完整或精简提示词分析requests篇文章，返回每次的延迟（秒）和输出token总数"""
+    config['lean_prompt'] = lean
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    completion_tokens = 0
+
+    async def one(i: int) -> None:
+        nonlocal completion_tokens
+        async with semaphore:
+            payload = silicon_flow_analyzer._build_payload(f"{i} {SAMPLE_CONTENT}")
+            started = time.perf_counter()
+            result = await silicon_flow_analyzer._call_silicon_flow(payload)
+            latencies.append(time.perf_counter() - started)
+            completion_tokens += result['usage']['completion_tokens']
+
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return sorted(latencies), completion_tokens
+
+
+async def bench(args) -> None:
+    upstream = create_app(args.first_token_latency, args.chars_per_second)
+    await silicon_flow_analyzer.start_http_client(transport=httpx.ASGITransport(app=upstream))
+    # 模拟的生成耗时较长，关闭熔断器以免慢调用率触发熔断
+    for backend in silicon_flow_analyzer.silicon_flow_router.backends:
+        backend.breaker = None
+
+    try:
+        for lean in (False, True):
+            latencies, completion_tokens = await run_prompt(lean, args.requests, args.concurrency)
+            print(f"{'lean' if lean else 'full':>4}: 平均 {statistics.mean(latencies):.2f}s, "
+                  f"p50 {latencies[len(latencies) // 2]:.2f}s, p95 {latencies[int(len(latencies) * 0.95)]:.2f}s, "
+                  f"平均输出 {completion_tokens // args.requests} token")
+    finally:
+        await silicon_flow_analyzer.close_http_client()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="完整提示词与精简提示词延迟对比")
+    parser.add_argument('--requests', type=int, default=20, help="每种提示词分析的文章数")
+    parser.add_argument('--concurrency', type=int, default=5, help="并发数")
+    parser.add_argument('--first-token-latency', type=float, default=0.5, help="模拟首字延迟（秒）")
+    parser.add_argument('--chars-per-second', type=float, default=40.0, help="模拟输出速度（字/秒）")
+    args = parser.parse_args()
+    asyncio.run(bench(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+近似重复索引查询性能测试
+
+向索引中填充大量随机指纹后测量查询耗时，验证百万级规模下的亚毫秒查询。
+用法: python bench_near_duplicate.py --size 2000000 --queries 10000
+"""
+import time
+import random
+import argparse
+import statistics
+
+from near_duplicate import NearDuplicateIndex
+
+
+def main():
+    parser = argparse.ArgumentParser(description="近似重复索引查询性能测试")
+    parser.add_argument('--size', type=int, default=2_000_000, help="索引中的文章数")
+    parser.add_argument('--queries', type=int, default=10_000, help="查询次数")
+    parser.add_argument('--max-distance', type=int, default=4, help="最大汉明距离")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    index = NearDuplicateIndex(None, max_distance=args.max_distance)
+
+    started = time.perf_counter()
+    fingerprints = [rng.getrandbits(64) for _ in range(args.size)]
+    for fingerprint in fingerprints:
+        index._insert_memory('bench', fingerprint)
+    print(f"填充 {args.size} 条指纹耗时 {time.perf_counter() - started:.1f}秒")
+
+    # 一半查询为已存在指纹翻转若干位（应命中），一半为随机指纹（通常不命中）
+    queries = []
+    for i in range(args.queries):
+        if i % 2 == 0:
+            fingerprint = rng.choice(fingerprints)
+            for bit in rng.sample(range(64), rng.randint(0, args.max_distance)):
+                fingerprint ^= 1 << bit
+        else:
+            fingerprint = rng.getrandbits(64)
+        queries.append(fingerprint)
+
+    latencies = []
+    hits = 0
+    for fingerprint in queries:
+        started = time.perf_counter()
+        if index._nearest('bench', fingerprint) is not None:
+            hits += 1
+        latencies.append((time.perf_counter() - started) * 1e6)
+
+    latencies.sort()
+    print(f"查询 {args.queries} 次，命中 {hits} 次")
+    print(f"平均 {statistics.mean(latencies):.1f}us, p50 {latencies[len(latencies) // 2]:.1f}us, "
+          f"p99 {latencies[int(len(latencies) * 0.99)]:.1f}us")
+
+
+if __name__ == "__main__":
+    main()
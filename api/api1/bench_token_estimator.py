@@ -0,0 +1,82 @@
+"""
+token预估吞吐量对比：按字符类别计数的token_estimator与原估算方式
+
+legacy为最初rate_limiter中的estimate_tokens（生成器逐字比较，中日韩字符每字1个token，其余每4个字符1个token），
+cjk_regex为其后改用一次正则替换统计中日韩字符的版本（结果相同）。两者都不区分标点、数字和英文单词，
+对Qwen分词的中文文本普遍高估。
+语料为中文新闻段落，可按比例混入英文句子。
+
+用法: python bench_token_estimator.py --articles 200 --english 0.2
+"""
+import re
+import time
+import random
+import argparse
+
+from token_estimator import estimate_tokens
+
+CHINESE = [
+    '澳门特区政府日前公布新一轮旅游推广计划，将围绕国际客源市场拓展、文旅融合产品开发和智慧旅游建设三个方向推出多项措施。',
+    '旅游局表示，今年推广经费较去年增加约两成，重点投放东南亚和日韩市场。',
+    '据统计，上月入境旅客约280万人次，按年上升12.5%，其中“自由行”旅客占六成。',
+    '业界认为，新计划有助于提升旅客留宿时间和人均消费，但人手短缺问题仍需关注。'
+]
+ENGLISH = [
+    'The Macao Government Tourism Office said the budget would rise by about 20 percent this year.',
+    'Visitor arrivals reached 2.8 million last month, according to official statistics.'
+]
+
+
+def legacy_estimate(text: str) -> int:
+    """改写前的估算"""
+    cjk = sum(1 for char in text if char >= '⺀')
+    return cjk + (len(text) - cjk) // 4 + 1
+
+
+_NON_CJK = re.compile('[\x00-\u2e7f]+')
+
+
+def cjk_regex_estimate(text: str) -> int:
+    """一次正则替换统计中日韩字符的估算"""
+    cjk = len(_NON_CJK.sub('', text))
+    return cjk + (len(text) - cjk) // 4 + 1
+
+
+def make_article(rng: random.Random, english: float) -> str:
+    """生成一篇新闻文本"""
+    paragraphs = []
+    for _ in range(rng.randint(5, 40)):
+        pool = ENGLISH if rng.random() < english else CHINESE
+        paragraphs.append(''.join(rng.choice(pool) for _ in range(rng.randint(1, 4))))
+    return '\n'.join(paragraphs)
+
+
+def throughput(estimate, articles, repeat: int) -> float:
+    """估算全部文章的吞吐量（百万字符/秒）"""
+    size = sum(len(article) for article in articles) * repeat
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for article in articles:
+            estimate(article)
+    return size / (time.perf_counter() - started) / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="token预估吞吐量对比")
+    parser.add_argument('--articles', type=int, default=200, help="语料文章数")
+    parser.add_argument('--english', type=float, default=0.2, help="英文段落比例")
+    parser.add_argument('--repeat', type=int, default=10, help="重复次数")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    articles = [make_article(rng, args.english) for _ in range(args.articles)]
+    print(f"语料 {len(articles)} 篇, {sum(len(article) for article in articles) / 1e6:.2f} 百万字符")
+    estimators = (('legacy', legacy_estimate), ('cjk_regex', cjk_regex_estimate), ('estimator', estimate_tokens))
+    for name, estimate in estimators:
+        tokens = sum(estimate(article) for article in articles)
+        print(f"{name:>9}: {throughput(estimate, articles, args.repeat):6.1f} 百万字符/秒, 预估 {tokens} token")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+熔断器模块 - 上游故障时快速失败，半开状态下有限探测
+
+上游（硅基流动、Coze）整体不可用时，若每个请求仍走完整的重试流程，worker会被大量挂起的请求占满。
+熔断器按最近若干次调用的失败率或慢调用率判断上游健康状况：
+  closed    正常放行，统计最近window_size次调用的结果
+  open      失败率或慢调用率超过阈值后打开，open_duration秒内的调用直接失败（CircuitOpenError）
+  half_open 打开期满后放行最多half_open_max_calls个探测调用，全部成功则关闭，任一失败则重新打开
+"""
+import time
+import logging
+from collections import deque
+from typing import Any, Dict
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """熔断器打开，调用被快速拒绝"""
+
+
+class CircuitBreaker:
+    """按失败率和慢调用率熔断的熔断器"""
+
+    def __init__(self, name: str, window_size: int = 20, min_calls: int = 10, failure_rate: float = 0.5,
+                 slow_call_duration: float = 25, slow_call_rate: float = 0.8, open_duration: float = 30,
+                 half_open_max_calls: int = 2):
+        """
+        初始化熔断器
+
+        Args:
+            name: 上游名称，用于日志和状态接口
+            window_size: 统计最近多少次调用
+            min_calls: 窗口内调用数达到该值后才判断是否熔断
+            failure_rate: 失败率阈值
+            slow_call_duration: 超过该耗时（秒）的调用记为慢调用
+            slow_call_rate: 慢调用率阈值（失败的调用不计入慢调用）
+            open_duration: 打开状态持续时间（秒）
+            half_open_max_calls: 半开状态下放行的探测调用数
+        """
+        self.name = name
+        self.window_size = window_size
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_duration = slow_call_duration
+        self.slow_call_rate = slow_call_rate
+        self.open_duration = open_duration
+        self.half_open_max_calls = half_open_max_calls
+        self.state = CLOSED
+        # 每次调用的结果：(是否失败, 是否慢调用)
+        self._outcomes = deque(maxlen=window_size)
+        self._opened_at = 0.0
+        self._half_opened_at = 0.0
+        self._probes = 0
+        self._probe_successes = 0
+        self._counters = {
+            'rejected': 0,
+            'opened': 0
+        }
+
+    def _transition(self, state: str, reason: str = '') -> None:
+        if state == self.state:
+            return
+        logger.warning(f"{self.name} 熔断器 {self.state} -> {state}{'：' + reason if reason else ''}")
+        self.state = state
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+            self._counters['opened'] += 1
+        elif state == HALF_OPEN:
+            self._half_opened_at = time.monotonic()
+            self._probes = 0
+            self._probe_successes = 0
+        elif state == CLOSED:
+            self._outcomes.clear()
+
+    def allow(self) -> bool:
+        """
+        判断是否放行一次调用（放行时占用一个探测名额）
+
+        Returns:
+            是否放行；放行后必须调用record_success、record_failure或release
+        """
+        now = time.monotonic()
+        if self.state == OPEN and now - self._opened_at >= self.open_duration:
+            self._transition(HALF_OPEN)
+        elif self.state == HALF_OPEN and now - self._half_opened_at >= self.open_duration:
+            # 探测调用被取消而没有上报结果时，重新发放探测名额，避免一直停留在半开状态
+            self._half_opened_at = now
+            self._probes = 0
+            self._probe_successes = 0
+        if self.state == CLOSED:
+            return True
+        if self.state == HALF_OPEN and self._probes < self.half_open_max_calls:
+            self._probes += 1
+            return True
+        self._counters['rejected'] += 1
+        return False
+
+    def check(self) -> None:
+        """放行检查，不放行时抛出CircuitOpenError"""
+        if not self.allow():
+            raise CircuitOpenError(f"{self.name} 服务暂时不可用（熔断中），请稍后重试")
+
+    def record_success(self, duration: float = 0.0) -> None:
+        """记录一次成功调用及其耗时（秒）"""
+        slow = duration >= self.slow_call_duration
+        if self.state == HALF_OPEN:
+            if slow:
+                self._transition(OPEN, f"探测调用耗时{duration:.1f}秒")
+                return
+            self._probe_successes += 1
+            if self._probe_successes >= self.half_open_max_calls:
+                self._transition(CLOSED)
+            return
+        self._record(False, slow)
+
+    def record_failure(self) -> None:
+        """记录一次失败调用"""
+        if self.state == HALF_OPEN:
+            self._transition(OPEN, "探测调用失败")
+            return
+        self._record(True, False)
+
+    def release(self) -> None:
+        """
+        结束一次既不算成功也不算失败的调用（如被上游限流）：半开状态下只归还探测名额，
+        不会因此关闭或重新打开熔断器
+        """
+        if self.state == HALF_OPEN and self._probes > 0:
+            self._probes -= 1
+
+    def _record(self, failed: bool, slow: bool) -> None:
+        if self.state != CLOSED:
+            return
+        self._outcomes.append((failed, slow))
+        calls = len(self._outcomes)
+        if calls < self.min_calls:
+            return
+        failures = sum(1 for failed, _ in self._outcomes if failed)
+        slow_calls = sum(1 for _, slow in self._outcomes if slow)
+        if failures / calls >= self.failure_rate:
+            self._transition(OPEN, f"最近{calls}次调用失败率{failures / calls:.0%}")
+        elif slow_calls / calls >= self.slow_call_rate:
+            self._transition(OPEN, f"最近{calls}次调用慢调用率{slow_calls / calls:.0%}")
+
+    def status(self) -> Dict[str, Any]:
+        """返回熔断器状态和最近窗口内的统计"""
+        calls = len(self._outcomes)
+        failures = sum(1 for failed, _ in self._outcomes if failed)
+        slow_calls = sum(1 for _, slow in self._outcomes if slow)
+        status = {
+            'state': self.state,
+            'window_calls': calls,
+            'failure_rate': round(failures / calls, 3) if calls else 0.0,
+            'slow_call_rate': round(slow_calls / calls, 3) if calls else 0.0,
+            **self._counters
+        }
+        if self.state == OPEN:
+            status['retry_in'] = round(max(0.0, self.open_duration - (time.monotonic() - self._opened_at)), 1)
+        return status
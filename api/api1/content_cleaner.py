@@ -1,40 +1,255 @@
+"""
+HTML正文提取模块 - 单遍扫描HTML，输出按段落分行的纯文本
+
+以一个正则分词器从头到尾扫描一遍文档（标签之间的文本由正则整段跳过）：
+  - 段落类标签（p、div、br、li、h1~h6、tr等）处断段，其余标签直接去掉
+  - script、style、title等不含正文的元素整体跳过，注释和声明忽略
+  - 实体（&nbsp;、&amp;、&#12288;等）解码，段内连续空白合并为一个空格
+  - 未闭合或写法不规范的标签（如 </p > 、缺少</p>）按浏览器的宽松规则处理
+  - 可分段输入（feed），每次返回已完整的段落，适合流式读取的文档
+  - 记录每个段落中链接文字的字数，供去除模板内容（boilerplate.py）按链接密度判断导航、相关阅读等段落
+
+文本中原有的换行也视为断段，保持与清理前纯文本内容一致的分行方式。
+"""
 import re
+import html
 import logging
+from typing import List, NamedTuple
 
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# 在其开始和结束处断段的标签
+BLOCK_TAGS = frozenset({
+    'address', 'article', 'aside', 'blockquote', 'body', 'br', 'caption', 'dd', 'div', 'dl', 'dt',
+    'figcaption', 'figure', 'footer', 'form', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'header', 'hr',
+    'li', 'main', 'nav', 'ol', 'p', 'pre', 'section', 'table', 'td', 'th', 'tr', 'ul'
+})
+# 内容不输出的标签
+SKIP_TAGS = frozenset({'script', 'style', 'title', 'noscript', 'template', 'svg', 'iframe', 'object'})
+# 内容为原始文本（其中的"<"不是标签）的标签，直接跳到对应的结束标签
+RAW_TEXT_TAGS = frozenset({'script', 'style'})
+
+# 标签、注释（含尚未结束的注释开头）和声明
+_TOKEN = re.compile(r'<(?:!--.*?-->|!--|[!?][^>]*>|(/?)([a-zA-Z][a-zA-Z0-9:-]*)(?=[\s/>])[^>]*>)', re.S)
+# 可能是尚未读完的标签开头
+_PENDING = re.compile(r'<[a-zA-Z/!?]')
+_RAW_TEXT_END = {tag: re.compile(rf'</{tag}\s*>', re.I) for tag in RAW_TEXT_TAGS}
+# 像HTML标签或实体的片段，用于判断内容是否需要清理
+_MARKUP = re.compile(r'</?[a-zA-Z][a-zA-Z0-9]*(?:\s[^<>]*)?/?>|&(?:[a-zA-Z]+|#\d+|#[xX][0-9a-fA-F]+);')
+# 段内连续空白（含&nbsp;解码后的不换行空格和全角空格）
+_SPACES = re.compile(r'\s+')
+
+
+class Paragraph(NamedTuple):
+    """正文段落"""
+    text: str
+    link_chars: int = 0  # 段落中位于<a>内的字数
+
+    @property
+    def link_density(self) -> float:
+        """链接文字占段落字数的比例"""
+        return min(1.0, self.link_chars / len(self.text)) if self.text else 0.0
+
+
+class HTMLTextExtractor:
+    """增量提取HTML正文段落"""
+
+    def __init__(self):
+        # 尚未处理的输入（末尾未读完的标签、注释或原始文本元素）
+        self._buf = ''
+        # 当前段落尚未结束的文本片段及其中的链接字数
+        self._parts: List[str] = []
+        self._link_chars = 0
+        # 已完成、尚未返回的段落
+        self._paragraphs: List[Paragraph] = []
+        # 位于不输出内容的元素、链接内的层数
+        self._skip_depth = 0
+        self._link_depth = 0
+
+    def feed(self, data: str) -> List[Paragraph]:
+        """
+        输入新读到的HTML片段
+
+        Args:
+            data: HTML文本片段（可在任意位置切分）
+
+        Returns:
+            本次新完成的段落列表
+        """
+        self._buf += data
+        self._scan(final=False)
+        return self._take()
+
+    def close(self) -> List[Paragraph]:
+        """
+        结束输入，处理剩余内容
+
+        Returns:
+            剩余的段落列表
+        """
+        self._scan(final=True)
+        self._flush()
+        return self._take()
+
+    def _scan(self, final: bool) -> None:
+        """处理缓冲区中已完整的部分，未读完的部分留待下次输入"""
+        buf = self._buf
+        pos = 0
+        for match in _TOKEN.finditer(buf):
+            if match.start() < pos:
+                # 位于已跳过的原始文本元素内
+                continue
+            self._text(buf[pos:match.start()])
+            token = match.group(0)
+            if token == '<!--':
+                # 注释尚未结束：输入已结束时丢弃其后的内容，否则等待后续输入
+                pos = len(buf) if final else match.start()
+                break
+            pos = match.end()
+            name = match.group(2)
+            if name is None:
+                continue
+            tag = name.lower()
+            if match.group(1):
+                self._end_tag(tag)
+            elif tag in RAW_TEXT_TAGS and not token.endswith('/>'):
+                end = _RAW_TEXT_END[tag].search(buf, pos)
+                if end is None:
+                    pos = len(buf) if final else match.start()
+                    break
+                pos = end.end()
+            elif not token.endswith('/>'):
+                self._start_tag(tag)
+            elif tag in BLOCK_TAGS:
+                # 自闭合标签（如 <br/>）只断段，不进入元素
+                self._flush()
+
+        tail = buf[pos:]
+        if final:
+            self._text(tail)
+            self._buf = ''
+            return
+        # 末尾可能是未读完的标签；没有时保留最后一行，避免在实体中间切断
+        pending = _PENDING.search(tail)
+        keep = pending.start() if pending else tail.rfind('\n') + 1
+        self._text(tail[:keep])
+        self._buf = tail[keep:]
+
+    def _start_tag(self, tag: str) -> None:
+        if tag == 'a':
+            self._link_depth += 1
+        elif tag in SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag == 'body':
+            # 缺少结束标签的title等元素不应吞掉正文
+            self._skip_depth = 0
+            self._flush()
+        elif tag in BLOCK_TAGS:
+            self._flush()
+
+    def _end_tag(self, tag: str) -> None:
+        if tag == 'a':
+            self._link_depth = max(0, self._link_depth - 1)
+        elif tag in SKIP_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in BLOCK_TAGS:
+            self._flush()
+
+    def _text(self, data: str) -> None:
+        if not data or self._skip_depth:
+            return
+        if '&' in data:
+            data = html.unescape(data)
+        if '\n' not in data:
+            self._append(data)
+            return
+        lines = data.split('\n')
+        self._append(lines[0])
+        for line in lines[1:]:
+            self._flush()
+            self._append(line)
+
+    def _append(self, text: str) -> None:
+        self._parts.append(text)
+        if self._link_depth:
+            self._link_chars += len(text.strip())
+
+    def _flush(self) -> None:
+        """结束当前段落"""
+        if not self._parts:
+            return
+        text = _SPACES.sub(' ', ''.join(self._parts)).strip()
+        if text:
+            self._paragraphs.append(Paragraph(text, self._link_chars))
+        self._parts = []
+        self._link_chars = 0
+
+    def _take(self) -> List[Paragraph]:
+        paragraphs = self._paragraphs
+        self._paragraphs = []
+        return paragraphs
+
+
+def looks_like_html(content: str) -> bool:
+    """内容中是否含有HTML标签或实体（不复制、不转换整篇内容）"""
+    return _MARKUP.search(content) is not None
+
+
+def extract_paragraphs(html_content: str) -> List[Paragraph]:
+    """
+    提取HTML正文段落
+
+    Args:
+        html_content: HTML文本
+
+    Returns:
+        按原文顺序排列的段落列表
+    """
+    extractor = HTMLTextExtractor()
+    paragraphs = extractor.feed(html_content)
+    paragraphs.extend(extractor.close())
+    return paragraphs
+
+
+def text_paragraphs(content: str) -> List[Paragraph]:
+    """将纯文本按行切分为段落，段内空白合并"""
+    paragraphs = (_SPACES.sub(' ', line).strip() for line in content.split('\n'))
+    return [Paragraph(text) for text in paragraphs if text]
+
+
+def extract_text(html_content: str) -> str:
+    """
+    提取HTML正文
+
+    Args:
+        html_content: HTML文本
+
+    Returns:
+        按段落分行的纯文本
+    """
+    return '\n'.join(paragraph.text for paragraph in extract_paragraphs(html_content))
+
+
 def clean_html_content(html_content: str) -> str:
     """
-    清理HTML内容，去除外层标签，只保留内容部分
-    
+    清理HTML内容，去除全部标签，只保留正文段落
+
     Args:
         html_content: 原始HTML内容
-        
+
     Returns:
         清理后的内容
     """
     if not html_content:
         return html_content
-    
+
     try:
-        # 使用正则表达式去除外层的html、head、body、article标签
-        cleaned_content = re.sub(r'<html[^>]*>', '', html_content, flags=re.IGNORECASE)
-        cleaned_content = re.sub(r'</html>', '', cleaned_content, flags=re.IGNORECASE)
-        cleaned_content = re.sub(r'<head[^>]*>.*?</head>', '', cleaned_content, flags=re.IGNORECASE | re.DOTALL)
-        cleaned_content = re.sub(r'<body[^>]*>', '', cleaned_content, flags=re.IGNORECASE)
-        cleaned_content = re.sub(r'</body>', '', cleaned_content, flags=re.IGNORECASE)
-        cleaned_content = re.sub(r'<article[^>]*>', '', cleaned_content, flags=re.IGNORECASE)
-        cleaned_content = re.sub(r'</article>', '', cleaned_content, flags=re.IGNORECASE)
-        
-        # 去除多余的空白行和首尾空白
-        cleaned_content = re.sub(r'\n\s*\n', '\n', cleaned_content)
-        cleaned_content = cleaned_content.strip()
-        
+        cleaned_content = extract_text(html_content)
         logger.info(f"内容清理完成: 原始长度 {len(html_content)} -> 清理后长度 {len(cleaned_content)}")
         return cleaned_content
-        
+
     except Exception as e:
         logger.error(f"清理HTML内容时出错: {str(e)}")
         raise
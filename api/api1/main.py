@@ -1,32 +1,58 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Query
+from fastapi.responses import StreamingResponse
+from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import List, Optional, Tuple
+from contextlib import asynccontextmanager
+import json
 import logging
 
 # 导入配置
 from config import config
-from content_cleaner import clean_html_content
-from silicon_flow_analyzer import analyze_with_silicon_flow
+from content_cleaner import extract_paragraphs, looks_like_html, text_paragraphs
+from boilerplate import BoilerplateRemover
+from bulk_stream import iter_ndjson_lines, process_ndjson, NDJSONStreamingResponse
+from silicon_flow_analyzer import (analyze_with_silicon_flow, stream_analysis, start_http_client, close_http_client,
+                                   analysis_cache, analysis_flight, near_duplicate_index, silicon_flow_limiter,
+                                   silicon_flow_hedger, silicon_flow_breaker,
+                                   silicon_flow_router, cascade_stats, parse_fields,
+                                   json_repair_stats, fanout_stats, fit_input_budget, token_estimator, input_budget_stats)
+from retry_policy import DeadlineMiddleware
 
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="新闻分析API", description="清理新闻内容并通过Silicon Flow分析生成标题、关键词、标签、内容导读等")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：启动时创建共享连接池，关闭时释放"""
+    await start_http_client()
+    yield
+    await close_http_client()
+    if analysis_cache is not None:
+        analysis_cache.close()
+    if near_duplicate_index is not None:
+        near_duplicate_index.close()
+
+app = FastAPI(title="新闻分析API", description="清理新闻内容并通过Silicon Flow分析生成标题、关键词、标签、内容导读等",
+              lifespan=lifespan)
+# 为每个请求设置截止时间，分析阶段的重试和读取超时不超过剩余时间
+app.add_middleware(DeadlineMiddleware, default_timeout=config['request_timeout'],
+                   max_timeout=config['request_max_timeout'])
 
 class NewsContent(BaseModel):
     """新闻内容请求模型"""
     content: str = Field(..., description="新闻原始内容")
 
 class NewsAnalysisResponse(BaseModel):
-    """新闻分析响应模型"""
+    """新闻分析响应模型（请求指定fields时只包含content和所需字段）"""
     content: str = Field(..., description="清理后的新闻内容")
-    title: str = Field(..., description="分析生成的标题")
-    keywords: List[str] = Field(..., description="关键词列表")
-    tags: List[str] = Field(..., description="标签列表")
-    categoryName: str = Field(..., description="栏目名称")
-    aiIntroduction: str = Field(..., description="新闻概要（150字以内）")
-    markdown: str = Field(..., description="Markdown格式的分析报告")
+    title: Optional[str] = Field(None, description="分析生成的标题")
+    keywords: Optional[List[str]] = Field(None, description="关键词列表")
+    tags: Optional[List[str]] = Field(None, description="标签列表")
+    categoryName: Optional[str] = Field(None, description="栏目名称")
+    aiIntroduction: Optional[str] = Field(None, description="新闻概要（150字以内）")
+    markdown: Optional[str] = Field(None, description="Markdown格式的分析报告")
 
 class APIResponse(BaseModel):
     """API统一响应格式"""
@@ -34,32 +60,86 @@ class APIResponse(BaseModel):
     msg: str = "success"
     data: Optional[NewsAnalysisResponse] = None
 
-@app.post("/analyze", response_model=APIResponse, summary="分析新闻内容", 
-         description="清理新闻内容的HTML标签并分析生成标题、关键词、标签、内容导读等信息")
-async def analyze_news(news: NewsContent):
+# 去除模板内容（在正文提取之后）
+boilerplate_remover = BoilerplateRemover(
+    link_density=config['boilerplate_link_density'],
+    repeat_articles=config['boilerplate_repeat_articles'],
+    repeat_window=config['boilerplate_repeat_window'],
+    extra_patterns=config['boilerplate_patterns']
+) if config['boilerplate_enabled'] else None
+
+def prepare_content(content: str) -> Tuple[str, str]:
+    """
+    检查内容是否含有HTML标签或实体，有则提取正文；启用时去除模板内容；最后按输入token预算截断或拒绝
+
+    Returns:
+        (清理后的内容, 计算缓存键所用的内容)。缓存键取去除模板内容之前的正文：跨文章重复段落的判断依赖
+        进程内学到的状态，同一篇文章在学到网站页眉页脚前后的清理结果可能不同，不能作为缓存键
+    """
+    if looks_like_html(content):
+        logger.info("检测到HTML标签，进行内容清理...")
+        paragraphs = extract_paragraphs(content)
+    elif boilerplate_remover is not None:
+        paragraphs = text_paragraphs(content)
+    else:
+        content = fit_input_budget(content)
+        return content, content
+    extracted = '\n'.join(paragraph.text for paragraph in paragraphs)
+    if boilerplate_remover is not None:
+        paragraphs = boilerplate_remover.strip(paragraphs)
+    content = '\n'.join(paragraph.text for paragraph in paragraphs)
+    logger.info(f"内容清理完成，清理后长度: {len(content)}")
+    return fit_input_budget(content), extracted
+
+# 流式接口逐个推送的分析字段
+STREAM_FIELDS = ('title', 'categoryName', 'keywords', 'tags', 'aiIntroduction', 'markdown')
+
+def format_sse(event: str, data) -> str:
+    """格式化一条服务端事件(SSE)"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+async def process_news(content: str, fields: Optional[Tuple[str, ...]] = None) -> NewsAnalysisResponse:
+    """
+    清理并分析单篇新闻
+
+    Args:
+        content: 新闻原始内容
+        fields: 只生成并返回这些分析字段，为None时返回全部字段
+
+    Returns:
+        新闻分析响应数据
+    """
+    content, key_content = prepare_content(content)
+    
+    # 调用Silicon Flow服务进行分析
+    logger.info("开始调用Silicon Flow服务分析内容...")
+    analysis_result = await analyze_with_silicon_flow(content, fields, key_content)
+    
+    # 构建响应数据
+    data = {
+        'title': analysis_result.get('title', ''),
+        'keywords': analysis_result.get('keywords', []),
+        'tags': analysis_result.get('tags', []),
+        'aiIntroduction': analysis_result.get('aiIntroduction', ''),
+        'categoryName': analysis_result.get('categoryName', ''),
+        'markdown': analysis_result.get('markdown', '')
+    }
+    if fields is not None:
+        data = {name: value for name, value in data.items() if name in fields}
+    return NewsAnalysisResponse(content=content, **data)
+
+@app.post("/analyze", response_model=APIResponse, response_model_exclude_unset=True, summary="分析新闻内容",
+         description="清理新闻内容的HTML标签并分析生成标题、关键词、标签、内容导读等信息；"
+                     "fields参数可只请求部分字段（如fields=categoryName,keywords），提示词和响应随之精简")
+async def analyze_news(news: NewsContent,
+                       fields: Optional[str] = Query(None, description="只返回指定的分析字段，逗号分隔，可选："
+                                                     "title、keywords、tags、categoryName、aiIntroduction、markdown")):
     try:
-        content = news.content
-        
-        # 检查内容是否需要清理HTML标签
-        if any(tag in content.lower() for tag in ['<html', '<head', '<body', '<article']):
-            logger.info("检测到HTML标签，进行内容清理...")
-            content = clean_html_content(content)
-            logger.info(f"内容清理完成，清理后长度: {len(content)}")
-        
-        # 调用Silicon Flow服务进行分析
-        logger.info("开始调用Silicon Flow服务分析内容...")
-        analysis_result = analyze_with_silicon_flow(content)
-        
-        # 构建响应数据
-        response_data = NewsAnalysisResponse(
-            content=content,
-            title=analysis_result.get('title', ''),
-            keywords=analysis_result.get('keywords', []),
-            tags=analysis_result.get('tags', []),
-            aiIntroduction=analysis_result.get('aiIntroduction', ''),
-            categoryName=analysis_result.get('categoryName', ''),
-            markdown=analysis_result.get('markdown', '')
-        )
+        projection = parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        response_data = await process_news(news.content, projection)
         
         return APIResponse(
             code=0,
@@ -67,10 +147,98 @@ async def analyze_news(news: NewsContent):
             data=response_data
         )
         
+    except HTTPException as e:
+        # 保留上游熔断(503)等状态码
+        logger.error(f"处理请求时出错: {e.detail}")
+        raise
     except Exception as e:
         logger.error(f"处理请求时出错: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/analyze/stream", summary="流式分析新闻内容",
+          description="以服务端事件(SSE)流式返回分析结果：每个字段（title、categoryName、keywords等）生成完毕即推送一条"
+                      "以字段名为事件名的事件，最后推送done事件（完整结果）；出错时推送error事件")
+async def analyze_news_stream(news: NewsContent):
+    content, key_content = prepare_content(news.content)
+
+    async def events():
+        fields = {'content': content}
+        yield format_sse('content', content)
+        try:
+            async for name, value in stream_analysis(content, key_content):
+                if name in STREAM_FIELDS:
+                    fields[name] = value
+                    yield format_sse(name, value)
+            yield format_sse('done', jsonable_encoder(NewsAnalysisResponse(
+                content=content,
+                title=fields.get('title', ''),
+                keywords=fields.get('keywords', []),
+                tags=fields.get('tags', []),
+                aiIntroduction=fields.get('aiIntroduction', ''),
+                categoryName=fields.get('categoryName', ''),
+                markdown=fields.get('markdown', '')
+            )))
+        except Exception as e:
+            detail = getattr(e, 'detail', None) or str(e)
+            logger.error(f"流式分析出错: {detail}")
+            yield format_sse('error', {'code': 500, 'msg': f"处理失败: {detail}"})
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.post("/analyze/bulk", summary="批量分析新闻内容",
+          description="请求体为NDJSON，每行一个{\"id\": ..., \"content\": ...}对象；"
+                      "以有界并发处理，并按完成顺序流式返回NDJSON结果")
+async def analyze_news_bulk(request: Request,
+                            concurrency: int = Query(config['bulk_concurrency'], ge=1,
+                                                     le=config['bulk_max_concurrency'],
+                                                     description="最大并发数")):
+    async def handle(record: dict) -> dict:
+        response_data = await process_news(record['content'])
+        return jsonable_encoder(response_data)
+
+    lines = iter_ndjson_lines(request.stream(), config['bulk_max_line_bytes'])
+    return NDJSONStreamingResponse(process_ndjson(lines, handle, concurrency))
+
+@app.get("/admin/stats", summary="运行统计", description="查看分析结果缓存、近似重复检测、并发请求合并、对冲请求、模型级联、并发子提示词、JSON容错修复、模板内容去除、token预估、输入预算和上游限流的统计计数")
+async def admin_stats():
+    return {
+        "code": 0,
+        "msg": "success",
+        "data": {
+            "cache": analysis_cache.stats() if analysis_cache is not None else None,
+            "near_duplicate": near_duplicate_index.stats() if near_duplicate_index is not None else None,
+            "single_flight": {"analysis": analysis_flight.stats()},
+            "hedging": {
+                "silicon_flow": silicon_flow_hedger.stats() if silicon_flow_hedger is not None else None
+            },
+            "cascade": cascade_stats.stats() if cascade_stats is not None else None,
+            "json_repair": dict(json_repair_stats),
+            "fanout": dict(fanout_stats),
+            "boilerplate": boilerplate_remover.stats() if boilerplate_remover is not None else None,
+            "tokens": {"estimator": token_estimator.stats(), "input_budget": dict(input_budget_stats)},
+            "rate_limit": {
+                "silicon_flow": silicon_flow_limiter.stats() if silicon_flow_limiter is not None else None
+            }
+        }
+    }
+
+@app.get("/status/upstreams", summary="上游状态", description="查看各上游服务熔断器的状态（closed/open/half_open）、最近调用的失败率和各模型后端的路由统计")
+async def upstream_status():
+    return {
+        "code": 0,
+        "msg": "success",
+        "data": {
+            "silicon_flow": silicon_flow_breaker.status() if silicon_flow_breaker is not None else None,
+            "backends": silicon_flow_router.status()
+        }
+    }
+
+@app.delete("/admin/cache", summary="清空分析结果缓存", description="清空内存层和SQLite层中的全部分析结果缓存")
+async def purge_cache():
+    purged = await analysis_cache.purge() if analysis_cache is not None else 0
+    return {"code": 0, "msg": "success", "data": {"purged": purged}}
+
 @app.get("/")
 def read_root():
     """API根路由"""
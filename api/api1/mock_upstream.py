@@ -0,0 +1,136 @@
+"""
+本地模拟上游服务 - OpenAI兼容的 /chat/completions 接口
+
+按"首字延迟 + 输出字数 / 生成速度"模拟大模型的耗时，根据提示词中要求输出的JSON字段
+返回对应的示例内容（要求回显"content"或重写"rewritten_content"时输出原文），支持普通和流式(stream=true)两种响应。
+可通过httpx.ASGITransport在进程内使用（基准测试），也可单独启动用于本地联调：
+    python mock_upstream.py --port 8010
+"""
+import re
+import json
+import time
+import asyncio
+import argparse
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# 各字段的示例输出
+SAMPLE_FIELDS = {
+    'title': '澳门特区政府公布新一轮旅游推广计划',
+    'keywords': ['澳门', '旅游', '推广计划', '客源市场'],
+    'tags': ['旅游', '经济', '澳闻'],
+    'categoryName': '澳闻',
+    'aiIntroduction': ('澳门特区政府日前公布新一轮旅游推广计划，将围绕国际客源市场拓展、'
+                       '文旅融合产品开发和智慧旅游建设三个方向推出多项措施，'
+                       '预计全年投入推广经费较去年增加约两成，以巩固旅游业复苏势头。'),
+    'markdown': ('# 新闻分析报告\n\n1. **新闻核心概括**\n   - 标题：旅游推广计划出台\n'
+                 '   - 内容：特区政府公布新一轮旅游推广计划，聚焦客源拓展与文旅融合。\n\n'
+                 '2. **背景与概要**\n   - 标题：复苏势头下的再发力\n'
+                 '   - 内容：旅游业持续复苏，政府希望通过新计划扩大国际客源，提升旅游产品吸引力，'
+                 '并借助智慧旅游建设改善旅客体验。\n\n'
+                 '3. **关键要点**\n   - 标题：三大方向多项措施\n   - 要点：\n'
+                 '     * 背景：旅客量恢复但国际客源占比仍偏低\n'
+                 '     * 措施：开拓东南亚及欧美市场，推出文旅融合线路\n'
+                 '     * 影响：有望带动酒店、零售及餐饮消费\n\n'
+                 '4. **重要信息与指标**\n   - 标题：经费与目标\n   - 信息：\n'
+                 '     * 推广经费较去年增加约两成\n     * 计划覆盖十余个重点客源市场\n'
+                 '     * 年内上线智慧旅游服务平台\n\n'
+                 '5. **结论与趋势**\n   - 标题：多元发展持续推进\n'
+                 '   - 内容：新计划体现经济适度多元的方向，旅游业有望继续稳步增长，'
+                 '后续成效取决于国际市场开拓进度。'),
+    'summary': ('本部分介绍澳门特区政府公布的新一轮旅游推广计划，涉及国际客源市场拓展、文旅融合产品开发和'
+                '智慧旅游建设，推广经费较去年增加约两成。')
+}
+
+# 提示词中要求输出的字段，如 "title": 或 "markdown":
+_FIELD_RE = re.compile(r'"(\w+)"\s*:')
+# 提示词中的新闻原文
+_CONTENT_RE = re.compile(r'新闻内容：(.*?)\n\s*请按', re.S)
+
+
+def build_output(prompt: str) -> str:
+    """
+    根据提示词生成模型输出
+
+    Args:
+        prompt: 用户消息中的提示词
+
+    Returns:
+        JSON格式的输出文本
+    """
+    match = _CONTENT_RE.search(prompt)
+    article = match.group(1) if match else ''
+    instructions = prompt[match.end():] if match else prompt
+    output = {}
+    for name in _FIELD_RE.findall(instructions):
+        if name in ('content', 'rewritten_content'):
+            output[name] = article
+        elif name in SAMPLE_FIELDS:
+            output[name] = SAMPLE_FIELDS[name]
+    return json.dumps(output, ensure_ascii=False)
+
+
+def create_app(first_token_latency: float = 0.5, chars_per_second: float = 40.0, chunk_chars: int = 8) -> FastAPI:
+    """
+    创建模拟上游应用
+
+    Args:
+        first_token_latency: 首字延迟（秒），模拟排队和处理输入的耗时
+        chars_per_second: 输出速度（字/秒）
+        chunk_chars: 流式响应每个分片的字数
+
+    Returns:
+        FastAPI应用
+    """
+    app = FastAPI(title="模拟大模型上游")
+    app.state.requests = 0
+
+    # 兼容带/v1前缀的base_url（与config中api_url一致时无需修改路径）
+    @app.post("/v1/chat/completions")
+    @app.post("/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        app.state.requests += 1
+        prompt = body['messages'][-1]['content']
+        output = build_output(prompt)
+        created = int(time.time())
+
+        if not body.get('stream'):
+            await asyncio.sleep(first_token_latency + len(output) / chars_per_second)
+            return JSONResponse({
+                'id': f'mock-{app.state.requests}',
+                'object': 'chat.completion',
+                'created': created,
+                'model': body.get('model'),
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': output},
+                             'finish_reason': 'stop'}],
+                'usage': {'prompt_tokens': len(prompt), 'completion_tokens': len(output),
+                          'total_tokens': len(prompt) + len(output)}
+            })
+
+        async def events():
+            await asyncio.sleep(first_token_latency)
+            for start in range(0, len(output), chunk_chars):
+                piece = output[start:start + chunk_chars]
+                await asyncio.sleep(len(piece) / chars_per_second)
+                chunk = {'id': f'mock-{app.state.requests}', 'object': 'chat.completion.chunk', 'created': created,
+                         'model': body.get('model'),
+                         'choices': [{'index': 0, 'delta': {'content': piece}, 'finish_reason': None}]}
+                yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="模拟大模型上游服务")
+    parser.add_argument('--port', type=int, default=8010, help="监听端口")
+    parser.add_argument('--first-token-latency', type=float, default=0.5, help="首字延迟（秒）")
+    parser.add_argument('--chars-per-second', type=float, default=40.0, help="输出速度（字/秒）")
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.first_token_latency, args.chars_per_second), host="0.0.0.0", port=args.port)
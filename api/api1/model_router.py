@@ -0,0 +1,182 @@
+"""
+多后端路由模块 - 按滚动延迟和错误率在多个OpenAI兼容后端之间选择，失败时自动切换
+
+每个后端是一个服务地址 + 模型的组合（硅基流动、其他云服务商或本地替身服务均可），
+带有权重、独立的限流器和熔断器。路由器记录每个后端最近window次调用的延迟和成败：
+  代价 = 平均延迟 × (1 + error_penalty × 错误率) / 权重
+每次选择代价最低且熔断器放行的后端；样本不足的后端优先试探，另有explore_rate比例的
+调用按权重随机选择，使各后端的统计保持新鲜。同一请求失败后重试时排除已失败的后端。
+"""
+import random
+import logging
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional
+
+from rate_limiter import AdaptiveRateLimiter
+from circuit_breaker import CircuitBreaker, OPEN
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class NoBackendAvailable(Exception):
+    """所有后端都处于熔断中"""
+
+
+class Backend:
+    """一个OpenAI兼容的后端及其最近调用的统计"""
+
+    def __init__(self, name: str, api_url: str, api_key: str, model: str, weight: float = 1.0,
+                 limiter: Optional[AdaptiveRateLimiter] = None, breaker: Optional[CircuitBreaker] = None,
+                 window: int = 50, json_mode: bool = False):
+        """
+        初始化后端
+
+        Args:
+            name: 后端名称，用于日志和状态接口
+            api_url: 服务地址（以/v1结尾的OpenAI兼容地址）
+            api_key: API密钥，本地替身服务可为空
+            model: 调用的模型名称
+            weight: 权重，越大分到的请求越多
+            limiter: 该后端的限流器，为None时不限流
+            breaker: 该后端的熔断器，为None时不熔断
+            window: 统计最近多少次调用
+            json_mode: 是否支持response_format的JSON输出模式
+        """
+        self.name = name
+        self.api_url = api_url.rstrip('/')
+        self.api_key = api_key
+        self.model = model
+        self.weight = weight
+        self.limiter = limiter
+        self.breaker = breaker
+        self.json_mode = json_mode
+        # 每次调用的结果：(耗时, 是否失败)
+        self._outcomes = deque(maxlen=window)
+        self.selected = 0
+
+    @property
+    def samples(self) -> int:
+        return len(self._outcomes)
+
+    def latency(self) -> Optional[float]:
+        """最近成功调用的平均耗时（秒），没有成功调用时返回None"""
+        durations = [duration for duration, failed in self._outcomes if not failed]
+        return sum(durations) / len(durations) if durations else None
+
+    def error_rate(self) -> float:
+        """最近调用的失败比例"""
+        if not self._outcomes:
+            return 0.0
+        return sum(1 for _, failed in self._outcomes if failed) / len(self._outcomes)
+
+    def record_success(self, duration: float) -> None:
+        """记录一次成功调用及其耗时（秒）"""
+        self._outcomes.append((duration, False))
+        if self.breaker is not None:
+            self.breaker.record_success(duration)
+
+    def record_rate_limited(self, duration: float) -> None:
+        """记录一次被限流的调用：路由统计计为失败，熔断器既不计成功也不计失败（只归还探测名额）"""
+        self._outcomes.append((duration, True))
+        if self.breaker is not None:
+            self.breaker.release()
+
+    def record_failure(self, duration: float) -> None:
+        """记录一次失败调用"""
+        self._outcomes.append((duration, True))
+        if self.breaker is not None:
+            self.breaker.record_failure()
+
+    def status(self) -> Dict[str, Any]:
+        """返回后端的模型、权重、延迟、错误率和熔断状态"""
+        latency = self.latency()
+        return {
+            'name': self.name,
+            'model': self.model,
+            'weight': self.weight,
+            'samples': self.samples,
+            'selected': self.selected,
+            'latency': round(latency, 3) if latency is not None else None,
+            'error_rate': round(self.error_rate(), 3),
+            'circuit': self.breaker.state if self.breaker is not None else None
+        }
+
+
+class ModelRouter:
+    """按延迟、错误率和权重选择后端"""
+
+    def __init__(self, backends: List[Backend], error_penalty: float = 4.0, explore_rate: float = 0.05,
+                 min_samples: int = 5):
+        """
+        初始化路由器
+
+        Args:
+            backends: 后端列表，第一个为主后端
+            error_penalty: 错误率对代价的放大系数
+            explore_rate: 按权重随机选择后端的调用比例
+            min_samples: 样本数低于该值的后端优先试探
+        """
+        if not backends:
+            raise ValueError("至少需要一个后端")
+        self.backends = backends
+        self.error_penalty = error_penalty
+        self.explore_rate = explore_rate
+        self.min_samples = min_samples
+
+    def cost(self, backend: Backend) -> float:
+        """后端的路由代价，越低越优先"""
+        latency = backend.latency()
+        if latency is None:
+            # 没有成功样本时按其他后端的平均延迟估计
+            known = [b.latency() for b in self.backends if b.latency() is not None]
+            latency = sum(known) / len(known) if known else 1.0
+        return latency * (1 + self.error_penalty * backend.error_rate()) / max(backend.weight, 1e-6)
+
+    @staticmethod
+    def _weighted_shuffle(backends: List[Backend]) -> List[Backend]:
+        """按权重随机排列（权重越大越靠前的概率越高）"""
+        keyed = [(random.random() ** (1 / max(b.weight, 1e-6)), b) for b in backends]
+        return [b for _, b in sorted(keyed, key=lambda item: item[0], reverse=True)]
+
+    def _ordered(self, backends: List[Backend]) -> List[Backend]:
+        cold = [b for b in backends if b.samples < self.min_samples]
+        warm = [b for b in backends if b.samples >= self.min_samples]
+        if random.random() < self.explore_rate:
+            warm = self._weighted_shuffle(warm)
+        else:
+            warm.sort(key=self.cost)
+        return self._weighted_shuffle(cold) + warm
+
+    def choose(self, exclude: Iterable[Backend] = ()) -> Backend:
+        """
+        选择一个后端（熔断器放行后即占用其探测名额）
+
+        Args:
+            exclude: 本次请求已失败的后端，没有其他可用后端时才会再次选择
+
+        Returns:
+            选中的后端
+
+        Raises:
+            NoBackendAvailable: 所有后端都处于熔断中
+        """
+        excluded = set(exclude)
+        fresh = [b for b in self.backends if b not in excluded]
+        tried = [b for b in self.backends if b in excluded]
+        for backend in self._ordered(fresh) + self._ordered(tried):
+            if backend.breaker is None or backend.breaker.allow():
+                backend.selected += 1
+                return backend
+        raise NoBackendAvailable("所有模型后端暂时不可用（熔断中），请稍后重试")
+
+    def has_alternative(self, exclude: Iterable[Backend]) -> bool:
+        """是否还有未失败且未熔断的后端（不占用探测名额）"""
+        excluded = set(exclude)
+        return any(b not in excluded and (b.breaker is None or b.breaker.state != OPEN)
+                   for b in self.backends)
+
+    def status(self) -> List[Dict[str, Any]]:
+        """返回各后端的状态"""
+        return [backend.status() for backend in self.backends]
@@ -1,11 +1,28 @@
 """
 新闻重写模块 - 调用Coze API重写新闻内容
+
+新闻内容只在请求体的parameters中按工作流开始节点的输入变量名发送一次，请求体只序列化一次（UTF-8，不转义中文），
+各次重试复用。支持三种执行方式：
+  - run: /v1/workflow/run，同步执行，工作流结束后一次性返回结果
+  - stream: /v1/workflow/stream_run，以服务端事件返回各输出节点的消息，执行期间持续有数据，
+    工作流出错时立即收到Error事件，不必等到读超时
+  - async: /v1/workflow/run（is_async=true）提交后立即返回execute_id，再按退避间隔查询执行记录；
+    等待期间只占用事件循环上的一个定时器，不占用连接和线程，适合执行时间长、待完成数量多的场景
 """
-import requests
+import httpx
 import json
 import time
+import random
+import asyncio
+import hashlib
 import logging
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
+
+from single_flight import SingleFlight
+from rate_limiter import AdaptiveRateLimiter
+from token_estimator import estimate_tokens
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from retry_policy import RetryPolicy, RetryableError, is_retryable_status, parse_retry_after, remaining
 
 # 配置日志
 logging.basicConfig(
@@ -18,11 +35,45 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Coze API"请求频率超限"错误码（部分限流以HTTP 200 + 错误码的形式返回）
+COZE_RATE_LIMIT_CODE = 4013
+
+# 各执行方式的接口路径
+RUN_URLS = {
+    'run': '/v1/workflow/run',
+    'stream': '/v1/workflow/stream_run',
+    'async': '/v1/workflow/run'
+}
+# 查询异步执行结果的接口路径
+RUN_HISTORY_URL = '/v1/workflows/{workflow_id}/run_histories/{execute_id}'
+
 class NewsRewriter:
-    """新闻重写API客户端"""
+    """新闻重写API客户端（长生命周期，内部持有keep-alive连接池，应在应用范围内共享）"""
     
-    def __init__(self, api_token=None, workflow_id=None, space_id=None, base_url=None, execute_mode=None):
-        """初始化API客户端"""
+    def __init__(self, api_token=None, workflow_id=None, space_id=None, base_url=None, execute_mode=None,
+                 max_connections: int = 100, max_keepalive_connections: int = 20, keepalive_expiry: float = 30,
+                 transport: Optional[httpx.AsyncBaseTransport] = None,
+                 rate_limiter: Optional[AdaptiveRateLimiter] = None,
+                 circuit_breaker: Optional[CircuitBreaker] = None,
+                 retry_policy: Optional[RetryPolicy] = None,
+                 input_parameter: str = 'input', parameters: Optional[Dict[str, Any]] = None,
+                 run_mode: str = 'run', poll_initial_delay: float = 1.0, poll_max_delay: float = 10.0,
+                 poll_multiplier: float = 1.5, async_timeout: float = 600.0, max_poll_errors: int = 5):
+        """
+        初始化API客户端
+
+        Args:
+            input_parameter: 新闻内容对应的工作流输入变量名（开始节点中定义的参数名）
+            parameters: 其他固定的工作流输入参数
+            run_mode: 执行方式，run（同步）、stream（流式）或async（异步提交后轮询结果）
+            poll_initial_delay: 异步执行时首次查询前的最短等待时间（秒）
+            poll_max_delay: 查询间隔上限（秒）
+            poll_multiplier: 工作流仍在执行时查询间隔的增长倍数
+            async_timeout: 单次异步执行的最长等待时间（秒），不超过请求的剩余时间
+            max_poll_errors: 连续查询失败达到该次数时放弃本次执行
+        """
+        if run_mode not in RUN_URLS:
+            raise ValueError(f"不支持的Coze执行方式: {run_mode}，可选: {', '.join(RUN_URLS)}")
         # 使用与其他模块相同的API令牌和工作流ID
         self.api_token = api_token or ''
         self.base_url = base_url or 'https://api.coze.cn'
@@ -32,103 +83,374 @@ class NewsRewriter:
         self.space_id = space_id or '7517113138517950515'
         # 添加执行模式 (从debug_url中提取)
         self.execute_mode = execute_mode or '2'
+        # 新闻内容对应的输入变量名、其他固定输入参数和执行方式
+        self.input_parameter = input_parameter
+        self.parameters = dict(parameters or {})
+        self.run_mode = run_mode
+        # 异步执行的轮询参数
+        self.poll_initial_delay = poll_initial_delay
+        self.poll_max_delay = poll_max_delay
+        self.poll_multiplier = poll_multiplier
+        self.async_timeout = async_timeout
+        self.max_poll_errors = max_poll_errors
+        # 异步执行耗时的指数移动平均（秒），用于确定首次查询的时间
+        self._typical_duration: Optional[float] = None
+        self._pending = 0
+        self._counters = {'submitted': 0, 'polls': 0, 'poll_errors': 0, 'succeeded': 0, 'failed': 0,
+                          'timeouts': 0}
         
         # 初始化信息不输出到控制台
         self.headers = {
             'Authorization': f'Bearer {self.api_token}',
             'Content-Type': 'application/json'
         }
+        
+        # 复用连接，避免每篇文章都重新与api.coze.cn进行TLS握手
+        limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            headers=self.headers,
+            limits=limits,
+            transport=transport
+        )
+        # 合并相同内容的并发重写请求
+        self.flight = SingleFlight('rewrite')
+        # 工作流调用限流，为None时不限流
+        self.rate_limiter = rate_limiter
+        # 熔断器，为None时不熔断；熔断时rewrite_news抛出CircuitOpenError
+        self.circuit_breaker = circuit_breaker
+        # 重试策略（指数退避加抖动，遵守请求截止时间）
+        self.retry_policy = retry_policy or RetryPolicy('coze', base_delay=2)
     
-    def rewrite_news(self, content: str, max_retries: int = 3, timeout: int = 30) -> Optional[Dict[str, Any]]:
+    async def aclose(self) -> None:
+        """关闭连接池，应在应用关闭时调用"""
+        await self._client.aclose()
+    
+    def stats(self) -> Dict[str, Any]:
+        """返回异步执行的提交、查询、成功、失败和超时计数，以及等待中的执行数和典型执行耗时"""
+        return {**self._counters, 'pending': self._pending, 'typical_duration': self._typical_duration}
+
+    async def _post_stream(self, body: bytes, timeout: float) -> Tuple[httpx.Response, Optional[Dict[str, Any]]]:
         """
-        调用Coze工作流重写新闻内容
+        以流式方式执行工作流并汇总事件
+
+        Returns:
+            (响应, 与run接口格式相同的结果)，非200响应时结果为None（响应体已读取）
+        """
+        request = self._client.build_request(
+            'POST', RUN_URLS['stream'], content=body,
+            timeout=httpx.Timeout(timeout, connect=min(10, timeout), pool=None)
+        )
+        response = await self._client.send(request, stream=True)
+        try:
+            if response.status_code != 200:
+                await response.aread()
+                return response, None
+            return response, await self._collect_events(response)
+        finally:
+            await response.aclose()
+
+    @staticmethod
+    async def _collect_events(response: httpx.Response) -> Dict[str, Any]:
+        """
+        汇总stream_run返回的服务端事件
+
+        Message事件中同一输出节点的内容按顺序拼接，最后输出消息的节点（结束节点）的内容作为工作流结果；
+        Error事件转为错误码和错误信息，Interrupt事件（工作流等待用户输入）视为不支持
+
+        Returns:
+            与run接口格式相同的结果（code、msg、data、usage、debug_url）
+        """
+        event = None
+        node = None
+        parts = []
+        usage = {}
+        debug_url = ''
+        count = 0
+        async for line in response.aiter_lines():
+            if line.startswith('event:'):
+                event = line[6:].strip()
+                continue
+            if not line.startswith('data:'):
+                continue
+            count += 1
+            try:
+                data = json.loads(line[5:].strip())
+            except ValueError:
+                continue
+            if not isinstance(data, dict):
+                continue
+            if event == 'Message':
+                message_node = data.get('node_id') or data.get('node_title')
+                if message_node != node:
+                    node = message_node
+                    parts = []
+                parts.append(data.get('content') or '')
+                usage = data.get('usage') or usage
+            elif event == 'Error':
+                return {'code': data.get('error_code', -1), 'msg': data.get('error_message', '工作流执行出错')}
+            elif event == 'Interrupt':
+                return {'code': -1, 'msg': '工作流需要用户输入，不支持中断'}
+            elif event == 'Done':
+                debug_url = data.get('debug_url', '')
+                break
+        logger.debug(f"API流式响应: {count} 个事件")
+        if not parts:
+            return {'code': -1, 'msg': '工作流没有输出消息'}
+        return {'code': 0, 'msg': '', 'data': ''.join(parts), 'usage': usage, 'debug_url': debug_url}
+
+    async def _attempt(self, body: bytes, timeout: float, estimated_tokens: int) -> Optional[Dict[str, Any]]:
+        """
+        调用一次工作流（经过熔断检查和限流）
+        
+        Args:
+            body: 序列化后的请求体
+            timeout: 本次尝试的超时时间（秒）
+            estimated_tokens: 预估token数
+            
+        Returns:
+            重写结果，不可重试的失败返回None
+            
+        Raises:
+            RetryableError: 限流、5xx、网络错误或工作流返回错误码
+            CircuitOpenError: 重写服务熔断中
+        """
+        if self.circuit_breaker is not None:
+            self.circuit_breaker.check()
+        if self.rate_limiter is not None:
+            await self.rate_limiter.acquire(estimated_tokens)
+        
+        logger.info(f"调用新闻重写API({self.run_mode})，请求体 {len(body)} 字节")
+        logger.debug(f"API请求URL: {self.base_url}{RUN_URLS[self.run_mode]}")
+        
+        started = time.monotonic()
+        result = None
+        try:
+            if self.run_mode == 'stream':
+                # 流式读取时单次读超时只限制事件间隔，整个执行过程另按timeout限制
+                response, result = await asyncio.wait_for(self._post_stream(body, timeout), timeout)
+            else:
+                response = await self._client.post(
+                    RUN_URLS[self.run_mode],
+                    content=body,
+                    timeout=httpx.Timeout(timeout, connect=min(10, timeout), pool=None)
+                )
+        except (httpx.TransportError, asyncio.TimeoutError) as e:
+            if self.circuit_breaker is not None:
+                self.circuit_breaker.record_failure()
+            raise RetryableError(f"请求异常: {str(e) or '执行超时'}") from e
+        duration = time.monotonic() - started
+        
+        logger.debug(f"API响应状态码: {response.status_code}")
+        if result is None and response.status_code == 200:
+            logger.debug(f"API响应: {len(response.content)} 字节")
+            try:
+                result = response.json()
+            except ValueError as e:
+                if self.circuit_breaker is not None:
+                    self.circuit_breaker.record_failure()
+                raise RetryableError(f"响应不是合法的JSON: {e}") from e
+        
+        # 限流：HTTP 429或Coze限流错误码（部分限流以HTTP 200 + 错误码的形式返回）
+        rate_limited = response.status_code == 429 or (result is not None and result.get('code') == COZE_RATE_LIMIT_CODE)
+        if self.circuit_breaker is not None:
+            if rate_limited:
+                # 限流说明上游没有真正处理请求，不作为熔断器的成功或失败
+                self.circuit_breaker.release()
+            elif response.status_code >= 500 or (result is not None and result.get('code') != 0):
+                # 5xx和工作流返回的错误码（含流式执行的Error事件）都是上游执行失败
+                self.circuit_breaker.record_failure()
+            else:
+                self.circuit_breaker.record_success(duration)
+        if rate_limited:
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            if self.rate_limiter is not None:
+                self.rate_limiter.on_rate_limited(retry_after)
+            raise RetryableError("新闻重写API限流", retry_after)
+        if response.status_code != 200:
+            logger.error(f"API请求失败，状态码: {response.status_code}")
+            logger.error(f"响应内容: {response.text[:500]}")
+            if is_retryable_status(response.status_code):
+                raise RetryableError(f"HTTP {response.status_code}",
+                                     parse_retry_after(response.headers.get('Retry-After')))
+            return None
+        if self.rate_limiter is not None:
+            self.rate_limiter.on_success()
+        
+        if result.get('code') != 0:
+            logger.error(f"API返回错误: {result.get('msg')}")
+            raise RetryableError(f"API返回错误: {result.get('msg')}")
+        
+        if self.run_mode == 'async':
+            execute_id = result.get('execute_id')
+            if not execute_id:
+                raise RetryableError("异步执行未返回execute_id")
+            logger.info(f"工作流已提交异步执行: {execute_id}")
+            return await self._wait_for_result(str(execute_id))
+        
+        logger.info("新闻重写API调用成功")
+        return self._parse_response(result)
+    
+    def _first_poll_delay(self) -> float:
+        """首次查询前的等待时间：从典型执行耗时的八成处开始，避免在工作流必然未完成时反复查询"""
+        if self._typical_duration is None:
+            return self.poll_initial_delay
+        return min(self.poll_max_delay, max(self.poll_initial_delay, self._typical_duration * 0.8))
+
+    async def _wait_for_result(self, execute_id: str) -> Optional[Dict[str, Any]]:
+        """
+        轮询异步执行的结果
+
+        查询间隔从_first_poll_delay开始，工作流仍在执行时按poll_multiplier增长到poll_max_delay，
+        并加入±10%的抖动，避免同时提交的大量执行在同一时刻查询；两次查询之间只在事件循环上等待
+
+        Args:
+            execute_id: 提交时返回的执行ID
+
+        Returns:
+            重写结果，等待超时返回None
+
+        Raises:
+            RetryableError: 工作流执行失败或连续max_poll_errors次查询失败（重新提交）
+        """
+        url = RUN_HISTORY_URL.format(workflow_id=self.workflow_id, execute_id=execute_id)
+        started = time.monotonic()
+        limit = self.async_timeout
+        left = remaining()
+        if left is not None:
+            limit = min(limit, left)
+        deadline = started + limit
+        delay = self._first_poll_delay()
+        errors = 0
+        self._counters['submitted'] += 1
+        self._pending += 1
+        try:
+            while True:
+                now = time.monotonic()
+                if now >= deadline:
+                    self._counters['timeouts'] += 1
+                    logger.error(f"异步执行 {execute_id} 在 {limit:.1f} 秒内未完成")
+                    return None
+                await asyncio.sleep(min(delay * random.uniform(0.9, 1.1), deadline - now))
+                delay = min(delay * self.poll_multiplier, self.poll_max_delay)
+                self._counters['polls'] += 1
+                try:
+                    history = await self._poll_once(url, deadline)
+                except RetryableError as e:
+                    self._counters['poll_errors'] += 1
+                    errors += 1
+                    if errors >= self.max_poll_errors:
+                        raise RetryableError(f"查询异步执行结果连续失败: {e}") from e
+                    logger.warning(f"查询异步执行 {execute_id} 失败(第{errors}次): {e}")
+                    if e.retry_after is not None:
+                        delay = max(delay, e.retry_after)
+                    continue
+                errors = 0
+                status = history.get('execute_status')
+                if status == 'Success':
+                    return self._finish(history, time.monotonic() - started)
+                if status == 'Fail':
+                    self._counters['failed'] += 1
+                    raise RetryableError(f"工作流执行失败: {history.get('error_message') or history.get('error_code')}")
+        finally:
+            self._pending -= 1
+
+    async def _poll_once(self, url: str, deadline: float) -> Dict[str, Any]:
+        """
+        查询一次执行记录
+
+        Returns:
+            执行记录（execute_status、output、error_message、usage等）
+
+        Raises:
+            RetryableError: 网络错误、非200响应、错误码或暂无执行记录
+        """
+        timeout = max(0.1, min(10.0, deadline - time.monotonic()))
+        try:
+            response = await self._client.get(url, timeout=httpx.Timeout(timeout, connect=min(10, timeout), pool=None))
+        except httpx.TransportError as e:
+            raise RetryableError(f"请求异常: {e}") from e
+        if response.status_code != 200:
+            raise RetryableError(f"HTTP {response.status_code}", parse_retry_after(response.headers.get('Retry-After')))
+        try:
+            result = response.json()
+        except ValueError as e:
+            raise RetryableError(f"响应不是合法的JSON: {e}") from e
+        if result.get('code') != 0:
+            raise RetryableError(f"API返回错误: {result.get('msg')}")
+        histories = result.get('data') or []
+        if not histories:
+            # 刚提交时可能还查不到执行记录
+            raise RetryableError("暂无执行记录")
+        return histories[0]
+
+    def _finish(self, history: Dict[str, Any], duration: float) -> Optional[Dict[str, Any]]:
+        """记录执行耗时，并把执行记录转为与run接口相同的格式后解析"""
+        self._counters['succeeded'] += 1
+        self._typical_duration = (duration if self._typical_duration is None
+                                  else 0.8 * self._typical_duration + 0.2 * duration)
+        logger.info(f"异步执行完成，耗时 {duration:.1f} 秒")
+        # output为结束节点输出的JSON字符串，形如{"Output": "..."}，Output为结束节点返回的文本
+        output = history.get('output') or ''
+        try:
+            wrapped = json.loads(output)
+        except ValueError:
+            wrapped = None
+        if isinstance(wrapped, dict) and isinstance(wrapped.get('Output'), str):
+            output = wrapped['Output']
+        return self._parse_response({'code': 0, 'data': output, 'usage': history.get('usage') or {},
+                                     'debug_url': history.get('debug_url', '')})
+
+    async def rewrite_news(self, content: str, max_retries: Optional[int] = None,
+                           timeout: int = 30) -> Optional[Dict[str, Any]]:
+        """
+        调用Coze工作流重写新闻内容，相同内容的并发请求只调用一次工作流
         
         Args:
             content: 原始新闻内容
-            max_retries: 最大重试次数
-            timeout: 请求超时时间（秒）
+            max_retries: 最大尝试次数，默认按重试策略（retry_max_attempts）
+            timeout: 单次请求超时时间（秒），不超过请求的剩余时间；异步执行时只限制提交请求，
+                     等待执行结果的时间由async_timeout限制
             
         Returns:
             重写结果，失败时返回None
+            
+        Raises:
+            CircuitOpenError: 重写服务熔断中
+            DeadlineExceeded: 请求剩余时间不足
         """
-        url = f"{self.base_url}/v1/workflow/run"
-        
-        # 构建请求数据 - 使用之前成功验证的完整参数格式
+        key = hashlib.sha256(content.encode('utf-8')).hexdigest()
+        return await self.flight.do(key, lambda: self._rewrite_news(content, max_retries, timeout))
+    
+    async def _rewrite_news(self, content: str, max_retries: Optional[int], timeout: int) -> Optional[Dict[str, Any]]:
+        """调用Coze工作流重写新闻内容（不经过请求合并）"""
+        # 内容只按工作流的输入变量名发送一次；请求体只序列化一次，各次重试复用
         data = {
             "workflow_id": self.workflow_id,
             "space_id": self.space_id,
             "execute_mode": self.execute_mode,
-            # 包含多种参数名格式以确保成功
-            "input": content,
-            "content": content,
-            "inputs": {
-                "content": content,
-                "input": content,
-                "text": content
-            },
-            "parameters": {
-                "content": content,
-                "input": content,
-                "text": content
-            }
+            "parameters": {**self.parameters, self.input_parameter: content}
         }
+        if self.run_mode == 'async':
+            data["is_async"] = True
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
         
-        for attempt in range(max_retries):
-            try:
-                logger.info(f"调用新闻重写API (尝试 {attempt + 1}/{max_retries})")
-                
-                # 打印请求数据用于调试
-                logger.debug(f"API请求URL: {url}")
-                logger.debug(f"API请求头: {self.headers}")
-                logger.debug(f"API请求数据: {json.dumps(data, ensure_ascii=False)}")
-                
-                response = requests.post(
-                    url, 
-                    headers=self.headers, 
-                    data=json.dumps(data),
-                    timeout=timeout
-                )
-                
-                # 打印响应数据用于调试
-                logger.debug(f"API响应状态码: {response.status_code}")
-                logger.debug(f"API响应内容: {response.text}")
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    
-                    if result.get('code') == 0:
-                        logger.info("新闻重写API调用成功")
-                        return self._parse_response(result)
-                    else:
-                        logger.error(f"API返回错误: {result.get('msg')}")
-                        logger.debug(f"完整响应: {result}")
-                        if attempt < max_retries - 1:
-                            time.sleep(2)
-                            continue
-                        return None
-                else:
-                    logger.error(f"API请求失败，状态码: {response.status_code}")
-                    logger.error(f"响应内容: {response.text}")
-                    if attempt < max_retries - 1:
-                        time.sleep(2)
-                        continue
-                    return None
-                    
-            except requests.exceptions.RequestException as e:
-                logger.error(f"请求异常 (尝试 {attempt + 1}/{max_retries}): {e}")
-                if attempt < max_retries - 1:
-                    time.sleep(2)
-                    continue
-                return None
-            except Exception as e:
-                logger.error(f"调用新闻重写API时出错 (尝试 {attempt + 1}/{max_retries}): {e}")
-                if attempt < max_retries - 1:
-                    time.sleep(2)
-                    continue
-                return None
+        # 输入内容 + 与输入等长的重写输出
+        estimated_tokens = estimate_tokens(content) * 2
         
-        logger.error(f"在 {max_retries} 次尝试后仍然失败")
-        return None
+        try:
+            # 单次超时不超过请求剩余时间，退避重试不会安排在截止时间之后
+            return await self.retry_policy.run(
+                lambda attempt_timeout: self._attempt(body, min(timeout, attempt_timeout), estimated_tokens),
+                max_attempts=max_retries
+            )
+        except RetryableError as e:
+            logger.error(f"新闻重写重试后仍然失败: {e}")
+            return None
     
     def _parse_response(self, response: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """
@@ -172,7 +494,7 @@ class NewsRewriter:
             return None
 
 
-def test_news_rewriting():
+async def test_news_rewriting():
     """测试新闻重写功能"""
     # 示例新闻内容
     sample_news = """
@@ -191,7 +513,10 @@ def test_news_rewriting():
     rewriter = NewsRewriter()
     
     # 调用API重写新闻
-    result = rewriter.rewrite_news(sample_news)
+    try:
+        result = await rewriter.rewrite_news(sample_news)
+    finally:
+        await rewriter.aclose()
     
     if result:
         print("\n" + "="*50)
@@ -211,4 +536,4 @@ def test_news_rewriting():
 
 
 if __name__ == "__main__":
-    test_news_rewriting()
+    asyncio.run(test_news_rewriting())
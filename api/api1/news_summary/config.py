@@ -8,7 +8,23 @@ logger = logging.getLogger(__name__)
 config = {
     'api_key': '',
     'api_url': 'https://api.siliconflow.cn/v1',
-    'api_model': 'Qwen/Qwen2.5-32B-Instruct'
+    'api_model': 'Qwen/Qwen2.5-32B-Instruct',
+    # 输入token预算：内容预估超过max_input_tokens时按input_budget_policy处理
+    # （trim 在段落或句子边界截断到预算内，reject 返回413）；0表示不限制
+    'max_input_tokens': 30000,
+    'input_budget_policy': 'trim',
+    # 上游重试（429、408、5xx、网络错误）：指数退避加抖动，单次调用最多retry_max_attempts次尝试
+    'retry_max_attempts': 4,
+    'retry_base_delay': 2.0,
+    'retry_max_delay': 30,
+    # 请求截止时间（秒）：默认request_timeout，可通过请求头X-Request-Timeout指定（不超过request_max_timeout），
+    # 重试和读取超时不会超过剩余时间
+    'request_timeout': 120,
+    'request_max_timeout': 600,
+    # 异步HTTP连接池配置（单个worker可同时保持数百个分析请求）
+    'max_connections': 500,
+    'max_keepalive_connections': 100,
+    'keepalive_expiry': 30
 }
 
 
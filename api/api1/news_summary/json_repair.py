@@ -0,0 +1,281 @@
+"""
+容错JSON解析模块 - 修复大模型输出中常见的JSON格式问题
+
+大模型偶尔输出略有问题的JSON，整次请求因此失败、客户端重试又要再等一次完整的生成。
+parse/loads 先按标准JSON解析；失败时截取对象以非严格模式解析（覆盖代码块标记和未转义换行这两种最常见的问题）；
+仍失败时单遍扫描修复以下问题后再解析：
+  - 对象前后的说明文字和```json代码块标记
+  - 字符串中未转义的换行、制表符等控制字符
+  - 字符串中未转义的双引号（如 "他说"好"" ）
+  - 无效的转义序列（如 \\( ）
+  - 对象或数组末尾多余的逗号、字段之间缺少的逗号
+  - 未加引号的键和Python风格的 True/False/None
+  - 输出被截断（达到max_tokens）时未闭合的字符串、对象和数组
+
+扫描只在结构字符处进入Python循环，字符串内容由正则整段跳过，修复开销与输出长度基本成正比。
+
+match_choice 将枚举字段（如栏目名称）模糊匹配到允许的取值。
+"""
+import re
+import json
+import difflib
+from typing import Any, Iterable, List, Optional, Tuple
+
+_WHITESPACE = ' \t\r\n'
+
+# 字符串内部需要逐个判断的字符：引号和反斜杠
+_STRING_SPECIAL = re.compile(r'["\\]')
+# 合法的转义序列
+_VALID_ESCAPE = re.compile(r'\\(?:["\\/bfnrt]|u[0-9a-fA-F]{4})')
+# 未加引号的字面量（数字、true/false/null 或裸露的键）
+_BARE_TOKEN = re.compile(r'[^\s,:\[\]{}"]+')
+_NUMBER = re.compile(r'-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][+-]?\d+)?$')
+_LITERALS = {'true': 'true', 'false': 'false', 'null': 'null',
+             'True': 'true', 'False': 'false', 'None': 'null'}
+# 字符串中的控制字符，以及换行、回车和制表符之外的控制字符
+_CONTROL = re.compile(r'[\x00-\x1f]')
+_OTHER_CONTROL = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+# 逗号之后以这些字符开头时，视为下一个字段或元素
+_VALUE_START = '"{[-0123456789'
+# 逗号之后是未加引号的键或字面量，如 ok: 或 true
+_BARE_NEXT = re.compile(r'(?:[A-Za-z_]\w*\s*:|(?:true|false|null|True|False|None)\b)')
+
+
+class JSONRepairError(ValueError):
+    """输出无法修复为JSON"""
+
+
+def _next_significant(text: str, pos: int) -> int:
+    """pos之后第一个非空白字符的位置，没有时返回len(text)"""
+    length = len(text)
+    while pos < length and text[pos] in _WHITESPACE:
+        pos += 1
+    return pos
+
+
+def _closes_value(text: str, pos: int) -> bool:
+    """
+    判断字符串值中位于pos-1的双引号是否为结束引号
+
+    引号之后是对象/数组的结尾、文本结尾，或是逗号且逗号后像是下一个字段/元素，
+    或换行后紧跟下一个字段（缺少逗号），视为结束引号；否则视为内容中未转义的引号。
+    """
+    nxt = _next_significant(text, pos)
+    if nxt >= len(text) or text[nxt] in '}]':
+        return True
+    if text[nxt] == ',':
+        after = _next_significant(text, nxt + 1)
+        return (after >= len(text) or text[after] in '}]' or text[after] in _VALUE_START
+                or _BARE_NEXT.match(text, after) is not None)
+    return text[nxt] == '"' and '\n' in text[pos:nxt]
+
+
+def repair_json(text: str) -> str:
+    """
+    修复文本中第一个JSON对象或数组的格式问题
+
+    Args:
+        text: 模型的原始输出
+
+    Returns:
+        可由json.loads解析的JSON文本（修复无法保证语义，仅保证语法）
+
+    Raises:
+        JSONRepairError: 文本中没有JSON对象或数组
+    """
+    # 优先取对象（模型输出的都是对象），没有对象时取数组
+    pos = text.find('{')
+    if pos < 0:
+        pos = text.find('[')
+    if pos < 0:
+        raise JSONRepairError("输出中没有JSON对象")
+    length = len(text)
+    out: List[str] = []
+    # 尚未闭合的容器（'}' 或 ']'）
+    stack: List[str] = []
+    # 上一个有效记号：open、comma、colon、key、value
+    last = 'open'
+
+    def strip_trailing_comma() -> None:
+        while out and out[-1] in _WHITESPACE:
+            out.pop()
+        if out and out[-1] == ',':
+            out.pop()
+
+    while pos < length:
+        char = text[pos]
+        if char in _WHITESPACE:
+            pos += 1
+            continue
+        if not stack and out:
+            # 顶层对象已结束，忽略其后的说明文字或代码块标记
+            break
+        in_object = bool(stack) and stack[-1] == '}'
+        expecting_key = in_object and last in ('open', 'comma')
+
+        if char in '}]':
+            strip_trailing_comma()
+            if last == 'key':
+                out.append(':null')
+            elif last == 'colon':
+                out.append('null')
+            out.append(stack.pop())
+            last = 'value'
+            pos += 1
+        elif char == ',':
+            if last not in ('open', 'comma'):
+                out.append(',')
+                last = 'comma'
+            pos += 1
+        elif char == ':':
+            if last == 'key':
+                out.append(':')
+                last = 'colon'
+            pos += 1
+        else:
+            if last in ('value', 'key') and stack:
+                # 缺少逗号（key之后缺少冒号时补null后再补逗号）
+                out.append(':null,' if last == 'key' else ',')
+                expecting_key = in_object
+            if char in '{[':
+                stack.append('}' if char == '{' else ']')
+                out.append(char)
+                last = 'open'
+                pos += 1
+            elif char == '"':
+                pos = _read_string(text, pos + 1, out, expecting_key)
+                last = 'key' if expecting_key else 'value'
+            else:
+                match = _BARE_TOKEN.match(text, pos)
+                token = match.group(0)
+                if expecting_key:
+                    out.append(json.dumps(token, ensure_ascii=False))
+                elif token in _LITERALS:
+                    out.append(_LITERALS[token])
+                elif _NUMBER.match(token):
+                    out.append(token)
+                else:
+                    out.append(json.dumps(token, ensure_ascii=False))
+                last = 'key' if expecting_key else 'value'
+                pos = match.end()
+
+    # 截断的输出：补全悬空的键值并闭合全部容器
+    if stack:
+        strip_trailing_comma()
+        if last == 'key':
+            out.append(':null')
+        elif last == 'colon':
+            out.append('null')
+        out.extend(reversed(stack))
+    return ''.join(out)
+
+
+def _escape_controls(chunk: str) -> str:
+    """转义字符串内容中的换行、回车和制表符，丢弃其余控制字符"""
+    if not _CONTROL.search(chunk):
+        return chunk
+    chunk = chunk.replace('\n', '\\n').replace('\r', '\\r').replace('\t', '\\t')
+    return _CONTROL.sub('', chunk)
+
+
+def _read_string(text: str, pos: int, out: List[str], is_key: bool) -> int:
+    """
+    读取起始引号之后的字符串内容并以合法JSON字符串写入out
+
+    Returns:
+        字符串结束后的位置
+    """
+    length = len(text)
+    out.append('"')
+    while True:
+        match = _STRING_SPECIAL.search(text, pos)
+        if match is None:
+            # 输出被截断在字符串中间
+            out.append(_escape_controls(text[pos:]))
+            out.append('"')
+            return length
+        index = match.start()
+        out.append(_escape_controls(text[pos:index]))
+        char = text[index]
+        if char == '"':
+            pos = index + 1
+            if is_key or _closes_value(text, pos):
+                out.append('"')
+                return pos
+            out.append('\\"')
+        else:
+            escape = _VALID_ESCAPE.match(text, index)
+            if escape:
+                out.append(escape.group(0))
+                pos = escape.end()
+            else:
+                out.append('\\\\')
+                pos = index + 1
+
+
+def parse(text: str) -> Tuple[Any, bool]:
+    """
+    容错解析模型输出的JSON
+
+    Args:
+        text: 模型的原始输出
+
+    Returns:
+        (解析结果, 是否经过修复)
+
+    Raises:
+        JSONRepairError: 修复后仍无法解析
+    """
+    try:
+        return json.loads(text), False
+    except json.JSONDecodeError:
+        pass
+    # 最常见的问题是代码块标记、前后的说明文字和字符串中直接输出的换行，
+    # 此时截取对象后用json模块的非严格模式即可解析，无需逐字符修复
+    start, end = text.find('{'), text.rfind('}')
+    candidate = text[start:end + 1] if 0 <= start < end else text
+    if not _OTHER_CONTROL.search(candidate):
+        try:
+            return json.loads(candidate, strict=False), True
+        except json.JSONDecodeError:
+            pass
+    repaired = repair_json(text)
+    try:
+        return json.loads(repaired), True
+    except json.JSONDecodeError as e:
+        raise JSONRepairError(f"输出无法修复为JSON: {e}") from e
+
+
+def loads(text: str) -> Any:
+    """容错解析模型输出的JSON，修复后仍无法解析时抛出JSONRepairError"""
+    return parse(text)[0]
+
+
+def match_choice(value: Any, choices: Iterable[str], cutoff: float = 0.6) -> Optional[str]:
+    """
+    将枚举字段的取值模糊匹配到允许的取值
+
+    依次尝试：完全匹配、去掉空白和括号等符号后匹配、取值中包含的最长选项、
+    相似度不低于cutoff的最接近选项。
+
+    Args:
+        value: 模型输出的取值，如 "【澳闻】" 或 "栏目：旅游"
+        choices: 允许的取值
+        cutoff: 相似度下限（0~1）
+
+    Returns:
+        匹配到的取值，无法匹配时返回None
+    """
+    if not isinstance(value, str):
+        return None
+    choices = list(choices)
+    if value in choices:
+        return value
+    cleaned = re.sub(r'[\s"\'“”‘’「」『』【】\[\]()（）《》<>:：,，.。/、]', '', value)
+    if cleaned in choices:
+        return cleaned
+    contained = [choice for choice in choices if choice in cleaned]
+    if contained:
+        return max(contained, key=len)
+    close = difflib.get_close_matches(cleaned, choices, n=1, cutoff=cutoff)
+    return close[0] if close else None
@@ -1,26 +1,39 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query
 from pydantic import BaseModel, Field
 from typing import List, Optional
+from contextlib import asynccontextmanager
 import logging
 
 # 导入配置
 from config import config
-from silicon_flow_analyzer import analyze_with_silicon_flow
+from silicon_flow_analyzer import analyze_with_silicon_flow, start_http_client, close_http_client, parse_fields
+from retry_policy import DeadlineMiddleware
 
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="新闻概要分析API", description="分析新闻内容并生成新闻概要和AI深度导读")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：启动时创建共享连接池，关闭时释放"""
+    await start_http_client()
+    yield
+    await close_http_client()
+
+app = FastAPI(title="新闻概要分析API", description="分析新闻内容并生成新闻概要和AI深度导读",
+              lifespan=lifespan)
+# 为每个请求设置截止时间，分析阶段的重试和读取超时不超过剩余时间
+app.add_middleware(DeadlineMiddleware, default_timeout=config['request_timeout'],
+                   max_timeout=config['request_max_timeout'])
 
 class NewsContent(BaseModel):
     """新闻内容请求模型"""
     content: str = Field(..., description="新闻内容")
 
 class NewsAnalysisResponse(BaseModel):
-    """新闻分析响应模型"""
-    briefSummary: str = Field(..., description="新闻简要概述（100字以内）")
-    markdown: str = Field(..., description="Markdown格式的分析报告")
+    """新闻分析响应模型（请求指定fields时只包含所需字段）"""
+    briefSummary: Optional[str] = Field(None, description="新闻简要概述（100字以内）")
+    markdown: Optional[str] = Field(None, description="Markdown格式的分析报告")
 
 class APIResponse(BaseModel):
     """API统一响应格式"""
@@ -28,21 +41,24 @@ class APIResponse(BaseModel):
     msg: str = "success"
     data: Optional[NewsAnalysisResponse] = None
 
-@app.post("/analyze", response_model=APIResponse, summary="分析新闻内容", 
-         description="分析新闻内容并生成新闻概要和AI深度导读")
-async def analyze_news(news: NewsContent):
+@app.post("/analyze", response_model=APIResponse, response_model_exclude_unset=True, summary="分析新闻内容",
+         description="分析新闻内容并生成新闻概要和AI深度导读；fields参数可只请求部分字段（如fields=briefSummary），"
+                     "提示词和响应随之精简")
+async def analyze_news(news: NewsContent,
+                       fields: Optional[str] = Query(None, description="只返回指定的字段，逗号分隔，可选：briefSummary、markdown")):
+    try:
+        projection = parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     try:
         content = news.content
         
         # 调用Silicon Flow服务进行分析
         logger.info("开始调用Silicon Flow服务分析内容...")
-        analysis_result = analyze_with_silicon_flow(content)
+        analysis_result = await analyze_with_silicon_flow(content, projection)
         
-        # 构建响应数据
-        response_data = NewsAnalysisResponse(
-            briefSummary=analysis_result['briefSummary'],
-            markdown=analysis_result['markdown']
-        )
+        # 构建响应数据（只包含所请求的字段）
+        response_data = NewsAnalysisResponse(**analysis_result)
         
         return APIResponse(
             code=0,
@@ -50,6 +66,10 @@ async def analyze_news(news: NewsContent):
             data=response_data
         )
         
+    except HTTPException as e:
+        # 保留内容超过输入预算(413)等状态码
+        logger.error(f"处理请求时出错: {e.detail}")
+        raise
     except Exception as e:
         logger.error(f"处理请求时出错: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
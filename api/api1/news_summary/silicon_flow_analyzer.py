@@ -1,9 +1,8 @@
 import os
-import json
 import logging
-import time
-import requests
+from typing import Optional, Tuple
 
+import httpx
 from fastapi import HTTPException
 
 # 配置日志
@@ -12,24 +11,174 @@ logger = logging.getLogger(__name__)
 
 # 导入配置
 from config import config
+import json_repair
+from token_estimator import estimate_tokens, get_default_estimator, truncate_to_tokens
+from retry_policy import RetryPolicy, RetryableError, DeadlineExceeded, is_retryable_status, parse_retry_after
 
 # 获取硅基流动API配置
 SILICON_FLOW_API_KEY = config['api_key']
 SILICON_FLOW_API_URL = config['api_url']
 API_MODEL = config['api_model']
 
-def analyze_with_silicon_flow(content: str) -> dict:
+# 可返回的分析字段（按输出顺序）
+ANALYSIS_FIELDS = ('briefSummary', 'markdown')
+
+# 各字段在输出JSON中的格式说明
+FIELD_SPECS = {
+    'briefSummary': '"briefSummary": "新闻简要概述（100字以内）"',
+    'markdown': '"markdown": "# 新闻分析报告\\n\\n1. **新闻核心概括**\\n   - 标题：[15字以内的标题]\\n   - 内容：[提炼新闻核心主题，概括主要事件]\\n\\n2. **背景与概要**\\n   - 标题：[贴合内容的标题]\\n   - 内容：[用几句话概述新闻的背景、主要事件和核心信息]\\n\\n3. **关键要点**\\n   - 标题：[贴合内容的标题]\\n   - 要点：\\n     * [要点1，可用\'背景\'、\'措施\'、\'影响\'等作为提示词]\\n     * [要点2]\\n     * [要点3]\\n\\n4. **重要信息与指标**\\n   - 标题：[贴合内容的标题]\\n   - 信息：\\n     * [关键数据/时间/地点/指标1]\\n     * [事实2]\\n     * [事实3]\\n\\n5. **结论与趋势**\\n   - 标题：[体现总结性质的标题]\\n   - 内容：[总结新闻的整体趋势、意义、影响或未来发展方向]"'
+}
+
+# 新闻分析提示词模板，{schema}为所请求字段的格式说明
+ANALYSIS_PROMPT_TEMPLATE = """
+    你是一名专业的新闻信息整理助手，擅长将各类新闻内容进行简要总结。请分析以下新闻内容，提取关键信息并按要求格式化输出，以简体中文输出。
+
+    新闻内容：{{content}}
+
+    请按以下结构分析并输出（保持JSON格式）：
+
+    {{{{
+        {schema}
+    }}}}
+
+    注意事项：
+    1. 保持分析客观、专业，避免主观臆测
+    2. 确保内容逻辑清晰，层次分明
+    3. 重点突出新闻的核心信息和深层含义
+    4. 确保JSON格式完全正确，所有字符串使用双引号
+    5. markdown格式中的换行使用\\n
+    6. 分析要有深度，但表述要简洁明了
+    """
+
+
+def parse_fields(value: Optional[str]) -> Optional[Tuple[str, ...]]:
+    """
+    解析客户端请求的字段列表（逗号分隔），按标准顺序排列
+
+    Args:
+        value: 如 "briefSummary"，为空时表示全部字段
+
+    Returns:
+        所需字段元组，请求全部字段或未指定时返回None（不投影）
+
+    Raises:
+        ValueError: 包含不支持或重复的字段
+    """
+    if not value:
+        return None
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    requested = set(names)
+    if len(requested) != len(names):
+        duplicated = sorted({name for name in names if names.count(name) > 1})
+        raise ValueError(f"字段重复: {', '.join(duplicated)}")
+    unknown = requested - set(ANALYSIS_FIELDS)
+    if unknown:
+        raise ValueError(f"不支持的字段: {', '.join(sorted(unknown))}，可选字段: {', '.join(ANALYSIS_FIELDS)}")
+    fields = tuple(name for name in ANALYSIS_FIELDS if name in requested)
+    return None if not fields or fields == ANALYSIS_FIELDS else fields
+
+
+def build_prompt(content: str, fields: Optional[Tuple[str, ...]] = None) -> str:
+    """按所请求的字段生成分析提示词，fields为None时请求全部字段"""
+    schema = ',\n        '.join(FIELD_SPECS[name] for name in fields or ANALYSIS_FIELDS)
+    return ANALYSIS_PROMPT_TEMPLATE.format(schema=schema).format(content=content)
+
+# 重试策略：429、5xx、连接失败和超时按指数退避加抖动重试，不超过请求的截止时间
+silicon_flow_retry = RetryPolicy(
+    'silicon_flow',
+    max_attempts=config['retry_max_attempts'],
+    base_delay=config['retry_base_delay'],
+    max_delay=config['retry_max_delay'],
+    attempt_timeout=30
+)
+
+# 应用级共享的异步HTTP客户端（连接池），由FastAPI lifespan负责创建和关闭
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+async def start_http_client(transport: Optional[httpx.AsyncBaseTransport] = None) -> httpx.AsyncClient:
+    """
+    创建共享的异步HTTP客户端，应在应用启动时调用
+
+    Args:
+        transport: 可选的自定义传输层（用于本地测试替身服务）
+
+    Returns:
+        共享的httpx.AsyncClient实例
+    """
+    global _http_client
+    if _http_client is None:
+        limits = httpx.Limits(
+            max_connections=config['max_connections'],
+            max_keepalive_connections=config['max_keepalive_connections'],
+            keepalive_expiry=config['keepalive_expiry']
+        )
+        # 连接超时10秒，读取超时30秒；连接池等待不设上限，由并发请求排队
+        timeout = httpx.Timeout(connect=10, read=30, write=30, pool=None)
+        _http_client = httpx.AsyncClient(
+            base_url=SILICON_FLOW_API_URL,
+            limits=limits,
+            timeout=timeout,
+            transport=transport
+        )
+    return _http_client
+
+
+async def close_http_client() -> None:
+    """关闭共享的异步HTTP客户端，应在应用关闭时调用"""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+async def get_http_client() -> httpx.AsyncClient:
+    """获取共享的异步HTTP客户端，未启动时按需创建"""
+    if _http_client is None:
+        return await start_http_client()
+    return _http_client
+
+
+def fit_input_budget(content: str) -> str:
+    """
+    按输入token预算检查新闻内容，超过时截断或拒绝（在调用API之前）
+
+    Args:
+        content: 新闻内容文本
+
+    Returns:
+        不超过预算的内容（未超过时原样返回）
+
+    Raises:
+        HTTPException: 超过预算且input_budget_policy为reject时返回413
+    """
+    tokens = estimate_tokens(content)
+    budget = config['max_input_tokens']
+    if not budget or tokens <= budget:
+        logger.info(f"内容预估输入token: {tokens}")
+        return content
+    if config['input_budget_policy'] == 'reject':
+        logger.warning(f"内容预估{tokens}个token，超过输入预算{budget}，拒绝处理")
+        raise HTTPException(status_code=413, detail=f"内容过长: 预估{tokens}个token，超过上限{budget}")
+    trimmed = truncate_to_tokens(content, budget)
+    logger.warning(f"内容预估{tokens}个token，超过输入预算{budget}，截断为{estimate_tokens(trimmed)}个token")
+    return trimmed
+
+
+async def analyze_with_silicon_flow(content: str, fields: Optional[Tuple[str, ...]] = None) -> dict:
     """
     调用硅基流动API分析新闻内容，生成概要和导读
     
     Args:
         content: 新闻内容文本
+        fields: 只生成并返回这些字段，为None时返回全部字段
         
     Returns:
         包含分析结果的字典
     """
     if not SILICON_FLOW_API_KEY:
         raise HTTPException(status_code=500, detail="硅基流动API密钥未配置，请检查.env文件")
+    content = fit_input_budget(content)
 
     # 构建请求头
     headers = {
@@ -43,80 +192,59 @@ def analyze_with_silicon_flow(content: str) -> dict:
     logger.info(f"API地址: {SILICON_FLOW_API_URL}")
     logger.info(f"使用模型: {API_MODEL}")
 
-    # 新闻分析提示词模板
-    ANALYSIS_PROMPT_TEMPLATE = """
-    你是一名专业的新闻信息整理助手，擅长将各类新闻内容进行简要总结。请分析以下新闻内容，提取关键信息并按要求格式化输出，以简体中文输出。
-
-    新闻内容：{content}
-
-    请按以下结构分析并输出（保持JSON格式）：
-
-    {{
-        "briefSummary": "新闻简要概述（100字以内）",
-        "markdown": "# 新闻分析报告\\n\\n1. **新闻核心概括**\\n   - 标题：[15字以内的标题]\\n   - 内容：[提炼新闻核心主题，概括主要事件]\\n\\n2. **背景与概要**\\n   - 标题：[贴合内容的标题]\\n   - 内容：[用几句话概述新闻的背景、主要事件和核心信息]\\n\\n3. **关键要点**\\n   - 标题：[贴合内容的标题]\\n   - 要点：\\n     * [要点1，可用'背景'、'措施'、'影响'等作为提示词]\\n     * [要点2]\\n     * [要点3]\\n\\n4. **重要信息与指标**\\n   - 标题：[贴合内容的标题]\\n   - 信息：\\n     * [关键数据/时间/地点/指标1]\\n     * [事实2]\\n     * [事实3]\\n\\n5. **结论与趋势**\\n   - 标题：[体现总结性质的标题]\\n   - 内容：[总结新闻的整体趋势、意义、影响或未来发展方向]"
-    }}
-
-    注意事项：
-    1. 保持分析客观、专业，避免主观臆测
-    2. 确保内容逻辑清晰，层次分明
-    3. 重点突出新闻的核心信息和深层含义
-    4. 确保JSON格式完全正确，所有字符串使用双引号
-    5. markdown格式中的换行使用\\n
-    6. 分析要有深度，但表述要简洁明了
-    """
-
     # 构建请求体
     payload = {
         'model': API_MODEL,
         'messages': [
             {'role': 'system', 'content': '你是一个专业的新闻分析助手。'},
-            {'role': 'user', 'content': ANALYSIS_PROMPT_TEMPLATE.format(content=content)}
+            {'role': 'user', 'content': build_prompt(content, fields)}
         ]
     }
 
-    # 重试机制配置
-    max_retries = 3
-    retry_delay = 2  # 初始重试延迟(秒)
-    retry_count = 0
-    response = None
+    client = await get_http_client()
 
-    while retry_count < max_retries:
+    async def attempt(timeout: float) -> httpx.Response:
+        # 发送API请求（复用连接池，不阻塞事件循环），单次超时不超过请求的剩余时间
         try:
-            # 发送API请求
-            response = requests.post(
-                f"{SILICON_FLOW_API_URL}/chat/completions",
-                json=payload,
-                headers=headers,
-                timeout=(10, 30)  # 连接超时10秒，读取超时30秒
-            )
-            response.raise_for_status()
-            result = response.json()
-            break
-        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
-            retry_count += 1
-            logger.warning(f"API调用失败(第{retry_count}/{max_retries}次): {str(e)}，将在{retry_delay}秒后重试")
-            time.sleep(retry_delay)
-            retry_delay *= 2  # 指数退避
-        except requests.exceptions.RequestException as e:
-            logger.error(f"API调用失败(不可重试): {str(e)}")
-            raise HTTPException(status_code=500, detail=f"调用Silicon Flow API失败: {str(e)}")
-
-    if retry_count >= max_retries and response is None:
-        raise HTTPException(status_code=500, detail=f"API调用超时，已重试{max_retries}次")
+            response = await client.post('/chat/completions', json=payload, headers=headers,
+                                         timeout=httpx.Timeout(timeout, connect=min(10, timeout), pool=None))
+        except httpx.TransportError as e:
+            raise RetryableError(f"{type(e).__name__}: {e}") from e
+        if is_retryable_status(response.status_code):
+            raise RetryableError(f"HTTP {response.status_code}", parse_retry_after(response.headers.get('Retry-After')))
+        return response
+
+    try:
+        response = await silicon_flow_retry.run(attempt)
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except RetryableError as e:
+        raise HTTPException(status_code=503, detail=f"调用Silicon Flow API失败，重试后仍未成功: {e}")
+    try:
+        response.raise_for_status()
+    except httpx.HTTPStatusError as e:
+        logger.error(f"API调用失败(不可重试): {str(e)}")
+        raise HTTPException(status_code=500, detail=f"调用Silicon Flow API失败: {str(e)}")
+    result = response.json()
+    prompt_tokens = (result.get('usage') or {}).get('prompt_tokens')
+    if prompt_tokens:
+        estimated = get_default_estimator().estimate_messages(payload['messages'])
+        logger.info(f"输入token: 预估{estimated}，实际{prompt_tokens}")
 
     try:
         # 解析JSON响应内容
-        content = result['choices'][0]['message']['content']
-        # 清理可能存在的控制字符
-        content = ''.join(char for char in content if ord(char) >= 32 or char in '\n\r\t')
-        analysis_result = json.loads(content)
+        # 容错解析（代码块标记、控制字符、多余逗号、截断等常见格式问题在此修复）
+        analysis_result = json_repair.loads(result['choices'][0]['message']['content'])
+        if not isinstance(analysis_result, dict):
+            raise json_repair.JSONRepairError("输出不是JSON对象")
 
         # 处理返回结果
-        return {
+        result = {
             "briefSummary": analysis_result.get('briefSummary', '')[:100],
             "markdown": analysis_result.get('markdown', '')
         }
-    except (json.JSONDecodeError, KeyError) as e:
+        return {name: result[name] for name in fields or ANALYSIS_FIELDS}
+    except (json_repair.JSONRepairError, KeyError) as e:
         logger.error(f"API返回格式异常: {str(e)}")
         raise HTTPException(status_code=500, detail=f"解析API响应失败: {str(e)}")
     except Exception as e:
@@ -0,0 +1,250 @@
+"""
+重试策略模块 - 指数退避 + 抖动、可重试状态分类、请求截止时间传递
+
+所有上游客户端（硅基流动、Coze、api3的同步客户端）共用同一套重试规则：
+  - 429、408、5xx、连接失败和超时可重试，其余错误立即失败
+  - 退避时间为指数增长上限内的随机值（full jitter），上游给出Retry-After时不早于该时间
+  - 每个HTTP请求的截止时间保存在contextvars中，由中间件从请求头或默认配置设置，
+    沿调用链传递到清理、重写、分析等各个阶段；重试不会安排在截止时间之后，
+    每次尝试的读取超时也会缩短到不超过剩余时间
+
+本模块不依赖具体的HTTP库，同步和异步调用均可使用。
+"""
+import time
+import random
+import asyncio
+import logging
+from email.utils import parsedate_to_datetime
+from contextvars import ContextVar, Token
+from typing import Awaitable, Callable, Optional, TypeVar
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+# 可重试的HTTP状态码
+RETRYABLE_STATUS = frozenset({408, 425, 429, 500, 502, 503, 504})
+
+# 当前请求的截止时间（time.monotonic()时刻），None表示不限
+_deadline: ContextVar[Optional[float]] = ContextVar('request_deadline', default=None)
+
+
+class DeadlineExceeded(Exception):
+    """请求剩余时间不足以完成下一次尝试"""
+
+
+class RetryableError(Exception):
+    """一次可重试的失败，由调用方在尝试函数中抛出"""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None, failover: bool = False):
+        """
+        Args:
+            message: 错误信息
+            retry_after: 上游要求的最短等待时间（秒）
+            failover: 下次尝试会切换到其他后端，无需退避
+        """
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.failover = failover
+
+
+def set_deadline(timeout: Optional[float]) -> Token:
+    """
+    设置当前上下文的截止时间（已有更早的截止时间时保留更早者）
+
+    Args:
+        timeout: 从现在起的剩余秒数，None表示不新增限制
+
+    Returns:
+        用于reset_deadline恢复的令牌
+    """
+    current = _deadline.get()
+    if timeout is None:
+        return _deadline.set(current)
+    deadline = time.monotonic() + timeout
+    return _deadline.set(deadline if current is None else min(current, deadline))
+
+
+def reset_deadline(token: Token) -> None:
+    """恢复设置前的截止时间"""
+    _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """当前上下文剩余的秒数，没有截止时间时返回None"""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def is_retryable_status(status_code: int) -> bool:
+    """判断HTTP状态码是否可重试"""
+    return status_code in RETRYABLE_STATUS
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    解析Retry-After响应头
+
+    Args:
+        value: 秒数或HTTP日期
+
+    Returns:
+        需要等待的秒数，无法解析时返回None
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """指数退避 + 抖动的重试策略，遵守上下文中的截止时间"""
+
+    def __init__(self, name: str, max_attempts: int = 3, base_delay: float = 1.0, max_delay: float = 30.0,
+                 multiplier: float = 2.0, attempt_timeout: float = 30.0, min_attempt_timeout: float = 1.0):
+        """
+        初始化重试策略
+
+        Args:
+            name: 上游名称，用于日志
+            max_attempts: 最大尝试次数（含首次）
+            base_delay: 首次重试的退避上限（秒）
+            max_delay: 退避上限（秒）
+            multiplier: 退避上限的增长倍数
+            attempt_timeout: 单次尝试的默认读取超时（秒）
+            min_attempt_timeout: 剩余时间低于该值时不再发起尝试
+        """
+        self.name = name
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.attempt_timeout = attempt_timeout
+        self.min_attempt_timeout = min_attempt_timeout
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """
+        第attempt次失败后的退避时间
+
+        Args:
+            attempt: 已失败的次数（从1开始）
+            retry_after: 上游要求的最短等待时间
+
+        Returns:
+            退避秒数
+        """
+        cap = min(self.max_delay, self.base_delay * self.multiplier ** (attempt - 1))
+        delay = random.uniform(0, cap)
+        return max(delay, retry_after) if retry_after is not None else delay
+
+    def timeout(self) -> float:
+        """
+        本次尝试可用的超时时间：默认超时与剩余时间中的较小者
+
+        Raises:
+            DeadlineExceeded: 剩余时间不足
+        """
+        left = remaining()
+        if left is None:
+            return self.attempt_timeout
+        if left < self.min_attempt_timeout:
+            raise DeadlineExceeded(f"调用{self.name}前请求已超过截止时间")
+        return min(self.attempt_timeout, left)
+
+    def _next_delay(self, attempt: int, max_attempts: int, error: RetryableError) -> Optional[float]:
+        """计算下一次重试前的等待时间，不应再重试时返回None"""
+        if attempt >= max_attempts:
+            return None
+        delay = 0.0 if error.failover else self.backoff(attempt, error.retry_after)
+        left = remaining()
+        if left is not None and left - delay < self.min_attempt_timeout:
+            # 等待结束后已来不及完成一次尝试
+            return None
+        return delay
+
+    async def run(self, attempt_fn: Callable[[float], Awaitable[T]], max_attempts: Optional[int] = None) -> T:
+        """
+        按策略执行异步调用
+
+        Args:
+            attempt_fn: 执行一次尝试的协程函数，参数为本次可用的超时秒数；
+                        可重试的失败应抛出RetryableError，其他异常会立即向上抛出
+            max_attempts: 覆盖默认的最大尝试次数
+
+        Returns:
+            attempt_fn的返回值
+
+        Raises:
+            RetryableError: 重试次数用尽或剩余时间不足以再次重试时，抛出最后一次的错误
+            DeadlineExceeded: 首次尝试前剩余时间已不足
+        """
+        max_attempts = max_attempts or self.max_attempts
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                return await attempt_fn(self.timeout())
+            except RetryableError as e:
+                delay = self._next_delay(attempt, max_attempts, e)
+                if delay is None:
+                    logger.error(f"{self.name} 调用失败，不再重试(第{attempt}/{max_attempts}次): {e}")
+                    raise
+                logger.warning(f"{self.name} 调用失败(第{attempt}/{max_attempts}次): {e}，{delay:.1f}秒后重试")
+                await asyncio.sleep(delay)
+
+    def run_sync(self, attempt_fn: Callable[[float], T], max_attempts: Optional[int] = None) -> T:
+        """按策略执行同步调用，参数和异常与run相同"""
+        max_attempts = max_attempts or self.max_attempts
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                return attempt_fn(self.timeout())
+            except RetryableError as e:
+                delay = self._next_delay(attempt, max_attempts, e)
+                if delay is None:
+                    logger.error(f"{self.name} 调用失败，不再重试(第{attempt}/{max_attempts}次): {e}")
+                    raise
+                logger.warning(f"{self.name} 调用失败(第{attempt}/{max_attempts}次): {e}，{delay:.1f}秒后重试")
+                time.sleep(delay)
+
+
+class DeadlineMiddleware:
+    """
+    ASGI中间件：为每个HTTP请求设置截止时间
+
+    优先使用请求头X-Request-Timeout（秒，不超过max_timeout）；没有请求头时，
+    只对default_paths中的路径使用默认超时（批量、流式等长时间接口不设默认截止时间）。
+    """
+
+    def __init__(self, app, default_timeout: float, max_timeout: float, default_paths=('/analyze',)):
+        self.app = app
+        self.default_timeout = default_timeout
+        self.max_timeout = max_timeout
+        self.default_paths = set(default_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        timeout = self.default_timeout if scope['path'] in self.default_paths else None
+        for name, value in scope.get('headers', []):
+            if name == b'x-request-timeout':
+                try:
+                    timeout = min(float(value), self.max_timeout)
+                except ValueError:
+                    pass
+                break
+        token = set_deadline(timeout)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            reset_deadline(token)
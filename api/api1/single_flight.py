@@ -0,0 +1,94 @@
+"""
+单飞（single-flight）模块 - 合并相同内容的并发上游调用
+
+同一个键同时只会有一个上游调用在执行，其余并发请求等待并共享该调用的结果。
+上游调用在独立的任务中运行：单个等待者被取消不会影响其他等待者，
+只有当所有等待者都已离开时才会取消上游调用。异常会传递给所有等待者，且不会被缓存。
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, TypeVar
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+
+class _Call:
+    """一次正在执行的上游调用"""
+
+    def __init__(self, task: "asyncio.Task"):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """按键合并并发调用"""
+
+    def __init__(self, name: str):
+        """
+        初始化
+
+        Args:
+            name: 名称，用于日志和统计
+        """
+        self.name = name
+        self._calls: Dict[str, _Call] = {}
+        self._counters = {
+            'calls': 0,
+            'coalesced': 0,
+            'errors': 0,
+            'cancelled': 0
+        }
+
+    def _forget(self, key: str, call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def _on_done(self, key: str, call: _Call, task: "asyncio.Task") -> None:
+        self._forget(key, call)
+        if task.cancelled():
+            self._counters['cancelled'] += 1
+        elif task.exception() is not None:
+            self._counters['errors'] += 1
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        执行调用，若相同键的调用正在进行则等待其结果
+
+        Args:
+            key: 合并键（通常为内容哈希）
+            fn: 返回协程的无参函数，只在没有进行中的调用时执行
+
+        Returns:
+            上游调用的结果
+        """
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda task: self._on_done(key, call, task))
+            self._counters['calls'] += 1
+        else:
+            self._counters['coalesced'] += 1
+            logger.info(f"[{self.name}] 合并进行中的相同请求: {key[:12]} (当前等待数 {call.waiters + 1})")
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            if call.task.cancelled():
+                raise
+            # 当前等待者被取消；若已无其他等待者则取消上游调用
+            if call.waiters == 1 and not call.task.done():
+                self._forget(key, call)
+                call.task.cancel()
+            raise
+        finally:
+            call.waiters -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        """返回调用次数、被合并的请求数等计数"""
+        return {**self._counters, 'in_flight': len(self._calls)}
@@ -0,0 +1,54 @@
+import unittest
+
+from boilerplate import BoilerplateRemover
+from content_cleaner import Paragraph, extract_paragraphs, text_paragraphs
+
+ARTICLE = '''<p>本报讯（记者 张三）澳门特区政府日前公布新一轮旅游推广计划，涉及客源市场拓展等方向。</p>
+<p>分享到：微信 微博 QQ空间</p><p>&nbsp;</p><p>◇</p>
+<p>关闭边境口岸的决定引发热议。</p>
+<p>旅游局表示，今年推广经费较去年增加约两成。</p><p>旅游局表示，今年推广经费较去年增加约两成。</p>
+<p>（责任编辑：李四）</p><p>版权所有 © 澳门日报</p>
+<p>相关新闻：</p><ul><li><a href="/1">澳门旅游业复苏</a></li><li><a href="/2">酒店入住率上升</a></li></ul>'''
+
+
+class TestBoilerplateRemover(unittest.TestCase):
+    def test_rules(self):
+        """去除电头署名、分享按钮、符号段落、重复段落、责任编辑、版权和相关新闻，保留正文"""
+        remover = BoilerplateRemover(repeat_articles=0)
+        kept = remover.strip(extract_paragraphs(ARTICLE))
+        self.assertEqual([paragraph.text for paragraph in kept], [
+            '澳门特区政府日前公布新一轮旅游推广计划，涉及客源市场拓展等方向。',
+            '关闭边境口岸的决定引发热议。',
+            '旅游局表示，今年推广经费较去年增加约两成。'
+        ])
+        stats = remover.stats()
+        self.assertEqual(stats['requests'], 1)
+        self.assertGreater(stats['tokens_saved'], 0)
+
+    def test_link_density(self):
+        """链接密集的段落去除，正文中的少量链接保留"""
+        paragraphs = extract_paragraphs('<p>正文内容较长，其中提到<a href="/a">旅游局</a>的公告。</p>'
+                                        '<div><a href="/">首页</a> | <a href="/n">新闻</a> | <a href="/s">体育</a></div>')
+        kept = BoilerplateRemover().strip(paragraphs)
+        self.assertEqual([paragraph.text for paragraph in kept], ['正文内容较长，其中提到旅游局的公告。'])
+
+    def test_repeated_across_articles(self):
+        """结尾的相同短段落在3篇不同文章中出现后去除；同一篇重复提交不计数"""
+        remover = BoilerplateRemover(repeat_articles=3)
+
+        def article(index):
+            return [Paragraph(f'第{index}篇新闻的正文内容。' * 5), Paragraph('欢迎订阅澳门日报电子版')]
+
+        self.assertEqual(len(remover.strip(article(1))), 2)
+        self.assertEqual(len(remover.strip(article(1))), 2)
+        self.assertEqual(len(remover.strip(article(2))), 2)
+        self.assertEqual(len(remover.strip(article(3))), 1)
+
+    def test_keeps_original_when_too_much_removed(self):
+        """去除后剩余过少时保留原文"""
+        paragraphs = text_paragraphs('编辑：张三\n来源：澳门日报\n短讯')
+        self.assertEqual(BoilerplateRemover(min_keep_ratio=0.5).strip(paragraphs), paragraphs)
+
+
+if __name__ == '__main__':
+    unittest.main()
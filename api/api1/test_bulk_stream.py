@@ -0,0 +1,100 @@
+import json
+import asyncio
+import unittest
+
+from fastapi import HTTPException
+
+from bulk_stream import iter_ndjson_lines, process_ndjson, LineTooLongError
+
+
+async def chunked(*chunks: bytes):
+    for chunk in chunks:
+        yield chunk
+
+
+async def collect(iterator):
+    return [item async for item in iterator]
+
+
+class TestIterNdjsonLines(unittest.TestCase):
+    def test_split_across_chunks(self):
+        """跨块的行和多字节字符正确拼接，跳过空行，末尾无换行的行也会输出"""
+        data = '{"content": "新闻一"}\n\n{"content": "新闻二"}'.encode('utf-8')
+        chunks = [data[i:i + 5] for i in range(0, len(data), 5)]
+        lines = asyncio.run(collect(iter_ndjson_lines(chunked(*chunks), 1024)))
+        self.assertEqual(lines, ['{"content": "新闻一"}', '{"content": "新闻二"}'])
+
+    def test_line_too_long(self):
+        """未结束的行超过max_line_bytes时抛出LineTooLongError"""
+        async def run():
+            lines = iter_ndjson_lines(chunked(b'{"content": "a"}\n', b'x' * 10, b'x' * 10), 16)
+            self.assertEqual(await lines.__anext__(), '{"content": "a"}')
+            with self.assertRaises(LineTooLongError):
+                await lines.__anext__()
+        asyncio.run(run())
+
+
+class TestProcessNdjson(unittest.TestCase):
+    def run_bulk(self, lines, handler, concurrency=2):
+        async def source():
+            for line in lines:
+                yield line
+
+        async def run():
+            output = await collect(process_ndjson(source(), handler, concurrency))
+            return [json.loads(chunk) for chunk in output]
+        return asyncio.run(run())
+
+    def test_concurrency_is_bounded(self):
+        """同时处理的记录数不超过concurrency，所有记录都有结果"""
+        running = 0
+        peak = 0
+
+        async def handler(record):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return {'title': record['content']}
+
+        lines = [json.dumps({'id': i, 'content': f'新闻{i}'}) for i in range(10)]
+        results = self.run_bulk(lines, handler, concurrency=3)
+        self.assertEqual(peak, 3)
+        self.assertEqual(sorted(r['id'] for r in results), list(range(10)))
+        self.assertTrue(all(r['code'] == 0 for r in results))
+
+    def test_line_errors_do_not_abort(self):
+        """格式错误、缺少content和处理失败的行各自返回错误，其余行正常处理"""
+        async def handler(record):
+            if record['content'] == 'bad':
+                raise HTTPException(status_code=502, detail='上游失败')
+            return {'title': record['content']}
+
+        lines = ['{not json', json.dumps({'id': 'x'}), json.dumps({'id': 'b', 'content': 'bad'}),
+                 json.dumps({'id': 'ok', 'content': '新闻'})]
+        results = self.run_bulk(lines, handler)
+        errors = [r for r in results if r['id'] is None]
+        self.assertEqual(sorted(r['line'] for r in errors), [1, 2])
+        self.assertTrue(all(r['code'] == 400 for r in errors))
+        by_id = {r['id']: r for r in results if r['id'] is not None}
+        self.assertEqual(by_id['b']['code'], 502)
+        self.assertEqual(by_id['ok'], {'id': 'ok', 'code': 0, 'msg': 'success', 'data': {'title': '新闻'}})
+
+    def test_line_too_long_reported_after_pending(self):
+        """读取时超长的行在已提交的记录完成后以413结束输出"""
+        async def handler(record):
+            await asyncio.sleep(0.01)
+            return {'title': record['content']}
+
+        async def run():
+            lines = iter_ndjson_lines(chunked(b'{"id": 1, "content": "a"}\n', b'x' * 64), 32)
+            output = await collect(process_ndjson(lines, handler, 4))
+            return [json.loads(chunk) for chunk in output]
+        results = asyncio.run(run())
+        self.assertEqual([r['code'] for r in results], [0, 413])
+        self.assertEqual(results[1]['line'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+import unittest
+
+from cascade import CascadeStats, validate_analysis
+from mock_upstream import SAMPLE_FIELDS
+
+
+class TestValidateAnalysis(unittest.TestCase):
+    def test_valid_output(self):
+        """格式完整的输出通过校验"""
+        self.assertEqual(validate_analysis(dict(SAMPLE_FIELDS)), [])
+
+    def test_invalid_fields(self):
+        """栏目、标题、关键词、标签和报告结构不合格时给出对应原因"""
+        result = dict(SAMPLE_FIELDS, categoryName='财经', title='标' * 41, keywords=['澳门', '旅游'],
+                      tags=['旅游', '经济', ''])
+        self.assertEqual(validate_analysis(result),
+                         ['title_too_long', 'category_invalid', 'keywords_invalid', 'tags_invalid'])
+
+    def test_markdown_sections(self):
+        """分析报告缺少部分时不通过"""
+        markdown = SAMPLE_FIELDS['markdown'].split('5. **')[0]
+        self.assertEqual(validate_analysis(dict(SAMPLE_FIELDS, markdown=markdown)), ['markdown_sections'])
+        self.assertEqual(validate_analysis(dict(SAMPLE_FIELDS, markdown=None)), ['markdown_sections'])
+
+
+class TestCascadeStats(unittest.TestCase):
+    def test_escalation_and_savings(self):
+        """升级率和节省估算：采用小模型结果节省大模型耗时，升级时浪费小模型耗时"""
+        stats = CascadeStats(small_price=0, large_price=1e6)
+        self.assertIsNone(stats.stats()['latency_saved_seconds'])
+        stats.record_small(1.0, 100, [])
+        stats.record_small(1.0, 100, [])
+        stats.record_small(1.0, 100, ['category_invalid'])
+        stats.record_large(5.0, 300)
+        summary = stats.stats()
+        self.assertEqual(summary['escalation_rate'], round(1 / 3, 4))
+        self.assertEqual(summary['reasons'], {'category_invalid': 1})
+        self.assertEqual(summary['latency_saved_seconds'], 2 * 5.0 - 2.0 - 1.0)
+        self.assertEqual(summary['cost_saved'], 2 * 300)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,31 @@
+import unittest
+
+from chunking import chunk_text, split_paragraphs
+from token_estimator import estimate_tokens
+
+
+class TestChunking(unittest.TestCase):
+    def test_packs_paragraphs_in_order(self):
+        """相邻段落装入同一分块，不超过上限，且保持原文顺序"""
+        paragraphs = [f'第{i}段' + '新闻内容' * 20 for i in range(10)]
+        chunks = chunk_text('\n\n'.join(paragraphs), 200)
+        self.assertGreater(len(chunks), 1)
+        for chunk in chunks:
+            self.assertLessEqual(sum(estimate_tokens(p) for p in split_paragraphs(chunk)), 200)
+        self.assertEqual(split_paragraphs('\n'.join(chunks)), paragraphs)
+
+    def test_long_paragraph_split_on_sentences(self):
+        """超长段落按句子切分，单句超长时硬切"""
+        sentence = '澳门特区政府今日公布新一轮旅游推广计划。'
+        chunks = chunk_text(sentence * 30 + '长' * 500, 100)
+        self.assertTrue(all(estimate_tokens(chunk) <= 101 for chunk in chunks))
+        self.assertEqual(''.join(''.join(split_paragraphs(chunk)) for chunk in chunks), sentence * 30 + '长' * 500)
+
+    def test_short_text_single_chunk(self):
+        """短文本只有一个分块，空文本没有分块"""
+        self.assertEqual(chunk_text('短新闻\n第二段', 1000), ['短新闻\n第二段'])
+        self.assertEqual(chunk_text('\n\n', 1000), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
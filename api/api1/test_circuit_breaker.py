@@ -0,0 +1,66 @@
+import time
+import unittest
+
+from circuit_breaker import CircuitBreaker, CircuitOpenError, CLOSED, OPEN, HALF_OPEN
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def test_opens_on_failure_rate(self):
+        """失败率达到阈值后打开并快速失败"""
+        breaker = CircuitBreaker('test', window_size=10, min_calls=4, failure_rate=0.5)
+        for _ in range(2):
+            self.assertTrue(breaker.allow())
+            breaker.record_success(0.1)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CLOSED)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, OPEN)
+        with self.assertRaises(CircuitOpenError):
+            breaker.check()
+        self.assertEqual(breaker.status()['rejected'], 1)
+
+    def test_opens_on_slow_calls(self):
+        """慢调用率达到阈值后打开"""
+        breaker = CircuitBreaker('test', min_calls=3, slow_call_duration=1, slow_call_rate=0.6)
+        breaker.record_success(0.1)
+        breaker.record_success(5)
+        breaker.record_success(5)
+        self.assertEqual(breaker.state, OPEN)
+
+    def test_half_open_probes(self):
+        """打开期满后放行有限探测调用，成功则关闭，失败则重新打开"""
+        breaker = CircuitBreaker('test', min_calls=1, open_duration=0.05, half_open_max_calls=2)
+        breaker.record_failure()
+        self.assertFalse(breaker.allow())
+        time.sleep(0.06)
+
+        self.assertTrue(breaker.allow())
+        self.assertEqual(breaker.state, HALF_OPEN)
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        breaker.record_success(0.1)
+        breaker.record_success(0.1)
+        self.assertEqual(breaker.state, CLOSED)
+
+        breaker.record_failure()
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, OPEN)
+
+    def test_release_is_neutral(self):
+        """被限流的探测调用只归还名额，不关闭熔断器"""
+        breaker = CircuitBreaker('test', min_calls=1, open_duration=0.05, half_open_max_calls=1)
+        breaker.record_failure()
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        breaker.release()
+        self.assertEqual(breaker.state, HALF_OPEN)
+        self.assertTrue(breaker.allow())
+        breaker.record_success(0.1)
+        self.assertEqual(breaker.state, CLOSED)
+
+
+if __name__ == '__main__':
+    unittest.main()
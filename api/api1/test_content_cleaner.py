@@ -0,0 +1,54 @@
+import unittest
+
+from content_cleaner import HTMLTextExtractor, clean_html_content, extract_paragraphs, extract_text, looks_like_html
+
+PAGE = '''<!DOCTYPE html>
+<html><head><title>新闻标题</title><meta charset="utf-8"><style>p { margin: 0; }</style>
+<script>var html = "<p>脚本中的标签</p>";</script></head>
+<body><article><h1>澳门公布旅游推广计划</h1>
+<p>特区政府&nbsp;日前公布新一轮计划&amp;措施。<br>推广经费较去年增加约两成。</p >
+<p>计划包括<strong>三个</strong>方向<p>缺少结束标签的段落
+<!-- 编辑备注 --><div>&#12288;&lt;附件&gt; <img src="a.jpg" alt="配图"/></div></article></body></html>'''
+
+EXPECTED = ['澳门公布旅游推广计划', '特区政府 日前公布新一轮计划&措施。', '推广经费较去年增加约两成。',
+            '计划包括三个方向', '缺少结束标签的段落', '<附件>']
+
+
+class TestHTMLTextExtractor(unittest.TestCase):
+    def test_extracts_paragraphs(self):
+        """段落类标签处断段，去掉其余标签、脚本样式和注释，解码实体"""
+        self.assertEqual(extract_text(PAGE), '\n'.join(EXPECTED))
+
+    def test_streamed_input(self):
+        """在任意位置切分输入，结果与整篇输入一致"""
+        for size in (1, 7, 64):
+            extractor = HTMLTextExtractor()
+            paragraphs = []
+            for start in range(0, len(PAGE), size):
+                paragraphs.extend(extractor.feed(PAGE[start:start + size]))
+            paragraphs.extend(extractor.close())
+            self.assertEqual([paragraph.text for paragraph in paragraphs], EXPECTED)
+
+    def test_plain_text_lines_kept(self):
+        """纯文本中的换行保持为段落，段内空白合并"""
+        self.assertEqual(clean_html_content('第一段  内容\n\n\n第二段<br/>第三段'), '第一段 内容\n第二段\n第三段')
+
+    def test_unclosed_skipped_element_before_body(self):
+        """head中未闭合的title等元素不吞掉正文"""
+        self.assertEqual(extract_text('<head><title>标题<noscript><body><p>正文</p></body>'), '正文')
+
+    def test_link_density(self):
+        """记录段落中链接文字的比例"""
+        paragraphs = extract_paragraphs('<li><a href="/a">相关新闻标题</a></li><p>正文<a href="/b">链接</a>正文</p>')
+        self.assertEqual([paragraph.link_density for paragraph in paragraphs], [1.0, 2 / 6])
+
+    def test_looks_like_html(self):
+        """只有标签或实体才视为HTML，比较符号不算"""
+        self.assertTrue(looks_like_html('<p>正文</p>'))
+        self.assertTrue(looks_like_html('正文</p >'))
+        self.assertTrue(looks_like_html('A&amp;B'))
+        self.assertFalse(looks_like_html('a < b 且 c > d'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import asyncio
+import unittest
+
+from hedging import HedgePolicy
+
+
+def warmed_policy(**kwargs) -> HedgePolicy:
+    """已有足够延迟样本（均为0.05秒）的对冲策略"""
+    policy = HedgePolicy('test', min_delay=0.05, min_samples=10, **kwargs)
+    for _ in range(10):
+        policy.latency.record(0.05)
+    return policy
+
+
+class TestHedgePolicy(unittest.TestCase):
+    def test_no_hedge_without_samples(self):
+        """样本不足时不对冲"""
+        async def run():
+            policy = HedgePolicy('test', budget=1, min_delay=0.01)
+            calls = 0
+
+            async def upstream():
+                nonlocal calls
+                calls += 1
+                await asyncio.sleep(0.05)
+                return 'ok'
+
+            self.assertEqual(await policy.run(upstream), 'ok')
+            self.assertEqual(calls, 1)
+            self.assertEqual(policy.stats()['samples'], 1)
+        asyncio.run(run())
+
+    def test_stalled_call_is_hedged_and_loser_discarded(self):
+        """首个调用卡住时对冲请求胜出，落败的调用被取消"""
+        async def run():
+            policy = warmed_policy(budget=1)
+            calls = 0
+            cancelled = []
+
+            async def upstream():
+                nonlocal calls
+                calls += 1
+                number = calls
+                try:
+                    await asyncio.sleep(10 if number == 1 else 0.01)
+                except asyncio.CancelledError:
+                    cancelled.append(number)
+                    raise
+                return number
+
+            started = asyncio.get_running_loop().time()
+            self.assertEqual(await policy.run(upstream), 2)
+            self.assertLess(asyncio.get_running_loop().time() - started, 1)
+            await asyncio.sleep(0)
+            self.assertEqual(cancelled, [1])
+            self.assertEqual(policy.stats()['hedge_wins'], 1)
+        asyncio.run(run())
+
+    def test_failed_attempt_falls_back_to_other(self):
+        """对冲请求失败时仍等待原请求完成"""
+        async def run():
+            policy = warmed_policy(budget=1)
+            calls = 0
+
+            async def upstream():
+                nonlocal calls
+                calls += 1
+                if calls == 2:
+                    raise RuntimeError('boom')
+                await asyncio.sleep(0.2)
+                return 'primary'
+
+            self.assertEqual(await policy.run(upstream), 'primary')
+        asyncio.run(run())
+
+    def test_budget_limits_hedges(self):
+        """对冲数量受预算约束"""
+        async def run():
+            policy = warmed_policy(budget=0.25, max_credit=1, percentile=50)
+
+            async def upstream():
+                await asyncio.sleep(0.08)
+                return 'ok'
+
+            for _ in range(8):
+                await policy.run(upstream)
+            stats = policy.stats()
+            self.assertEqual(stats['hedged'], 2)
+            self.assertEqual(stats['budget_exhausted'], 6)
+        asyncio.run(run())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import json
+import unittest
+
+from cascade import CATEGORIES
+from json_repair import JSONRepairError, loads, match_choice, repair_json
+from mock_upstream import SAMPLE_FIELDS
+
+SAMPLE = {name: SAMPLE_FIELDS[name] for name in ('title', 'keywords', 'tags', 'categoryName', 'aiIntroduction')}
+SAMPLE_JSON = json.dumps(SAMPLE, ensure_ascii=False, indent=2)
+
+# 模型输出中常见的格式问题：(名称, 原始输出, 期望的解析结果)
+CORPUS = [
+    ('clean', SAMPLE_JSON, SAMPLE),
+    ('code_fence', f"```json\n{SAMPLE_JSON}\n```", SAMPLE),
+    ('prose_around', f"以下是分析结果：\n{SAMPLE_JSON}\n希望对您有帮助。", SAMPLE),
+    ('trailing_commas', '{"keywords": ["澳门", "旅游",], "title": "标题",\n}', {'keywords': ['澳门', '旅游'], 'title': '标题'}),
+    ('raw_newlines', '{"markdown": "# 报告\n\n1. **概括**\n\t- 内容"}', {'markdown': '# 报告\n\n1. **概括**\n\t- 内容'}),
+    ('control_chars', '{"title": "澳门\x08旅游\x00推广"}', {'title': '澳门旅游推广'}),
+    ('inner_quotes', '{"title": "特首称"旅游业是支柱"", "tags": ["旅游"]}',
+     {'title': '特首称"旅游业是支柱"', 'tags': ['旅游']}),
+    ('inner_quotes_comma', '{"aiIntroduction": "他说"好", 然后离开", "title": "标题"}',
+     {'aiIntroduction': '他说"好", 然后离开', 'title': '标题'}),
+    ('invalid_escape', '{"markdown": "价格\\(约\\)100元\\n完"}', {'markdown': '价格\\(约\\)100元\n完'}),
+    ('missing_comma', '{"title": "标题"\n  "categoryName": "澳闻"\n}', {'title': '标题', 'categoryName': '澳闻'}),
+    ('unquoted_keys', '{title: "标题", ok: True, score: 0.5, extra: None}',
+     {'title': '标题', 'ok': True, 'score': 0.5, 'extra': None}),
+    ('truncated_string', '{"title": "标题", "markdown": "# 新闻分析报告\\n\\n1. **新闻核',
+     {'title': '标题', 'markdown': '# 新闻分析报告\n\n1. **新闻核'}),
+    ('truncated_list', '{"title": "标题", "keywords": ["澳门", "旅游"', {'title': '标题', 'keywords': ['澳门', '旅游']}),
+    ('truncated_after_key', '{"title": "标题", "tags":', {'title': '标题', 'tags': None}),
+    ('truncated_in_key', '{"title": "标题", "ta', {'title': '标题', 'ta': None}),
+    ('nested', '{"a": {"b": [1, 2,], "c": "x"},}', {'a': {'b': [1, 2], 'c': 'x'}}),
+]
+
+
+class TestJSONRepair(unittest.TestCase):
+    def test_corpus(self):
+        """语料中的每种格式问题都能修复并得到期望的结果"""
+        for name, raw, expected in CORPUS:
+            with self.subTest(name):
+                self.assertEqual(loads(raw), expected)
+
+    def test_repair_output_is_strict_json(self):
+        """修复结果是标准JSON（不含未转义的控制字符）"""
+        for name, raw, expected in CORPUS:
+            with self.subTest(name):
+                self.assertEqual(json.loads(repair_json(raw)), expected)
+
+    def test_unrecoverable(self):
+        """没有JSON对象的输出无法修复"""
+        with self.assertRaises(JSONRepairError):
+            loads('抱歉，我无法完成这个任务。')
+
+
+class TestMatchChoice(unittest.TestCase):
+    def test_fuzzy_category(self):
+        """栏目名称去掉符号、包含关系和相似度匹配，无法匹配时返回None"""
+        self.assertEqual(match_choice('澳闻', CATEGORIES), '澳闻')
+        self.assertEqual(match_choice('【澳闻】', CATEGORIES), '澳闻')
+        self.assertEqual(match_choice('栏目：旅游', CATEGORIES), '旅游')
+        self.assertEqual(match_choice('头条报（今日）', CATEGORIES), '头条报')
+        self.assertEqual(match_choice('外雇天', CATEGORIES), '外雇天地')
+        self.assertIsNone(match_choice('财经', CATEGORIES))
+        self.assertIsNone(match_choice(['澳闻'], CATEGORIES))
+
+
+if __name__ == '__main__':
+    unittest.main()
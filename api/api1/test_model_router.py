@@ -0,0 +1,57 @@
+import unittest
+
+from model_router import Backend, ModelRouter, NoBackendAvailable
+from circuit_breaker import CircuitBreaker
+
+
+def warmed(name: str, latency: float, failures: int = 0, weight: float = 1.0, **kwargs) -> Backend:
+    """已有10个样本的后端"""
+    backend = Backend(name, f'http://{name}/v1', '', name, weight=weight, **kwargs)
+    for i in range(10):
+        if i < failures:
+            backend.record_failure(latency)
+        else:
+            backend.record_success(latency)
+    return backend
+
+
+class TestModelRouter(unittest.TestCase):
+    def test_prefers_fast_and_healthy(self):
+        """优先选择延迟低、错误率低的后端"""
+        fast, slow, flaky = warmed('fast', 1.0), warmed('slow', 3.0), warmed('flaky', 0.5, failures=5)
+        router = ModelRouter([slow, flaky, fast], explore_rate=0)
+        self.assertIs(router.choose(), fast)
+        # 权重提高后慢后端也可能胜出
+        slow.weight = 4
+        self.assertIs(router.choose(), slow)
+
+    def test_cold_backend_is_probed_first(self):
+        """没有样本的后端优先试探"""
+        fast = warmed('fast', 0.1)
+        cold = Backend('cold', 'http://cold/v1', '', 'cold')
+        router = ModelRouter([fast, cold], explore_rate=0)
+        self.assertIs(router.choose(), cold)
+
+    def test_failover_excludes_tried(self):
+        """重试时排除本次请求已失败的后端，没有其他后端时再次使用"""
+        primary, backup = warmed('primary', 0.1), warmed('backup', 1.0)
+        router = ModelRouter([primary, backup], explore_rate=0)
+        self.assertIs(router.choose(exclude=[primary]), backup)
+        self.assertTrue(router.has_alternative([primary]))
+        self.assertFalse(router.has_alternative([primary, backup]))
+        self.assertIs(router.choose(exclude=[primary, backup]), primary)
+
+    def test_skips_open_circuit(self):
+        """熔断中的后端不被选择，全部熔断时抛出NoBackendAvailable"""
+        primary, backup = warmed('primary', 0.1), warmed('backup', 1.0)
+        primary.breaker = CircuitBreaker('primary', min_calls=1, open_duration=60)
+        router = ModelRouter([primary, backup], explore_rate=0)
+        primary.record_failure(0.1)
+        self.assertIs(router.choose(), backup)
+        self.assertFalse(router.has_alternative([backup]))
+        with self.assertRaises(NoBackendAvailable):
+            ModelRouter([primary]).choose()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import os
+import asyncio
+import tempfile
+import unittest
+
+from near_duplicate import NearDuplicateIndex, simhash
+
+ARTICLE = (
+    "【中新社河南安阳八月十二日电】（记者　阚力）「之前学习的甲骨文都忘了，现在回炉重造。」"
+    "台湾网络博主林宛妘近日随参访团在「甲骨文之乡」河南安阳触摸文字「活化石」，从甲骨文「家」字解读两岸文化同源。"
+    "连日来，林宛妘等一行逾二十人在大陆多个古都城市交流参访，赴安阳文字探源是他们最期待的行程之一。"
+    "作为台湾知识类网络博主，林宛妘日常习惯在社交平台分享自己所见所闻。此行，她将温习甲骨文作为重点。"
+    "从中国文字博物馆到殷墟博物馆，她仔细观察、记录甲骨文字，「我计划梳理一篇关于甲骨文的博文分享在社交平台上」。"
+    "林宛妘说，安阳博物馆系统呈现的汉字演变史充满艺术性，比如甲骨文「家」字是屋顶下有猪，寓意古人家里养了猪就扎根了。"
+    "在书法老师指导下，林宛妘和同伴商宁真提笔蘸墨，模仿书写「家」「福」「乐」等甲骨文。◇"
+)
+
+OTHER_ARTICLE = (
+    "入伏后，一年当中最热的时间段已来临。高温、高湿的环境和长时间的高温天气过程，都会增加中暑风险，威胁生命健康安全。"
+    "老人、孕妇、儿童、慢性病患者、体力劳动者或需要在户外活动的人群，要密切关注天气情况，结合自己的健康状况，"
+    "及时采取有效措施防暑降温。"
+)
+
+
+class TestNearDuplicateIndex(unittest.TestCase):
+    def test_syndicated_variants_match(self):
+        """改动电头、全角空格和结尾◇的转载稿被识别为近似重复，不同文章不匹配"""
+        async def run():
+            index = NearDuplicateIndex(None, max_distance=4)
+            await index.add('scope', index.fingerprint(ARTICLE), 'key-1')
+
+            variants = [
+                ARTICLE.replace('八月十二日', '八月十三日'),
+                ARTICLE.replace('　', ' ').rstrip('◇'),
+                '\n'.join(ARTICLE.split('。')),
+            ]
+            for variant in variants:
+                match = await index.find('scope', index.fingerprint(variant))
+                self.assertIsNotNone(match)
+                self.assertEqual(match[0], 'key-1')
+
+            self.assertIsNone(await index.find('scope', index.fingerprint(OTHER_ARTICLE)))
+            self.assertIsNone(await index.find('other-scope', index.fingerprint(ARTICLE)))
+        asyncio.run(run())
+
+    def test_index_reloads_from_sqlite(self):
+        """重启后从SQLite恢复索引"""
+        async def run():
+            with tempfile.TemporaryDirectory() as tmpdir:
+                db_path = os.path.join(tmpdir, 'cache.db')
+                index = NearDuplicateIndex(db_path)
+                fingerprint = simhash(ARTICLE)
+                await index.add('scope', fingerprint, 'key-1')
+                await index.add('scope', fingerprint, 'key-1')
+                self.assertEqual(index.stats()['size'], 1)
+                index.close()
+
+                restarted = NearDuplicateIndex(db_path)
+                self.assertEqual(await restarted.find('scope', fingerprint), ('key-1', 1.0))
+                restarted.close()
+        asyncio.run(run())
+
+    def test_other_worker_entries_visible(self):
+        """其他worker登记的指纹在查询未命中时增量加载"""
+        async def run():
+            with tempfile.TemporaryDirectory() as tmpdir:
+                db_path = os.path.join(tmpdir, 'cache.db')
+                worker = NearDuplicateIndex(db_path)
+                other = NearDuplicateIndex(db_path)
+                fingerprint = simhash(ARTICLE)
+                self.assertIsNone(await worker.find('scope', fingerprint))
+                await other.add('scope', fingerprint, 'key-1')
+                self.assertEqual(await worker.find('scope', fingerprint), ('key-1', 1.0))
+                self.assertEqual(worker.stats()['reloads'], 1)
+                worker.close()
+                other.close()
+        asyncio.run(run())
+
+    def test_empty_text_not_fingerprinted(self):
+        """只有标点和空白的内容不计算指纹"""
+        index = NearDuplicateIndex(None)
+        self.assertIsNone(index.fingerprint('……！！ \n —— 。'))
+        self.assertIsNone(index.fingerprint(''))
+        self.assertIsNotNone(index.fingerprint('澳门'))
+
+
+if __name__ == '__main__':
+    unittest.main()
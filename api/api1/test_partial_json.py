@@ -0,0 +1,48 @@
+import json
+import unittest
+
+from partial_json import IncrementalJSONFields
+
+
+class TestIncrementalJSONFields(unittest.TestCase):
+    def feed_in_chunks(self, text, size):
+        parser = IncrementalJSONFields()
+        fields = []
+        for i in range(0, len(text), size):
+            fields.extend(parser.feed(text[i:i + size]))
+        return parser, fields
+
+    def test_fields_emitted_as_soon_as_complete(self):
+        """字段完整后立即产出，不等待整个对象结束"""
+        parser = IncrementalJSONFields()
+        self.assertEqual(parser.feed('{"title": "甲骨文'), [])
+        self.assertEqual(parser.feed('之乡", "keywords": ["甲骨'), [('title', '甲骨文之乡')])
+        self.assertEqual(parser.feed('文", "安阳"], "markdown": "# 报告'), [('keywords', ['甲骨文', '安阳'])])
+        self.assertFalse(parser.finished)
+        self.assertEqual(parser.feed('"}'), [('markdown', '# 报告')])
+        self.assertTrue(parser.finished)
+
+    def test_any_chunking_yields_same_fields(self):
+        """任意切分方式得到相同结果，支持转义、嵌套、标量和代码块包裹"""
+        obj = {
+            'title': '「家」字\"解读\"',
+            'keywords': ['甲骨文', '两岸'],
+            'nested': {'a': [1, {'b': '}]'}]},
+            'count': 3,
+            'flag': False,
+            'markdown': '# 新闻分析报告\n\n1. **新闻核心概括**'
+        }
+        text = '```json\n' + json.dumps(obj, ensure_ascii=False, indent=2) + '\n```'
+        for size in (1, 2, 7, 64, len(text)):
+            parser, fields = self.feed_in_chunks(text, size)
+            self.assertEqual(fields, list(obj.items()))
+            self.assertTrue(parser.finished)
+
+    def test_raw_newlines_in_strings(self):
+        """字符串中未转义的换行也能解析"""
+        _, fields = self.feed_in_chunks('{"markdown": "第一行\n第二行"}', 3)
+        self.assertEqual(fields, [('markdown', '第一行\n第二行')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import time
+import asyncio
+import unittest
+
+from rate_limiter import AdaptiveRateLimiter
+
+
+class TestAdaptiveRateLimiter(unittest.TestCase):
+    def test_requests_beyond_burst_are_delayed(self):
+        """突发额度用尽后按速率排队"""
+        async def run():
+            limiter = AdaptiveRateLimiter('test', requests_per_minute=600)  # 每秒10个，突发600个
+            limiter._requests._tokens = 2
+            started = time.monotonic()
+            await asyncio.gather(*[limiter.acquire() for _ in range(4)])
+            # 第3、4个请求分别等待0.1秒、0.2秒
+            self.assertGreaterEqual(time.monotonic() - started, 0.18)
+            self.assertEqual(limiter.stats()['delayed'], 2)
+        asyncio.run(run())
+
+    def test_token_budget_is_enforced(self):
+        """token额度不足时等待，即使请求数额度充足"""
+        async def run():
+            limiter = AdaptiveRateLimiter('test', requests_per_minute=6000, tokens_per_minute=60000)
+            limiter._tokens._tokens = 100
+            started = time.monotonic()
+            await limiter.acquire(100)
+            await limiter.acquire(200)  # 欠200个token，按每秒1000个恢复
+            self.assertGreaterEqual(time.monotonic() - started, 0.18)
+        asyncio.run(run())
+
+    def test_zero_limits_are_unlimited(self):
+        """rpm和tpm为0时不限制，收到429时只按Retry-After暂停"""
+        async def run():
+            limiter = AdaptiveRateLimiter('test', requests_per_minute=0)
+            await asyncio.gather(*[limiter.acquire(1000) for _ in range(100)])
+            self.assertEqual(limiter.stats()['delayed'], 0)
+            self.assertIsNone(limiter.stats()['requests_per_minute'])
+            self.assertEqual(limiter.on_rate_limited(), 0.0)
+            self.assertAlmostEqual(limiter.on_rate_limited(0.05), 0.05, places=2)
+            started = time.monotonic()
+            await limiter.acquire()
+            self.assertGreaterEqual(time.monotonic() - started, 0.04)
+        asyncio.run(run())
+
+    def test_rate_limited_decreases_and_recovers(self):
+        """429时乘性降速并遵守Retry-After，之后加性恢复"""
+        async def run():
+            limiter = AdaptiveRateLimiter('test', requests_per_minute=6000)
+            wait = limiter.on_rate_limited(0.2)
+            self.assertAlmostEqual(wait, 0.2, places=2)  # Retry-After长于令牌恢复时间
+            self.assertEqual(limiter.rate_scale, 0.5)
+            # 同一批并发请求的429只降速一次
+            limiter.on_rate_limited(None)
+            self.assertEqual(limiter.rate_scale, 0.5)
+
+            started = time.monotonic()
+            await limiter.acquire()
+            self.assertGreaterEqual(time.monotonic() - started, 0.18)
+
+            limiter._last_increase -= 1
+            limiter.on_success()
+            self.assertAlmostEqual(limiter.rate_scale, 0.55)
+        asyncio.run(run())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import os
+import time
+import asyncio
+import tempfile
+import unittest
+
+from result_cache import AnalysisCache, make_cache_key
+
+
+class TestAnalysisCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, 'cache.db')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_cache_key_normalization(self):
+        """全角空格、多余空白不影响缓存键，模型和提示词版本影响缓存键"""
+        key = make_cache_key('台湾网络博主　林宛妘\n\n近日', 'm', '1')
+        self.assertEqual(key, make_cache_key('  台湾网络博主 林宛妘 近日 ', 'm', '1'))
+        self.assertNotEqual(key, make_cache_key('台湾网络博主 林宛妘 近日', 'm2', '1'))
+        self.assertNotEqual(key, make_cache_key('台湾网络博主 林宛妘 近日', 'm', '2'))
+
+    def test_lru_eviction_and_disk_tier(self):
+        """内存层超出容量时淘汰最久未使用的条目，SQLite层仍可命中"""
+        async def run():
+            cache = AnalysisCache(self.db_path, max_entries=2)
+            await cache.set('a', {'title': 'A'})
+            await cache.set('b', {'title': 'B'})
+            await cache.get('a')
+            await cache.set('c', {'title': 'C'})
+            self.assertEqual(cache.stats()['evictions'], 1)
+            self.assertEqual(await cache.get('b'), {'title': 'B'})
+            self.assertEqual(cache.stats()['disk_hits'], 1)
+            self.assertIsNone(await cache.get('missing'))
+            self.assertEqual(cache.stats()['misses'], 1)
+            cache.close()
+
+            # 重启后从SQLite层恢复
+            restarted = AnalysisCache(self.db_path)
+            self.assertEqual(await restarted.get('c'), {'title': 'C'})
+            self.assertEqual(await restarted.purge(), 3)
+            self.assertIsNone(await restarted.get('c'))
+            restarted.close()
+        asyncio.run(run())
+
+    def test_ttl_expiration(self):
+        """过期条目不再返回"""
+        async def run():
+            cache = AnalysisCache(self.db_path, ttl=0.05)
+            await cache.set('a', {'title': 'A'})
+            time.sleep(0.1)
+            self.assertIsNone(await cache.get('a'))
+            self.assertEqual(cache.stats()['expirations'], 1)
+            cache.close()
+        asyncio.run(run())
+
+    def test_purge_visible_to_other_workers(self):
+        """其他worker清空缓存后，本进程的内存层不再返回旧条目"""
+        async def run():
+            worker = AnalysisCache(self.db_path, generation_check_interval=0)
+            other = AnalysisCache(self.db_path, generation_check_interval=0)
+            await worker.set('a', {'title': 'A'})
+            self.assertEqual(await worker.get('a'), {'title': 'A'})
+            await other.purge()
+            self.assertIsNone(await worker.get('a'))
+            self.assertEqual(worker.stats()['remote_purges'], 1)
+            worker.close()
+            other.close()
+        asyncio.run(run())
+
+    def test_expired_rows_deleted(self):
+        """每写入cleanup_interval条时删除SQLite层中已过期的行"""
+        async def run():
+            cache = AnalysisCache(self.db_path, ttl=0.05, cleanup_interval=2)
+            await cache.set('a', {'title': 'A'})
+            time.sleep(0.1)
+            cache.ttl = 60
+            await cache.set('b', {'title': 'B'})
+            self.assertEqual(cache.stats()['disk_expired_deleted'], 1)
+            rows = cache._connect().execute('SELECT key FROM analysis_cache').fetchall()
+            self.assertEqual(rows, [('b',)])
+            cache.close()
+        asyncio.run(run())
+
+    def test_database_errors_do_not_raise(self):
+        """数据库不可用时读写和清空只使用内存层，不抛出异常"""
+        async def run():
+            cache = AnalysisCache(self.tmpdir.name)
+            await cache.set('a', {'title': 'A'})
+            self.assertEqual(await cache.get('a'), {'title': 'A'})
+            self.assertEqual(await cache.purge(), 1)
+            self.assertIsNone(await cache.get('a'))
+        asyncio.run(run())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import time
+import asyncio
+import unittest
+
+from retry_policy import (RetryPolicy, RetryableError, DeadlineExceeded, set_deadline, reset_deadline,
+                          remaining, parse_retry_after)
+
+
+class TestRetryPolicy(unittest.TestCase):
+    def test_backoff_bounds(self):
+        """退避时间在指数上限内，且不早于Retry-After"""
+        policy = RetryPolicy('test', base_delay=1, max_delay=5)
+        for attempt in range(1, 6):
+            cap = min(5, 2 ** (attempt - 1))
+            for _ in range(50):
+                self.assertLessEqual(policy.backoff(attempt), cap)
+        self.assertGreaterEqual(policy.backoff(1, retry_after=3), 3)
+
+    def test_retries_until_success(self):
+        """可重试的失败按退避重试，其他异常立即抛出"""
+        async def run():
+            policy = RetryPolicy('test', max_attempts=3, base_delay=0.01)
+            calls = 0
+
+            async def attempt(timeout):
+                nonlocal calls
+                calls += 1
+                if calls < 3:
+                    raise RetryableError('busy')
+                return 'ok'
+
+            self.assertEqual(await policy.run(attempt), 'ok')
+            self.assertEqual(calls, 3)
+
+            async def broken(timeout):
+                raise ValueError('bad request')
+
+            with self.assertRaises(ValueError):
+                await policy.run(broken)
+        asyncio.run(run())
+
+    def test_deadline_limits_retries_and_timeout(self):
+        """有截止时间时缩短单次超时，退避后来不及完成尝试则不再重试"""
+        async def run():
+            policy = RetryPolicy('test', max_attempts=10, base_delay=0.5, attempt_timeout=30,
+                                 min_attempt_timeout=0.1)
+            token = set_deadline(0.3)
+            try:
+                timeouts = []
+
+                async def attempt(timeout):
+                    timeouts.append(timeout)
+                    raise RetryableError('busy', retry_after=0.5)
+
+                started = time.monotonic()
+                with self.assertRaises(RetryableError):
+                    await policy.run(attempt)
+                self.assertEqual(len(timeouts), 1)
+                self.assertLessEqual(timeouts[0], 0.3)
+                self.assertLess(time.monotonic() - started, 0.1)
+            finally:
+                reset_deadline(token)
+            self.assertIsNone(remaining())
+        asyncio.run(run())
+
+    def test_expired_deadline(self):
+        """剩余时间不足时不发起尝试；嵌套设置保留更早的截止时间"""
+        policy = RetryPolicy('test', min_attempt_timeout=1)
+        outer = set_deadline(0.5)
+        inner = set_deadline(60)
+        try:
+            self.assertLessEqual(remaining(), 0.5)
+            with self.assertRaises(DeadlineExceeded):
+                policy.run_sync(lambda timeout: 'never')
+        finally:
+            reset_deadline(inner)
+            reset_deadline(outer)
+
+    def test_run_sync(self):
+        """同步调用使用相同的重试规则"""
+        policy = RetryPolicy('test', max_attempts=2, base_delay=0.01)
+        calls = []
+
+        def attempt(timeout):
+            calls.append(timeout)
+            raise RetryableError('HTTP 503')
+
+        with self.assertRaises(RetryableError):
+            policy.run_sync(attempt)
+        self.assertEqual(calls, [30.0, 30.0])
+
+    def test_parse_retry_after(self):
+        self.assertEqual(parse_retry_after('3'), 3.0)
+        self.assertIsNone(parse_retry_after(None))
+        self.assertIsNone(parse_retry_after('soon'))
+        self.assertEqual(parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT'), 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,272 @@
+import json
+import asyncio
+import unittest
+from collections import Counter
+from unittest import mock
+
+import httpx
+from fastapi import HTTPException
+
+import main
+import silicon_flow_analyzer as analyzer
+from boilerplate import BoilerplateRemover
+from cascade import CATEGORIES, validate_analysis
+from mock_upstream import build_output
+from result_cache import AnalysisCache
+from retry_policy import RetryPolicy
+
+CONTENT = '澳门特区政府日前公布新一轮旅游推广计划，将围绕国际客源市场拓展、文旅融合产品开发和智慧旅游建设三个方向推出多项措施。'
+FOOTER = '欢迎关注本网站微信公众号，获取更多澳门本地资讯'
+
+
+def completion(output: dict) -> httpx.Response:
+    """OpenAI兼容接口的聊天补全响应"""
+    return httpx.Response(200, json={
+        'choices': [{'message': {'content': json.dumps(output, ensure_ascii=False)}}],
+        'usage': {'total_tokens': 100}
+    })
+
+
+def requested_output(request: httpx.Request) -> dict:
+    """按请求的提示词生成示例输出（见mock_upstream.build_output）"""
+    prompt = json.loads(request.content)['messages'][-1]['content']
+    return json.loads(build_output(prompt))
+
+
+class AnalyzerTestCase(unittest.TestCase):
+    """以httpx.MockTransport替代上游，关闭缓存、对冲、熔断和限流"""
+
+    def setUp(self):
+        patches = [
+            mock.patch.object(analyzer, 'SILICON_FLOW_API_KEY', 'sk-test'),
+            mock.patch.object(analyzer, 'analysis_cache', None),
+            mock.patch.object(analyzer, 'near_duplicate_index', None),
+            mock.patch.object(analyzer, 'silicon_flow_hedger', None),
+            mock.patch.object(analyzer, 'silicon_flow_retry', RetryPolicy('silicon_flow', base_delay=0.01)),
+            mock.patch.dict(analyzer.config, {'json_reask_enabled': False})
+        ]
+        for backend in analyzer.silicon_flow_router.backends:
+            patches += [mock.patch.object(backend, 'breaker', None), mock.patch.object(backend, 'limiter', None)]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.requests = []
+
+    def run_analyzer(self, handler, call):
+        """以handler作为上游执行call()"""
+        def record(request: httpx.Request) -> httpx.Response:
+            self.requests.append(json.loads(request.content))
+            return handler(request)
+
+        async def run():
+            await analyzer.start_http_client(transport=httpx.MockTransport(record))
+            try:
+                return await call()
+            finally:
+                await analyzer.close_http_client()
+        return asyncio.run(run())
+
+
+class TestFanoutMerge(AnalyzerTestCase):
+    def setUp(self):
+        super().setUp()
+        for patch in (mock.patch.object(analyzer, 'ANALYSIS_MODE', 'fanout'),
+                      mock.patch.object(analyzer, 'fanout_stats', Counter())):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def analyze(self, handler):
+        return self.run_analyzer(handler, lambda: analyzer.analyze_with_silicon_flow(CONTENT))
+
+    def test_failed_part_keeps_other_fields(self):
+        """一个子提示词失败时保留其余字段，并列出缺失的字段"""
+        def handler(request):
+            output = requested_output(request)
+            if 'markdown' in output:
+                return httpx.Response(400, json={'error': 'bad request'})
+            return completion(output)
+
+        result = self.analyze(handler)
+        self.assertEqual(len(self.requests), 3)
+        self.assertEqual(result['title'], '澳门特区政府公布新一轮旅游推广计划')
+        self.assertEqual(result['categoryName'], '澳闻')
+        self.assertTrue(result['aiIntroduction'])
+        self.assertEqual(result['markdown'], '')
+        self.assertEqual(result['missing_fields'], ['markdown'])
+        self.assertEqual(analyzer.fanout_stats, Counter(failed_parts=1, partial=1, missing_fields=1))
+
+    def test_partial_json_reports_missing_fields(self):
+        """子提示词的输出缺少部分字段时，其余字段照常合并"""
+        def handler(request):
+            output = requested_output(request)
+            if 'categoryName' in output:
+                output = {'title': output['title'], 'keywords': output['keywords']}
+            return completion(output)
+
+        result = self.analyze(handler)
+        self.assertEqual(result['keywords'], ['澳门', '旅游', '推广计划', '客源市场'])
+        self.assertTrue(result['markdown'].startswith('# 新闻分析报告'))
+        self.assertEqual(result['missing_fields'], ['tags', 'categoryName'])
+
+    def test_complete_result(self):
+        """全部子提示词成功时结果中没有missing_fields"""
+        result = self.analyze(lambda request: completion(requested_output(request)))
+        self.assertNotIn('missing_fields', result)
+        self.assertEqual(analyzer.fanout_stats, Counter())
+
+    def test_all_parts_failed(self):
+        """全部子提示词失败时抛出异常"""
+        with self.assertRaises(HTTPException):
+            self.analyze(lambda request: httpx.Response(400, json={'error': 'bad request'}))
+
+
+class TestPayload(AnalyzerTestCase):
+    def build(self, **settings):
+        with mock.patch.dict(analyzer.config, settings):
+            return analyzer._build_payload(CONTENT)
+
+    def test_json_mode(self):
+        """只有启用json_mode时才要求JSON输出"""
+        self.assertEqual(self.build(json_mode=True)['response_format'], {'type': 'json_object'})
+        self.assertNotIn('response_format', self.build(json_mode=False))
+
+    def test_response_format_dropped_for_unsupported_backend(self):
+        """后端不支持JSON输出模式时发送前去掉response_format"""
+        backend = analyzer.silicon_flow_router.backends[0]
+        for json_mode in (True, False):
+            self.requests.clear()
+            with self.subTest(json_mode=json_mode), mock.patch.object(backend, 'json_mode', json_mode), \
+                    mock.patch.object(analyzer, 'ANALYSIS_MODE', 'single'), \
+                    mock.patch.dict(analyzer.config, {'json_mode': True}):
+                self.run_analyzer(lambda request: completion(requested_output(request)),
+                                  lambda: analyzer.analyze_with_silicon_flow(CONTENT))
+                self.assertEqual('response_format' in self.requests[0], json_mode)
+
+    def test_max_tokens_budget(self):
+        """精简提示词和字段投影按所需字段设置max_tokens，要求回显原文的标准提示词不设上限"""
+        lean = self.build(lean_prompt=True)
+        self.assertEqual(lean['max_tokens'], analyzer.JSON_OVERHEAD_TOKENS +
+                         sum(analyzer.FIELD_TOKEN_BUDGETS[name] for name in analyzer.ANALYSIS_FIELDS))
+        self.assertNotIn('max_tokens', self.build(lean_prompt=False))
+
+        fields = ('keywords', 'categoryName')
+        projected = analyzer._build_payload(CONTENT, analyzer._projection_template(fields), fields)
+        self.assertEqual(projected['max_tokens'], analyzer.JSON_OVERHEAD_TOKENS + 60 + 20)
+        markdown = analyzer._build_payload(CONTENT, analyzer._projection_template(('markdown',)), ('markdown',))
+        self.assertGreater(markdown['max_tokens'], projected['max_tokens'])
+
+    def test_lean_template_covers_validation(self):
+        """精简提示词要求输出校验所需的全部字段，示例结构满足数量和分析报告结构要求"""
+        prompt = analyzer.LEAN_ANALYSIS_PROMPT_TEMPLATE.format(content=CONTENT)
+        skeleton = json.loads(prompt[prompt.index('{'):prompt.rindex('}') + 1])
+        self.assertEqual(set(skeleton), set(analyzer.ANALYSIS_FIELDS))
+        self.assertTrue(all(category in skeleton['categoryName'] for category in CATEGORIES))
+        self.assertEqual(validate_analysis(dict(skeleton, categoryName='澳闻')), [])
+
+
+class TestProjection(AnalyzerTestCase):
+    def setUp(self):
+        super().setUp()
+        for patch in (mock.patch.object(analyzer, 'ANALYSIS_MODE', 'single'),
+                      mock.patch.object(analyzer, 'analysis_cache', AnalysisCache(None))):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def post(self, fields=None):
+        """请求/analyze（上游返回提示词所要求的示例字段），返回状态码和响应JSON"""
+        async def call():
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+                params = {'fields': fields} if fields is not None else None
+                response = await client.post('/analyze', json={'content': CONTENT}, params=params)
+                return response.status_code, response.json()
+        return self.run_analyzer(lambda request: completion(requested_output(request)), call)
+
+    def test_parse_fields(self):
+        """字段按标准顺序排列，请求全部字段等同于不投影，不支持或重复的字段报错"""
+        self.assertEqual(analyzer.parse_fields(' markdown,title '), ('title', 'markdown'))
+        self.assertIsNone(analyzer.parse_fields(','.join(analyzer.ANALYSIS_FIELDS)))
+        self.assertIsNone(analyzer.parse_fields(''))
+        with self.assertRaises(ValueError):
+            analyzer.parse_fields('title,summary')
+        with self.assertRaises(ValueError):
+            analyzer.parse_fields('title,title')
+
+    def test_invalid_fields_rejected(self):
+        """不支持或重复的字段返回400，不调用上游"""
+        for fields in ('title,unknown', 'keywords,keywords'):
+            with self.subTest(fields=fields):
+                status, _ = self.post(fields)
+                self.assertEqual(status, 400)
+        self.assertEqual(self.requests, [])
+
+    def test_projected_prompt_and_response(self):
+        """投影的提示词只要求所需字段，响应中不包含未请求的字段"""
+        status, body = self.post('categoryName,keywords')
+        self.assertEqual(status, 200)
+        self.assertEqual(set(body['data']), {'content', 'keywords', 'categoryName'})
+        self.assertEqual(body['data']['categoryName'], '澳闻')
+        prompt = self.requests[0]['messages'][-1]['content']
+        self.assertEqual(set(json.loads(build_output(prompt))), {'keywords', 'categoryName'})
+        self.assertNotIn('markdown', prompt)
+
+    def test_projection_uses_separate_cache_namespace(self):
+        """投影结果与完整结果分别缓存，互不命中"""
+        _, full = self.post()
+        self.assertEqual(set(full['data']), {'content', *analyzer.ANALYSIS_FIELDS})
+        self.post('title')
+        self.assertEqual(len(self.requests), 2)
+        self.post('title')
+        self.post()
+        self.assertEqual(len(self.requests), 2)
+        self.assertEqual(analyzer.analysis_cache.stats()['writes'], 2)
+
+
+class TestCacheKey(AnalyzerTestCase):
+    def setUp(self):
+        super().setUp()
+        for patch in (mock.patch.object(analyzer, 'ANALYSIS_MODE', 'single'),
+                      mock.patch.object(analyzer, 'analysis_cache', AnalysisCache(None)),
+                      mock.patch.object(main, 'boilerplate_remover', BoilerplateRemover(repeat_articles=2))):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def process(self, content):
+        """清理并分析一篇新闻，返回发给上游的正文"""
+        prompts = []
+
+        def handler(request):
+            prompts.append(json.loads(request.content)['messages'][-1]['content'])
+            return completion(requested_output(request))
+        self.run_analyzer(handler, lambda: main.process_news(content))
+        return prompts
+
+    def test_cleaning_state_does_not_split_cache(self):
+        """同一篇文章在学到页脚前后清理结果不同，仍按清理前的正文命中缓存"""
+        article = f'{CONTENT}\n{FOOTER}'
+        prompts = self.process(article)
+        self.assertIn(FOOTER, prompts[0])
+        self.process(f'澳门今日天气晴朗，气温介于二十至二十六摄氏度之间，空气质素良好。\n{FOOTER}')
+        self.assertNotIn(FOOTER, main.prepare_content(article)[0])
+        self.assertEqual(self.process(article), [])
+        self.assertEqual(len(self.requests), 2)
+
+    def test_cleaning_version_in_key(self):
+        """模板内容去除的规则或配置变化时不命中之前的缓存"""
+        self.process(CONTENT)
+        with mock.patch.object(analyzer, 'CLEANING_VERSION', 'changed'):
+            self.process(CONTENT)
+        self.assertEqual(len(self.requests), 2)
+        self.assertEqual(self.process(CONTENT), [])
+
+        version = analyzer._cleaning_version()
+        for settings in ({'boilerplate_enabled': not analyzer.config['boilerplate_enabled']},
+                         {'boilerplate_patterns': ['^广告']}):
+            with self.subTest(settings=settings), mock.patch.dict(analyzer.config, settings):
+                self.assertNotEqual(analyzer._cleaning_version(), version)
+        with mock.patch.object(analyzer, 'BOILERPLATE_RULES_VERSION', 'changed'):
+            self.assertNotEqual(analyzer._cleaning_version(), version)
+
+
+if __name__ == '__main__':
+    unittest.main()
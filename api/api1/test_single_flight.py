@@ -0,0 +1,81 @@
+import asyncio
+import unittest
+
+from single_flight import SingleFlight
+
+
+class TestSingleFlight(unittest.TestCase):
+    def test_concurrent_calls_are_coalesced(self):
+        """相同键的并发调用只执行一次"""
+        async def run():
+            flight = SingleFlight('test')
+            calls = 0
+
+            async def upstream():
+                nonlocal calls
+                calls += 1
+                await asyncio.sleep(0.05)
+                return {'title': 'A'}
+
+            results = await asyncio.gather(*[flight.do('k', upstream) for _ in range(10)])
+            self.assertEqual(calls, 1)
+            self.assertTrue(all(r == {'title': 'A'} for r in results))
+            self.assertEqual(flight.stats()['coalesced'], 9)
+            self.assertEqual(flight.stats()['in_flight'], 0)
+
+            # 调用结束后再次请求会重新执行
+            await flight.do('k', upstream)
+            self.assertEqual(calls, 2)
+        asyncio.run(run())
+
+    def test_error_is_shared_and_not_cached(self):
+        """异常传递给所有等待者，之后的调用重新执行"""
+        async def run():
+            flight = SingleFlight('test')
+
+            async def failing():
+                await asyncio.sleep(0.01)
+                raise ValueError('upstream failed')
+
+            results = await asyncio.gather(*[flight.do('k', failing) for _ in range(3)],
+                                           return_exceptions=True)
+            self.assertTrue(all(isinstance(r, ValueError) for r in results))
+            self.assertEqual(flight.stats()['errors'], 1)
+
+            async def ok():
+                return 1
+            self.assertEqual(await flight.do('k', ok), 1)
+        asyncio.run(run())
+
+    def test_cancellation(self):
+        """单个等待者取消不影响其他等待者；全部取消时上游调用被取消"""
+        async def run():
+            flight = SingleFlight('test')
+            started = asyncio.Event()
+
+            async def upstream():
+                started.set()
+                await asyncio.sleep(0.05)
+                return 'done'
+
+            first = asyncio.ensure_future(flight.do('k', upstream))
+            second = asyncio.ensure_future(flight.do('k', upstream))
+            await started.wait()
+            first.cancel()
+            self.assertEqual(await second, 'done')
+            with self.assertRaises(asyncio.CancelledError):
+                await first
+
+            only = asyncio.ensure_future(flight.do('k2', upstream))
+            await asyncio.sleep(0.01)
+            only.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await only
+            await asyncio.sleep(0)
+            self.assertEqual(flight.stats()['cancelled'], 1)
+            self.assertEqual(flight.stats()['in_flight'], 0)
+        asyncio.run(run())
+
+
+if __name__ == '__main__':
+    unittest.main()
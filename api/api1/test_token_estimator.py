@@ -0,0 +1,59 @@
+import random
+import unittest
+
+from token_estimator import (FEATURES, TokenEstimator, calibrate, estimate_tokens, message_features, text_features,
+                             truncate_to_tokens)
+
+TEXT = '澳门特区政府公布旅游计划（2026年），预算增加“两成”。The Macao SAR government announced a plan!\n\n'
+
+
+class TestTokenEstimator(unittest.TestCase):
+    def test_features(self):
+        """按字符类别计数"""
+        features = dict(zip(FEATURES, text_features(TEXT)))
+        self.assertEqual(features, {'cjk': 19, 'cjk_punct': 6, 'words': 7, 'letters': 35, 'digits': 4, 'punct': 1,
+                                    'other': 0, 'newlines': 1, 'messages': 0})
+        self.assertEqual(dict(zip(FEATURES, text_features('café 😀')))['other'], 2)
+
+    def test_message_features(self):
+        """聊天请求按消息条数计入模板开销"""
+        messages = [{'role': 'system', 'content': '你是编辑'}, {'role': 'user', 'content': TEXT}]
+        features = message_features(messages)
+        self.assertEqual(features[FEATURES.index('messages')], 2)
+        self.assertEqual(features[FEATURES.index('cjk')], 23)
+
+    def test_calibrate(self):
+        """由已知token数的样本拟合出接近真实的权重"""
+        rng = random.Random(1)
+        truth = TokenEstimator({'cjk': 0.6, 'words': 1.3, 'letters': 0.0, 'punct': 0.4}, calibrate=False)
+        pieces = [TEXT[:20], TEXT[20:45], TEXT[45:], '😀', '12345', '\n']
+        samples = []
+        for _ in range(300):
+            text = ''.join(rng.choice(pieces) for _ in range(rng.randint(3, 40)))
+            samples.append((text, truth.estimate(text)))
+        weights = calibrate(samples)
+        self.assertAlmostEqual(weights['cjk'], 0.6, delta=0.05)
+        self.assertAlmostEqual(weights['digits'], 1.0, delta=0.05)
+
+    def test_online_refit(self):
+        """按实际token数在线校准，预估值向实际值靠拢"""
+        estimator = TokenEstimator(refit_every=50)
+        features = text_features('中文内容' * 100)
+        for _ in range(200):
+            estimator.observe(features, 200)
+        self.assertEqual(estimator.refits, 4)
+        self.assertAlmostEqual(estimator.estimate_features(features), 200, delta=10)
+
+    def test_truncate(self):
+        """截断到预算内，优先在段落和句子边界处切分"""
+        text = '\n'.join(f'第{index}段。第二句内容较长一些。' for index in range(100))
+        trimmed = truncate_to_tokens(text, 100)
+        self.assertLessEqual(estimate_tokens(trimmed), 100)
+        self.assertTrue(text.startswith(trimmed))
+        self.assertTrue(trimmed.endswith('。'))
+        self.assertEqual(truncate_to_tokens(text, 10 ** 6), text)
+        self.assertLessEqual(estimate_tokens(truncate_to_tokens('字' * 1000, 50)), 50)
+
+
+if __name__ == '__main__':
+    unittest.main()
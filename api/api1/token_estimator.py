@@ -0,0 +1,341 @@
+"""
+token预估模块 - 不调用分词器，按字符类别加权估算Qwen系列模型的输入token数
+
+对中英文混排的新闻文本，按以下字符类别计数后加权求和（计数由编码长度、bytes.translate和一次正则扫描完成，
+不在Python中逐字判断）：
+  - cjk: 汉字（及假名、谚文等其余UTF-8三字节字符），Qwen词表中常见词为多字一个token，平均约0.7个token/字
+  - cjk_punct: 全角标点、中文引号、省略号等，约1个token/个
+  - words / letters: 英文单词数和字母数，常见单词1个token，长单词按字母数追加
+  - digits: 数字，Qwen按单个数字切分，1个token/个
+  - punct: ASCII标点，常与相邻字符合并
+  - other: 其余非ASCII字符（带音标的拉丁字母、希腊和西里尔字母、emoji、生僻字等）
+  - newlines: 连续换行
+  - messages: 聊天模板中每条消息的固定开销（只在估算整个请求时计入）
+
+默认权重为经验值；启用校准时以上游返回的实际prompt_tokens在线拟合（岭回归，向默认权重收缩），
+也可用已知token数的样本离线拟合：python token_estimator.py samples.jsonl（每行{"text": ..., "tokens": ...}）。
+"""
+import re
+import sys
+import json
+import math
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+FEATURES = ('cjk', 'cjk_punct', 'words', 'letters', 'digits', 'punct', 'other', 'newlines', 'messages')
+DEFAULT_WEIGHTS = {
+    'cjk': 0.7,
+    'cjk_punct': 1.0,
+    'words': 1.0,
+    'letters': 0.06,
+    'digits': 1.0,
+    'punct': 0.7,
+    'other': 1.5,
+    'newlines': 0.8,
+    'messages': 5.0
+}
+
+_CJK_PUNCT = re.compile('[\u2014\u2018-\u201d\u2026\u3000-\u303f\ufe30-\ufe4f\uff00-\uffef]')
+
+# ASCII字符按类别映射为：字母a、数字0、标点!、换行\n，其余为空格
+_ASCII_CLASSES = bytes(
+    ord('a') if chr(code).isalpha() else ord('0') if chr(code).isdigit() else
+    ord('!') if 0x21 <= code <= 0x7e else ord('\n') if code == 0x0a else ord(' ')
+    for code in range(256)
+)
+# 只保留字母或换行（其余为空格），用于统计单词数和连续换行数
+_LETTERS_ONLY = bytes(ord('a') if code == ord('a') else ord(' ') for code in range(256))
+_NEWLINES_ONLY = bytes(ord('\n') if code == ord('\n') else ord(' ') for code in range(256))
+# 句末标点之后的位置（截断时优先在此处切分）
+_SENTENCE_END = re.compile(r'(?<=[。！？!?；;])')
+
+
+def text_features(text: str) -> List[int]:
+    """
+    统计文本各字符类别的数量
+
+    Args:
+        text: 文本
+
+    Returns:
+        按FEATURES顺序排列的计数（messages为0）
+    """
+    if not text:
+        return [0] * len(FEATURES)
+    # 由各种编码的长度推算非ASCII字符按UTF-8字节数的分布（编码在C层完成，远快于逐字判断）
+    narrow = text.encode('ascii', 'ignore')
+    wide = len(text) - len(narrow)
+    if wide:
+        four_byte = len(text.encode('utf-16-le', 'surrogatepass')) // 2 - len(text)
+        three_byte = len(text.encode('utf-8', 'surrogatepass')) - len(narrow) - 2 * wide - 2 * four_byte
+        cjk_punct = len(_CJK_PUNCT.findall(text))
+        cjk = three_byte - cjk_punct
+        other = wide - three_byte
+    else:
+        cjk = cjk_punct = other = 0
+    classes = narrow.translate(_ASCII_CLASSES)
+    return [
+        cjk,
+        cjk_punct,
+        _runs(classes.translate(_LETTERS_ONLY), b'a'),
+        classes.count(b'a'),
+        classes.count(b'0'),
+        classes.count(b'!'),
+        other,
+        _runs(classes.translate(_NEWLINES_ONLY), b'\n'),
+        0
+    ]
+
+
+def _runs(marks: bytes, mark: bytes) -> int:
+    """只含mark和空格的字节串中mark的连续段数"""
+    return marks.count(b' ' + mark) + marks.startswith(mark)
+
+
+def message_features(messages: Iterable[Dict[str, Any]]) -> List[int]:
+    """统计聊天请求中全部消息内容的字符类别数量，messages为消息条数"""
+    totals = [0] * len(FEATURES)
+    count = 0
+    for message in messages:
+        count += 1
+        content = message.get('content')
+        if isinstance(content, str):
+            for index, value in enumerate(text_features(content)):
+                totals[index] += value
+    totals[-1] = count
+    return totals
+
+
+def _solve(matrix: List[List[float]], vector: List[float]) -> Optional[List[float]]:
+    """高斯消元（部分主元）求解线性方程组，奇异时返回None"""
+    size = len(vector)
+    rows = [row[:] + [value] for row, value in zip(matrix, vector)]
+    for column in range(size):
+        pivot = max(range(column, size), key=lambda row: abs(rows[row][column]))
+        if abs(rows[pivot][column]) < 1e-12:
+            return None
+        rows[column], rows[pivot] = rows[pivot], rows[column]
+        for row in range(column + 1, size):
+            factor = rows[row][column] / rows[column][column]
+            if factor:
+                for index in range(column, size + 1):
+                    rows[row][index] -= factor * rows[column][index]
+    solution = [0.0] * size
+    for row in range(size - 1, -1, -1):
+        total = rows[row][size] - sum(rows[row][index] * solution[index] for index in range(row + 1, size))
+        solution[row] = total / rows[row][row]
+    return solution
+
+
+class TokenEstimator:
+    """按字符类别加权估算token数，可根据实际token数在线校准权重"""
+
+    def __init__(self, weights: Optional[Dict[str, float]] = None, calibrate: bool = True, refit_every: int = 50,
+                 prior_samples: float = 20, decay: float = 0.999):
+        """
+        Args:
+            weights: 覆盖默认值的权重（按类别名）
+            calibrate: 是否根据observe记录的实际token数重新拟合权重
+            refit_every: 每记录多少个样本重新拟合一次
+            prior_samples: 拟合时初始权重相当于多少个样本（越大越不易偏离初始权重）
+            decay: 每记录一个样本时旧样本的衰减系数，使权重跟随上游模型或文本分布的变化
+        """
+        unknown = set(weights or {}) - set(FEATURES)
+        if unknown:
+            raise ValueError(f"未知的token预估类别: {', '.join(sorted(unknown))}")
+        self.prior = [float({**DEFAULT_WEIGHTS, **(weights or {})}[name]) for name in FEATURES]
+        self.weights = self.prior[:]
+        self.calibrate = calibrate
+        self.refit_every = refit_every
+        self.prior_samples = prior_samples
+        self.decay = decay
+
+        size = len(FEATURES)
+        self._xtx = [[0.0] * size for _ in range(size)]
+        self._xty = [0.0] * size
+        self._count = 0.0
+        self.samples = 0
+        self.refits = 0
+        # 预估值相对实际值的误差（指数滑动平均）
+        self.mean_error: Optional[float] = None
+
+    def estimate(self, text: str) -> int:
+        """估算文本的token数"""
+        return self.estimate_features(text_features(text))
+
+    def estimate_messages(self, messages: Iterable[Dict[str, Any]]) -> int:
+        """估算聊天请求全部消息（含模板开销）的输入token数"""
+        return self.estimate_features(message_features(messages))
+
+    def estimate_features(self, features: Sequence[float]) -> int:
+        """按字符类别计数估算token数"""
+        return math.ceil(sum(weight * value for weight, value in zip(self.weights, features)))
+
+    def observe(self, features: Sequence[float], actual: int) -> None:
+        """
+        记录一个实际token数样本
+
+        Args:
+            features: 输入的字符类别计数（text_features或message_features的结果）
+            actual: 上游返回的实际token数
+        """
+        if actual <= 0:
+            return
+        estimated = self.estimate_features(features)
+        error = abs(estimated - actual) / actual
+        self.mean_error = error if self.mean_error is None else 0.95 * self.mean_error + 0.05 * error
+        self.samples += 1
+        if not self.calibrate:
+            return
+
+        for row in range(len(FEATURES)):
+            self._xty[row] = self._xty[row] * self.decay + features[row] * actual
+            for column in range(len(FEATURES)):
+                self._xtx[row][column] = self._xtx[row][column] * self.decay + features[row] * features[column]
+        self._count = self._count * self.decay + 1
+        if self.samples % self.refit_every == 0:
+            self.refit()
+
+    def refit(self) -> None:
+        """按已记录的样本重新拟合权重（岭回归，向初始权重收缩；样本中未出现的类别保持初始权重）"""
+        if not self._count:
+            return
+        size = len(FEATURES)
+        matrix = [row[:] for row in self._xtx]
+        vector = self._xty[:]
+        for index in range(size):
+            diagonal = self._xtx[index][index]
+            # 每个类别的收缩强度相当于prior_samples个该类别平均规模的样本
+            strength = self.prior_samples * diagonal / self._count if diagonal else 1.0
+            matrix[index][index] += strength
+            vector[index] += strength * self.prior[index]
+        solution = _solve(matrix, vector)
+        if solution is None:
+            return
+        self.weights = [max(0.0, weight) for weight in solution]
+        self.refits += 1
+        logger.info(f"token预估权重已重新拟合({self.samples}个样本): {self.weight_map()}")
+
+    def weight_map(self) -> Dict[str, float]:
+        """当前各类别的权重"""
+        return {name: round(weight, 4) for name, weight in zip(FEATURES, self.weights)}
+
+    def stats(self) -> Dict[str, Any]:
+        """返回当前权重、样本数、拟合次数和预估误差"""
+        return {
+            'weights': self.weight_map(),
+            'samples': self.samples,
+            'refits': self.refits,
+            'mean_error': round(self.mean_error, 4) if self.mean_error is not None else None
+        }
+
+
+_default_estimator = TokenEstimator(calibrate=False)
+
+
+def set_default_estimator(estimator: TokenEstimator) -> None:
+    """替换estimate_tokens等函数使用的全局预估器"""
+    global _default_estimator
+    _default_estimator = estimator
+
+
+def get_default_estimator() -> TokenEstimator:
+    """estimate_tokens等函数使用的全局预估器"""
+    return _default_estimator
+
+
+def estimate_tokens(text: str) -> int:
+    """估算文本的token数（使用全局预估器）"""
+    return _default_estimator.estimate(text)
+
+
+def _cut(text: str, max_tokens: int) -> str:
+    """在不超过max_tokens的前提下取文本尽可能长的开头（按字数二分）"""
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if estimate_tokens(text[:middle]) <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    return text[:low]
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    截取文本开头不超过max_tokens的部分，优先在段落和句子边界处截断
+
+    Args:
+        text: 文本
+        max_tokens: 预估token数上限
+
+    Returns:
+        截取后的文本（未超过上限时原样返回）
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    kept = []
+    used = 0
+    for line in text.split('\n'):
+        # 各段落之间的换行按1个token计
+        tokens = estimate_tokens(line) + 1
+        if used + tokens <= max_tokens:
+            kept.append(line)
+            used += tokens
+            continue
+        # 放不下整段时按句子装入，第一个放不下的句子之后不再继续
+        sentences = []
+        for sentence in _SENTENCE_END.split(line):
+            tokens = estimate_tokens(sentence)
+            if used + tokens > max_tokens:
+                if not kept and not sentences:
+                    # 开头第一句就超过上限时按字数截断
+                    sentences.append(_cut(sentence, max_tokens - used))
+                break
+            sentences.append(sentence)
+            used += tokens
+        if sentences:
+            kept.append(''.join(sentences))
+        break
+    return '\n'.join(kept).rstrip()
+
+
+def calibrate(samples: Iterable[Tuple[str, int]], weights: Optional[Dict[str, float]] = None,
+              prior_samples: float = 1) -> Dict[str, float]:
+    """
+    用已知token数的文本样本拟合权重
+
+    Args:
+        samples: (文本, 实际token数)
+        weights: 初始权重
+        prior_samples: 初始权重相当于多少个样本
+
+    Returns:
+        拟合后的权重，可填入配置token_estimator_weights
+    """
+    estimator = TokenEstimator(weights, refit_every=sys.maxsize, prior_samples=prior_samples, decay=1.0)
+    for text, tokens in samples:
+        estimator.observe(text_features(text), tokens)
+    estimator.refit()
+    return estimator.weight_map()
+
+
+def main():
+    if len(sys.argv) != 2:
+        print("用法: python token_estimator.py samples.jsonl（每行{\"text\": ..., \"tokens\": ...}）")
+        sys.exit(1)
+    with open(sys.argv[1], encoding='utf-8') as samples:
+        records = [json.loads(line) for line in samples if line.strip()]
+    weights = calibrate((record['text'], record['tokens']) for record in records)
+    fitted = TokenEstimator(weights, calibrate=False)
+    errors = [abs(fitted.estimate(record['text']) - record['tokens']) / record['tokens'] for record in records]
+    print(json.dumps(weights, ensure_ascii=False, indent=2))
+    print(f"{len(records)}个样本，平均相对误差 {sum(errors) / len(errors):.2%}")
+
+
+if __name__ == "__main__":
+    main()
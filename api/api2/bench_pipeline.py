@@ -0,0 +1,107 @@
+"""
+两次调用（Coze重写后再分析）与合并模式（一次调用同时输出重写内容和分析字段）的端到端延迟对比
+
+对应pipeline_mode配置。合并模式省掉的是一次调用的首字延迟和网络往返，输出字数不变，
+生成耗时占主导时延迟改善有限，主要收益是上游调用次数（和重复读原文的输入token）减半。
+使用进程内的模拟Coze工作流（mock_coze.py）和模拟大模型上游（mock_upstream.py），
+两者都按"首字延迟 + 输出字数 / 生成速度"模拟耗时，并为每次HTTP请求加上模拟的网络往返时间，不使用缓存。
+用法: python bench_pipeline.py --requests 20 --concurrency 5 --chars-per-second 40 --rtt 0.15
+"""
+import time
+import asyncio
+import argparse
+import statistics
+
+import httpx
+
+import silicon_flow_analyzer
+from mock_coze import create_app as create_coze_app
+from mock_upstream import create_app as create_upstream_app
+from news_rewriter import NewsRewriter
+
+# 约400字的示例新闻
+SAMPLE_CONTENT = ('澳门特区政府日前公布新一轮旅游推广计划，将围绕国际客源市场拓展、文旅融合产品开发和智慧旅游建设三个方向推出多项措施。'
+                  * 6)
+
+
+class DelayedTransport(httpx.AsyncBaseTransport):
+    """每次请求前等待一个网络往返时间的传输层"""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, rtt: float):
+        self.transport = transport
+        self.rtt = rtt
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(self.rtt)
+        return await self.transport.handle_async_request(request)
+
+
+async def two_call(content: str, rewriter: NewsRewriter) -> dict:
+    """先调用Coze工作流重写，再分析重写后的内容"""
+    rewrite_result = await rewriter.rewrite_news(content)
+    rewritten_content = rewrite_result['rewritten_content']
+    return {'rewritten_content': rewritten_content,
+            **await silicon_flow_analyzer.analyze_with_silicon_flow(rewritten_content)}
+
+
+async def combined(content: str, rewriter: NewsRewriter) -> dict:
+    """一次调用同时重写和分析"""
+    return await silicon_flow_analyzer.rewrite_and_analyze_combined(content)
+
+
+async def run_pipeline(pipeline, rewriter: NewsRewriter, requests: int, concurrency: int) -> list:
+    """按指定流程处理requests篇文章，返回每次的延迟（秒）"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i: int) -> None:
+        async with semaphore:
+            started = time.perf_counter()
+            result = await pipeline(f"{i} {SAMPLE_CONTENT}", rewriter)
+            assert result['rewritten_content'] and result['title']
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return sorted(latencies)
+
+
+async def bench(args) -> None:
+    coze = create_coze_app(run_seconds=args.first_token_latency, chars_per_second=args.chars_per_second)
+    upstream = create_upstream_app(args.first_token_latency, args.chars_per_second)
+    rewriter = NewsRewriter(transport=DelayedTransport(httpx.ASGITransport(app=coze), args.rtt))
+    await silicon_flow_analyzer.start_http_client(
+        transport=DelayedTransport(httpx.ASGITransport(app=upstream), args.rtt))
+    # 基准测试只关心上游调用耗时，关闭缓存和近似重复检测
+    silicon_flow_analyzer.analysis_cache = None
+    silicon_flow_analyzer.near_duplicate_index = None
+    # 模拟的生成耗时较长，关闭熔断器和限流以免影响结果
+    for backend in silicon_flow_analyzer.silicon_flow_router.backends:
+        backend.breaker = None
+        backend.limiter = None
+    silicon_flow_analyzer.SILICON_FLOW_API_KEY = silicon_flow_analyzer.SILICON_FLOW_API_KEY or 'sk-bench-mock'
+
+    try:
+        for name, pipeline in (('two_call', two_call), ('combined', combined)):
+            before = upstream.state.requests + len(coze.state.runs)
+            latencies = await run_pipeline(pipeline, rewriter, args.requests, args.concurrency)
+            calls = upstream.state.requests + len(coze.state.runs) - before
+            print(f"{name:>8}: 平均 {statistics.mean(latencies):.2f}s, p50 {latencies[len(latencies) // 2]:.2f}s, "
+                  f"p95 {latencies[int(len(latencies) * 0.95)]:.2f}s, 上游调用 {calls} 次")
+    finally:
+        await rewriter.aclose()
+        await silicon_flow_analyzer.close_http_client()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="两次调用与合并模式的端到端延迟对比")
+    parser.add_argument('--requests', type=int, default=20, help="每种流程处理的文章数")
+    parser.add_argument('--concurrency', type=int, default=5, help="并发数")
+    parser.add_argument('--first-token-latency', type=float, default=0.5, help="模拟首字延迟（秒）")
+    parser.add_argument('--chars-per-second', type=float, default=40.0, help="模拟输出速度（字/秒）")
+    parser.add_argument('--rtt', type=float, default=0.15, help="模拟的网络往返时间（秒）")
+    args = parser.parse_args()
+    asyncio.run(bench(args))
+
+
+if __name__ == "__main__":
+    main()
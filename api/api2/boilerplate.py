@@ -0,0 +1,224 @@
+"""
+模板内容去除模块 - 去掉抓取文章中与新闻内容无关的段落，减少发送给大模型的输入token
+
+按段落依次判断（段落来自content_cleaner的正文提取，纯文本按行切分）：
+  - 规则：责任编辑/校对/来源等署名行、分享和打印按钮文字、版权声明、只有符号的段落，
+    以及正文开头电头中的"本报讯""【××讯】"和"（记者 ××）"署名（保留新华社等电头中的地点和日期）
+  - 相关阅读："相关新闻""推荐阅读""上一篇"等标题及其后连续的短段落或链接段落
+  - 链接密度：链接文字占比不低于link_density的段落（导航、标签云、相关文章列表）
+  - 重复：同一篇中重复出现的段落只保留第一次；开头或结尾处的短段落在近期repeat_articles篇不同文章中
+    都出现过时（网站统一的页头、页脚、提示语等）视为模板内容。只看开头和结尾，
+    避免多家媒体转载同一通稿时正文中相同的短段落被误删；同一篇文章重复提交不重复计数
+
+去除后剩余内容过少（不足原文的min_keep_ratio）时认为判断有误，原样返回。
+"""
+import re
+import hashlib
+import logging
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from content_cleaner import Paragraph
+from token_estimator import estimate_tokens
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 只有在较短的段落上才按规则整段去除，避免误删以这些词开头的正文
+RULE_MAX_LENGTH = 60
+
+# 署名、来源和版权等整段去除的行
+_BYLINE = re.compile(
+    r'^[（(【\[]?\s*(?:责任编辑|责编|编辑|校对|审校|审核|审签|终审|监制|美编|值班编辑|来源|稿源|作者|记者|通讯员|'
+    r'实习生|撰文|摄影|摄像|图片|视频|制作|策划)\s*[：:|｜]'
+)
+# 按钮文字之后紧跟分隔符或段落结束，避免误删"关闭口岸……"之类的正文
+_BUTTONS = re.compile(
+    r'^(?:分享到|分享|转发|收藏|点赞|打印本页|打印|关闭窗口|关闭|返回顶部|返回首页|返回列表|字号|扫一扫|扫码|'
+    r'微信扫一扫|关注我们|点击查看|查看原文|阅读原文|举报|纠错|【\s*大\s*中\s*小\s*】)'
+    r'(?=$|[\s：:|｜/、，,】\]])'
+)
+_COPYRIGHT = re.compile(r'版权所有|©|&copy;|Copyright|未经(?:授权|许可).{0,10}转载|转载请注明|免责声明', re.I)
+# 相关阅读列表的标题
+_RELATED = re.compile(
+    r'^[【\[]?\s*(?:相关新闻|相关阅读|相关文章|相关报道|相关链接|推荐阅读|延伸阅读|热门推荐|热点推荐|猜你喜欢|'
+    r'更多新闻|更多阅读|往期回顾|上一篇|下一篇)'
+)
+# 只有空白和符号
+_SYMBOLS_ONLY = re.compile(r'^[\W_]*$')
+# 正文开头的电头和记者署名
+_DATELINE = re.compile(r'^\s*(?:【[^】]{1,20}讯】|[^\s，。（(【]{0,10}报讯)\s*')
+_REPORTER = re.compile(r'[（(]\s*(?:本报)?(?:记者|通讯员|实习生)[^）)]{0,40}[）)]\s*')
+# 相关阅读标题之后，短于此长度的段落视为列表项
+_RELATED_ITEM_MAX_LENGTH = 60
+# 按跨文章重复判断的开头、结尾段落数
+_EDGE_PARAGRAPHS = 3
+
+# 内置规则的版本，规则变化时随之变化（以清理前的正文作为缓存键时与配置一起区分不同的清理方式）
+RULES_VERSION = hashlib.sha256('\x00'.join(
+    [pattern.pattern for pattern in (_BYLINE, _BUTTONS, _COPYRIGHT, _RELATED, _SYMBOLS_ONLY, _DATELINE, _REPORTER)]
+    + [str(value) for value in (RULE_MAX_LENGTH, _RELATED_ITEM_MAX_LENGTH, _EDGE_PARAGRAPHS)]
+).encode('utf-8')).hexdigest()[:12]
+
+
+def _fingerprint(text: str) -> bytes:
+    return hashlib.blake2b(re.sub(r'\s+', '', text).encode('utf-8'), digest_size=8).digest()
+
+
+class BoilerplateRemover:
+    """去除文章中的模板内容并统计节省的输入token"""
+
+    def __init__(self, link_density: float = 0.5, repeat_articles: int = 3, repeat_window: int = 1000,
+                 repeat_max_length: int = 100, min_keep_ratio: float = 0.3,
+                 extra_patterns: Iterable[str] = ()):
+        """
+        Args:
+            link_density: 链接文字占比不低于该值的段落去除
+            repeat_articles: 在近期多少篇不同文章中出现过的短段落视为模板内容，0表示不按跨文章重复判断
+            repeat_window: 跨文章重复统计记录的段落指纹数上限（LRU）
+            repeat_max_length: 按跨文章重复判断的段落长度上限
+            min_keep_ratio: 剩余字数不足原文的该比例时放弃去除
+            extra_patterns: 额外的正则，匹配（search）的段落整段去除
+        """
+        self.link_density = link_density
+        self.repeat_articles = repeat_articles
+        self.repeat_window = repeat_window
+        self.repeat_max_length = repeat_max_length
+        self.min_keep_ratio = min_keep_ratio
+        self.extra_patterns = [re.compile(pattern) for pattern in extra_patterns]
+        # 段落指纹 -> 最近出现过该段落的文章指纹（最多repeat_articles个）
+        self._seen: 'OrderedDict[bytes, Tuple[bytes, ...]]' = OrderedDict()
+
+        self.requests = 0
+        self.tokens_before = 0
+        self.tokens_after = 0
+        self.reasons = Counter()
+
+    def _rule(self, text: str) -> Optional[str]:
+        """按规则判断整段去除的原因"""
+        if _SYMBOLS_ONLY.match(text):
+            return 'symbols'
+        if any(pattern.search(text) for pattern in self.extra_patterns):
+            return 'pattern'
+        if len(text) > RULE_MAX_LENGTH:
+            return None
+        if _BYLINE.match(text):
+            return 'byline'
+        if _BUTTONS.match(text):
+            return 'share'
+        if _COPYRIGHT.search(text):
+            return 'copyright'
+        return None
+
+    def _repeated_across_articles(self, article: bytes, fingerprints: Iterable[bytes]) -> set:
+        """记录本篇开头和结尾的短段落指纹，返回在近期足够多篇不同文章中出现过的指纹"""
+        repeated = set()
+        for fingerprint in fingerprints:
+            articles = self._seen.pop(fingerprint, ())
+            if article not in articles:
+                articles = (articles + (article,))[-self.repeat_articles:]
+            self._seen[fingerprint] = articles
+            if len(articles) >= self.repeat_articles:
+                repeated.add(fingerprint)
+        while len(self._seen) > self.repeat_window:
+            self._seen.popitem(last=False)
+        return repeated
+
+    def strip(self, paragraphs: List[Paragraph]) -> List[Paragraph]:
+        """
+        去除模板内容
+
+        Args:
+            paragraphs: 文章段落
+
+        Returns:
+            保留的段落（按原文顺序）
+        """
+        kept = []
+        removed = Counter()
+        seen_in_article = set()
+        short_fingerprints = {}
+        in_related = False
+
+        for index, paragraph in enumerate(paragraphs):
+            text = paragraph.text
+            if index < 2:
+                # 电头和记者署名只出现在正文开头
+                stripped = _REPORTER.sub('', _DATELINE.sub('', text), count=1).strip()
+                if stripped != text:
+                    removed['dateline'] += 1
+                    if not stripped:
+                        continue
+                    paragraph = paragraph._replace(text=stripped, link_chars=min(paragraph.link_chars, len(stripped)))
+                    text = stripped
+
+            if _RELATED.match(text) and len(text) <= RULE_MAX_LENGTH:
+                in_related = True
+                removed['related'] += 1
+                continue
+            if in_related:
+                if len(text) <= _RELATED_ITEM_MAX_LENGTH or paragraph.link_density >= self.link_density:
+                    removed['related'] += 1
+                    continue
+                in_related = False
+
+            reason = self._rule(text)
+            if reason is None and paragraph.link_chars and paragraph.link_density >= self.link_density:
+                reason = 'links'
+            fingerprint = _fingerprint(text)
+            if reason is None and fingerprint in seen_in_article:
+                reason = 'duplicate'
+            if reason is not None:
+                removed[reason] += 1
+                continue
+            seen_in_article.add(fingerprint)
+            if len(text) <= self.repeat_max_length:
+                short_fingerprints[fingerprint] = len(kept)
+            kept.append(paragraph)
+
+        # 只看开头和结尾处的短段落
+        edge = {fingerprint: index for fingerprint, index in short_fingerprints.items()
+                if index < _EDGE_PARAGRAPHS or index >= len(kept) - _EDGE_PARAGRAPHS}
+        if self.repeat_articles and edge:
+            article = _fingerprint(''.join(paragraph.text for paragraph in paragraphs))
+            repeated = self._repeated_across_articles(article, edge)
+            if repeated:
+                drop = {edge[fingerprint] for fingerprint in repeated}
+                removed['repeated'] += len(drop)
+                kept = [paragraph for index, paragraph in enumerate(kept) if index not in drop]
+
+        original_chars = sum(len(paragraph.text) for paragraph in paragraphs)
+        kept_chars = sum(len(paragraph.text) for paragraph in kept)
+        if original_chars and kept_chars < original_chars * self.min_keep_ratio:
+            logger.warning(f"去除模板内容后只剩{kept_chars}/{original_chars}字，可能误判，保留原文")
+            kept = list(paragraphs)
+            removed = Counter()
+
+        self._record(paragraphs, kept, removed)
+        return kept
+
+    def _record(self, paragraphs: List[Paragraph], kept: List[Paragraph], removed: Counter) -> None:
+        """统计并记录本次节省的输入token"""
+        before = estimate_tokens('\n'.join(paragraph.text for paragraph in paragraphs))
+        after = estimate_tokens('\n'.join(paragraph.text for paragraph in kept))
+        self.requests += 1
+        self.tokens_before += before
+        self.tokens_after += after
+        self.reasons.update(removed)
+        if removed:
+            details = ', '.join(f"{reason}={count}" for reason, count in removed.items())
+            logger.info(f"去除模板内容{sum(removed.values())}段({details})，预估输入token {before} -> {after}"
+                        f"（节省{before - after}）")
+
+    def stats(self) -> Dict[str, Any]:
+        """返回处理的文章数、去除前后的输入token总数和各原因去除的段落数"""
+        saved = self.tokens_before - self.tokens_after
+        return {
+            'requests': self.requests,
+            'tokens_before': self.tokens_before,
+            'tokens_after': self.tokens_after,
+            'tokens_saved': saved,
+            'saved_ratio': round(saved / self.tokens_before, 4) if self.tokens_before else 0.0,
+            'reasons': dict(self.reasons)
+        }
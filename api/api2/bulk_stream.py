@@ -0,0 +1,147 @@
+"""
+批量处理模块 - 流式NDJSON输入/输出与有界并发
+
+请求体按行增量解析，只有在并发槽位空出时才读取下一篇文章，
+结果按完成顺序逐行输出，因此内存占用只与并发上限有关，与批量大小无关。
+"""
+import json
+import asyncio
+import codecs
+import logging
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Set
+
+from fastapi.responses import StreamingResponse
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class LineTooLongError(ValueError):
+    """单行NDJSON超过长度上限"""
+
+
+class NDJSONStreamingResponse(StreamingResponse):
+    """
+    NDJSON流式响应，允许在输出结果的同时继续读取请求体
+
+    StreamingResponse会在后台调用receive()监听客户端断开，与请求体读取争抢同一个receive通道，
+    导致请求体消息被吞掉；这里不另行监听，客户端断开时由send()抛出异常结束迭代。
+    """
+
+    media_type = "application/x-ndjson"
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            async for chunk in self.body_iterator:
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            aclose = getattr(self.body_iterator, 'aclose', None)
+            if aclose is not None:
+                await aclose()
+
+
+async def iter_ndjson_lines(chunks: AsyncIterator[bytes], max_line_bytes: int) -> AsyncIterator[str]:
+    """
+    把字节流切分为NDJSON文本行（跳过空行）
+
+    Args:
+        chunks: 请求体字节块
+        max_line_bytes: 单行最大字节数
+
+    Yields:
+        去除首尾空白后的文本行
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    # 当前未结束行的片段，只对新到达的文本查找换行，避免长行被反复扫描
+    pieces = []
+    pending_bytes = 0
+    async for chunk in chunks:
+        text = decoder.decode(chunk)
+        parts = text.split('\n')
+        for part in parts[:-1]:
+            pieces.append(part)
+            line = ''.join(pieces).strip()
+            pieces = []
+            pending_bytes = 0
+            if line:
+                yield line
+        pieces.append(parts[-1])
+        pending_bytes += len(parts[-1].encode('utf-8'))
+        if pending_bytes > max_line_bytes:
+            raise LineTooLongError(f"单行长度超过上限 {max_line_bytes} 字节")
+    pieces.append(decoder.decode(b'', final=True))
+    line = ''.join(pieces).strip()
+    if line:
+        yield line
+
+
+async def process_ndjson(lines: AsyncIterator[str],
+                         handler: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]],
+                         concurrency: int) -> AsyncIterator[bytes]:
+    """
+    以有界并发处理NDJSON记录，并按完成顺序输出NDJSON结果
+
+    Args:
+        lines: NDJSON文本行
+        handler: 处理单条记录的协程函数，返回结果字典
+        concurrency: 最大并发数
+
+    Yields:
+        编码后的NDJSON结果行
+    """
+    pending: Set[asyncio.Task] = set()
+    line_number = 0
+
+    def encode(result: Dict[str, Any]) -> bytes:
+        return (json.dumps(result, ensure_ascii=False) + '\n').encode('utf-8')
+
+    async def handle(record: Dict[str, Any], number: int) -> Dict[str, Any]:
+        item_id = record.get('id')
+        try:
+            data = await handler(record)
+            return {'id': item_id, 'code': 0, 'msg': 'success', 'data': data}
+        except Exception as e:
+            detail = getattr(e, 'detail', None) or str(e)
+            logger.error(f"批量处理第{number}行(id={item_id})失败: {detail}")
+            return {'id': item_id, 'code': getattr(e, 'status_code', 500), 'msg': f"处理失败: {detail}", 'data': None}
+
+    try:
+        read_error = None
+        try:
+            async for line in lines:
+                line_number += 1
+                try:
+                    record = json.loads(line)
+                    if not isinstance(record, dict) or not isinstance(record.get('content'), str):
+                        raise ValueError("每行必须是包含content字段的JSON对象")
+                except ValueError as e:
+                    yield encode({'id': None, 'line': line_number, 'code': 400,
+                                  'msg': f"第{line_number}行格式错误: {e}", 'data': None})
+                    continue
+
+                pending.add(asyncio.ensure_future(handle(record, line_number)))
+                # 及时输出已完成的结果；并发已满时等待有任务完成后再读取下一行
+                done = {task for task in pending if task.done()}
+                for task in done:
+                    pending.discard(task)
+                    yield encode(task.result())
+                while len(pending) >= concurrency:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        yield encode(task.result())
+        except LineTooLongError as e:
+            read_error = {'id': None, 'line': line_number + 1, 'code': 413, 'msg': str(e), 'data': None}
+
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield encode(task.result())
+        if read_error is not None:
+            yield encode(read_error)
+    finally:
+        # 客户端断开或出错时取消尚未完成的任务
+        for task in pending:
+            task.cancel()
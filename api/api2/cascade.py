@@ -0,0 +1,159 @@
+"""
+模型级联模块 - 先用小模型分析，结果不合格时再升级到大模型
+
+多数新闻篇幅短、结构固定，小模型即可给出合格的结果。级联模式先调用小模型，
+按响应格式校验其原始输出（栏目在固定的17个分类中、标题不超过40字、4个关键词、
+3个标签、概要非空、分析报告包含5个部分），校验失败才调用大模型。
+
+CascadeStats记录升级率、两级模型的平均延迟和token用量，并据此估算节省的延迟和费用：
+  小模型结果被采用时节省 = 大模型平均延迟（费用） - 小模型本次延迟（费用）
+  升级时浪费 = 小模型本次延迟（费用）
+"""
+import re
+import logging
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 栏目分类（与提示词中的列表一致）
+CATEGORIES = frozenset({
+    '澳闻', '珠海', '港台', '国内', '国际', '旅游', '头条', '头条报', '看澳门',
+    '视频', '贵州', '娱乐', '攻略', '运势', '美食', '外雇天地', '粤韵周刊'
+})
+
+TITLE_MAX_LENGTH = 40
+KEYWORD_COUNT = 4
+TAG_COUNT = 3
+MARKDOWN_SECTIONS = 5
+
+# 分析报告各部分的编号行，如 "1. **新闻核心概括**"
+_SECTION_PATTERN = re.compile(r'^\s*(\d+)\.\s*\*\*', re.MULTILINE)
+
+
+def _is_string_list(value: Any, count: int) -> bool:
+    return (isinstance(value, list) and len(value) == count
+            and all(isinstance(item, str) and item.strip() for item in value))
+
+
+def validate_analysis(result: Dict[str, Any]) -> List[str]:
+    """
+    校验模型的原始输出（截断之前）
+
+    Args:
+        result: 模型输出的JSON对象
+
+    Returns:
+        不合格的原因列表，为空表示通过
+    """
+    problems = []
+    title = result.get('title')
+    if not isinstance(title, str) or not title.strip():
+        problems.append('title_missing')
+    elif len(title) > TITLE_MAX_LENGTH:
+        problems.append('title_too_long')
+    if result.get('categoryName') not in CATEGORIES:
+        problems.append('category_invalid')
+    if not _is_string_list(result.get('keywords'), KEYWORD_COUNT):
+        problems.append('keywords_invalid')
+    if not _is_string_list(result.get('tags'), TAG_COUNT):
+        problems.append('tags_invalid')
+    introduction = result.get('aiIntroduction')
+    if not isinstance(introduction, str) or not introduction.strip():
+        problems.append('introduction_missing')
+    markdown = result.get('markdown')
+    sections = set(_SECTION_PATTERN.findall(markdown)) if isinstance(markdown, str) else set()
+    if sections != {str(i) for i in range(1, MARKDOWN_SECTIONS + 1)}:
+        problems.append('markdown_sections')
+    return problems
+
+
+class _TierStats:
+    """一级模型的调用数、总耗时和总token数"""
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.tokens = 0
+
+    def record(self, seconds: float, tokens: int) -> None:
+        self.calls += 1
+        self.seconds += seconds
+        self.tokens += tokens
+
+    def mean_seconds(self) -> Optional[float]:
+        return self.seconds / self.calls if self.calls else None
+
+    def mean_tokens(self) -> Optional[float]:
+        return self.tokens / self.calls if self.calls else None
+
+
+class CascadeStats:
+    """级联调用的升级率以及节省的延迟和费用估算"""
+
+    def __init__(self, small_price: float = 0.0, large_price: float = 0.0):
+        """
+        Args:
+            small_price: 小模型每百万token的价格（元）
+            large_price: 大模型每百万token的价格（元）
+        """
+        self.small_price = small_price
+        self.large_price = large_price
+        self.small = _TierStats()
+        self.large = _TierStats()
+        self.accepted = 0
+        self.escalated = 0
+        self.reasons = Counter()
+        # 小模型结果被采用时的耗时和token数，升级时被浪费的耗时和token数
+        self._accepted_seconds = 0.0
+        self._accepted_tokens = 0
+        self._wasted_seconds = 0.0
+        self._wasted_tokens = 0
+
+    def record_small(self, seconds: float, tokens: int, problems: List[str]) -> None:
+        """记录一次小模型调用及其校验结果"""
+        self.small.record(seconds, tokens)
+        if problems:
+            self.escalated += 1
+            self.reasons.update(problems)
+            self._wasted_seconds += seconds
+            self._wasted_tokens += tokens
+        else:
+            self.accepted += 1
+            self._accepted_seconds += seconds
+            self._accepted_tokens += tokens
+
+    def record_small_error(self, seconds: float, reason: str) -> None:
+        """记录一次调用失败或输出无法解析的小模型调用（随后升级）"""
+        self.escalated += 1
+        self.reasons[reason] += 1
+        self._wasted_seconds += seconds
+
+    def record_large(self, seconds: float, tokens: int) -> None:
+        """记录一次大模型调用"""
+        self.large.record(seconds, tokens)
+
+    def stats(self) -> Dict[str, Any]:
+        """返回升级率、各级平均延迟和节省估算（大模型样本不足时节省项为None）"""
+        requests = self.accepted + self.escalated
+        large_seconds = self.large.mean_seconds()
+        large_tokens = self.large.mean_tokens()
+        saved_seconds = saved_cost = None
+        if large_seconds is not None:
+            saved_seconds = self.accepted * large_seconds - self._accepted_seconds - self._wasted_seconds
+            saved_cost = (self.accepted * large_tokens * self.large_price
+                          - (self._accepted_tokens + self._wasted_tokens) * self.small_price) / 1e6
+        small_seconds = self.small.mean_seconds()
+        return {
+            'requests': requests,
+            'accepted': self.accepted,
+            'escalated': self.escalated,
+            'escalation_rate': round(self.escalated / requests, 4) if requests else 0.0,
+            'reasons': dict(self.reasons),
+            'small_latency': round(small_seconds, 3) if small_seconds is not None else None,
+            'large_latency': round(large_seconds, 3) if large_seconds is not None else None,
+            'latency_saved_seconds': round(saved_seconds, 1) if saved_seconds is not None else None,
+            'cost_saved': round(saved_cost, 4) if saved_cost is not None else None
+        }
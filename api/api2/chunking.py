@@ -0,0 +1,65 @@
+"""
+文本分块模块 - 按段落边界将长文本切分为不超过指定token数的分块
+
+段落按换行切分；相邻段落依次装入分块，直到再加一段会超过上限。
+单个段落超过上限时先按句末标点切分，单句仍超过上限时按字数硬切。
+"""
+import re
+from typing import List
+
+from token_estimator import estimate_tokens
+
+# 句末标点之后的位置
+_SENTENCE_END = re.compile(r'(?<=[。！？!?；;])')
+
+
+def split_paragraphs(text: str) -> List[str]:
+    """按换行切分段落，去掉空段落"""
+    return [paragraph.strip() for paragraph in re.split(r'\n+', text) if paragraph.strip()]
+
+
+def _split_paragraph(paragraph: str, max_tokens: int) -> List[str]:
+    """将超长段落切分为不超过max_tokens的句子片段"""
+    pieces = []
+    for sentence in _SENTENCE_END.split(paragraph):
+        while sentence and estimate_tokens(sentence) > max_tokens:
+            cut = max(1, len(sentence) * max_tokens // estimate_tokens(sentence))
+            pieces.append(sentence[:cut])
+            sentence = sentence[cut:]
+        if sentence:
+            pieces.append(sentence)
+    return pieces
+
+
+def chunk_text(text: str, max_tokens: int) -> List[str]:
+    """
+    按段落边界切分文本
+
+    Args:
+        text: 待切分的文本
+        max_tokens: 每个分块的预估token数上限
+
+    Returns:
+        按原文顺序排列的分块列表
+    """
+    units = []
+    for paragraph in split_paragraphs(text):
+        if estimate_tokens(paragraph) > max_tokens:
+            units.extend(_split_paragraph(paragraph, max_tokens))
+        else:
+            units.append(paragraph)
+
+    chunks = []
+    current = []
+    current_tokens = 0
+    for unit in units:
+        tokens = estimate_tokens(unit)
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append('\n'.join(current))
+            current = []
+            current_tokens = 0
+        current.append(unit)
+        current_tokens += tokens
+    if current:
+        chunks.append('\n'.join(current))
+    return chunks
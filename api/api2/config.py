@@ -8,5 +8,130 @@ logger = logging.getLogger(__name__)
 config = {
     'api_key': '',
     'api_url': 'https://api.siliconflow.cn/v1',
-    'api_model': 'Qwen/Qwen2.5-32B-Instruct'
+    'api_model': 'Qwen/Qwen2.5-32B-Instruct',
+    'api_weight': 1.0,  # 主后端（api_url + api_model）的路由权重
+    # 其他OpenAI兼容后端（其他服务商、其他模型或本地替身服务），按滚动延迟和错误率路由，失败时自动切换，每项形如
+    # {'name': 'local', 'api_url': 'http://127.0.0.1:8001/v1', 'api_key': '', 'model': 'qwen2.5-7b', 'weight': 0.5, 'rpm': 0,
+    #  'json_mode': False}
+    'model_backends': [],
+    'router_window': 50,  # 每个后端统计最近多少次调用
+    'router_error_penalty': 4.0,  # 错误率对路由代价的放大系数
+    'router_explore_rate': 0.05,  # 按权重随机选择后端的调用比例，使各后端的统计保持新鲜
+    # 分析模式：single 单次调用生成全部字段；fanout 元数据、概要、分析报告三个子提示词并发调用后合并（延迟更低，输入token约为3倍）；
+    # cascade 先用小模型分析，输出未通过格式校验（栏目、标题长度、关键词和标签数量、报告的5个部分）时再调用大模型
+    'analysis_mode': 'single',
+    # api2的处理流程：two_call 先调用Coze工作流重写，再分析重写后的内容；combined 一次调用同时输出重写内容和分析字段
+    # （上游调用减半，模型只读一遍原文；端到端延迟只省一次首字延迟和网络往返，见bench_pipeline.py；长文章仍分两次调用）。
+    # combined一次调用处理的文章不经过Coze工作流，重写由分析用的大模型完成，Coze的熔断、限流和熔断时的降级（coze_degrade_on_open）对其不生效
+    'pipeline_mode': 'two_call',
+    # 精简提示词：不要求模型回显原文（返回的content由清理后的原文填充），并按输出字段设置max_tokens
+    'lean_prompt': True,
+    # JSON输出模式（response_format={"type": "json_object"}），主后端和级联小模型使用该设置，
+    # model_backends中的后端需在各自配置中设置'json_mode': True
+    'json_mode': True,
+    # 模型输出的JSON容错修复后仍无法解析时，请模型只修正格式后重新输出一次（输出长度与原输出相当）
+    'json_reask_enabled': True,
+    # 级联模式的小模型，服务地址和API密钥为空时与主后端相同；价格为每百万token的元数，用于估算节省的费用
+    'cascade_small_model': 'Qwen/Qwen2.5-7B-Instruct',
+    'cascade_small_api_url': '',
+    'cascade_small_api_key': '',
+    'cascade_small_price': 0.0,
+    'cascade_large_price': 1.26,
+    # 长文章map-reduce分析：清理后内容预估超过long_article_threshold个token时，按段落切分为不超过
+    # long_article_chunk_tokens的分块并发摘要（同一文章最多long_article_max_concurrency个并发调用），再基于摘要生成标准结果
+    'long_article_enabled': True,
+    'long_article_threshold': 6000,
+    'long_article_chunk_tokens': 2000,
+    'long_article_max_concurrency': 8,
+    # 输入token预算：清理后内容预估超过max_input_tokens时按input_budget_policy处理
+    # （trim 在段落或句子边界截断到预算内，reject 返回413），在调用任何上游服务之前执行；0表示不限制
+    'max_input_tokens': 30000,
+    'input_budget_policy': 'trim',
+    # token预估：按字符类别加权估算，token_estimator_weights可覆盖默认权重（如{'cjk': 0.7}，
+    # 可由python token_estimator.py samples.jsonl离线拟合）；启用校准时每token_calibration_refit次调用
+    # 按上游返回的实际prompt_tokens重新拟合
+    'token_estimator_weights': {},
+    'token_calibration_enabled': True,
+    'token_calibration_refit': 50,
+    # 异步HTTP连接池配置（单个worker可同时保持数百个分析请求）
+    'max_connections': 500,
+    'max_keepalive_connections': 100,
+    'keepalive_expiry': 30,
+    # Coze工作流：新闻内容只在parameters中按coze_input_parameter（工作流开始节点的输入变量名）发送一次，
+    # coze_parameters为其他固定输入参数；coze_run_mode为run（同步执行）、stream（流式执行，以服务端事件返回输出，
+    # 工作流出错时立即返回）或async（异步提交后轮询执行结果，等待期间不占用连接，适合执行时间长的工作流）
+    'coze_input_parameter': 'input',
+    'coze_parameters': {},
+    'coze_run_mode': 'run',
+    # 异步执行的查询间隔：从coze_poll_initial_delay（或典型执行耗时的八成）开始按倍数增长到coze_poll_max_delay；
+    # coze_async_timeout为单次执行的最长等待时间（秒）
+    'coze_poll_initial_delay': 1.0,
+    'coze_poll_max_delay': 10.0,
+    'coze_poll_multiplier': 1.5,
+    'coze_async_timeout': 600,
+    # Coze新闻重写客户端连接池配置
+    'coze_max_connections': 100,
+    'coze_max_keepalive_connections': 20,
+    'coze_keepalive_expiry': 30,
+    # 上游限流（每个worker进程独立计数，多worker部署时按worker数拆分配额；rpm、tpm为0表示不限制请求数、token数）
+    'rate_limit_enabled': True,
+    'silicon_flow_rpm': 1000,
+    'silicon_flow_tpm': 50000,
+    'coze_rpm': 60,
+    'coze_tpm': 0,
+    'rate_limit_output_tokens': 1500,  # 预估单次分析的输出token数
+    # 上游重试（429、408、5xx、网络错误）：指数退避加抖动，单次调用最多retry_max_attempts次尝试
+    'retry_max_attempts': 4,
+    'retry_base_delay': 2.0,
+    'retry_max_delay': 30,
+    # 请求截止时间（秒）：/analyze默认request_timeout，其他接口可通过请求头X-Request-Timeout指定（不超过request_max_timeout），
+    # 各阶段的重试和读取超时不会超过剩余时间
+    'request_timeout': 120,
+    'request_max_timeout': 600,
+    # 对冲请求（硅基流动）：首字节延迟超过近期第hedge_percentile百分位（不低于hedge_min_delay秒）时再发一个相同请求，
+    # 对冲调用数不超过总调用数的hedge_budget比例；样本数达到hedge_min_samples后才开始对冲
+    'hedge_enabled': False,
+    'hedge_percentile': 95,
+    'hedge_budget': 0.05,
+    'hedge_min_delay': 1.0,
+    'hedge_min_samples': 20,
+    # 熔断器（硅基流动、Coze各一个）：最近circuit_window_size次调用中失败率或慢调用率超过阈值时打开，
+    # 打开circuit_open_duration秒内快速失败，之后放行circuit_half_open_max_calls个探测调用
+    'circuit_breaker_enabled': True,
+    'circuit_window_size': 20,
+    'circuit_min_calls': 10,
+    'circuit_failure_rate': 0.5,
+    'circuit_slow_call_duration': 25,
+    'circuit_slow_call_rate': 0.8,
+    'circuit_open_duration': 30,
+    'circuit_half_open_max_calls': 2,
+    'coze_degrade_on_open': True,  # Coze熔断时跳过重写，直接分析原文（响应中degraded为true）
+    # 分析结果缓存配置（内存LRU + SQLite WAL持久层，同一主机的多个worker共享）
+    'cache_enabled': True,
+    'cache_db_path': 'analysis_cache.db',
+    'cache_max_entries': 2048,
+    'cache_ttl': 7 * 24 * 3600,
+    # 近似重复检测（SimHash），最大汉明距离越大越宽松，查询越慢（4以内在数百万篇规模下仍为亚毫秒）
+    'near_duplicate_enabled': True,
+    'near_duplicate_max_distance': 4,
+    'near_duplicate_shingle_size': 4,
+    # 去除模板内容（电头署名、责任编辑、分享按钮、版权声明、相关阅读列表、链接密集段落和重复段落），减少输入token；
+    # 开头或结尾的短段落在最近boilerplate_repeat_articles篇不同文章中都出现过时视为网站模板（0为关闭该项）
+    'boilerplate_enabled': True,
+    'boilerplate_link_density': 0.5,
+    'boilerplate_repeat_articles': 3,
+    'boilerplate_repeat_window': 10000,
+    'boilerplate_patterns': [],  # 额外的正则，匹配的段落整段去除
+    # 批量分析接口（NDJSON）默认并发数、并发上限和单行最大字节数
+    'bulk_concurrency': 16,
+    'bulk_max_concurrency': 128,
+    'bulk_max_line_bytes': 4 * 1024 * 1024,
+    # 异步任务队列（SQLite持久化，进程重启后继续执行未完成任务）
+    'job_db_path': 'jobs.db',
+    'job_workers': 4,
+    'job_lease': 60,
+    'job_max_attempts': 3,  # 暂时性错误（熔断、限流、上游超时）后的重试也计入
+    'job_retry_delay': 5,  # 暂时性错误后首次重试的等待秒数，之后每次翻倍
+    'job_max_retry_delay': 60,
+    'job_max_wait': 60
 }
@@ -0,0 +1,167 @@
+"""
+对冲请求模块 - 降低上游尾延迟
+
+上游偶尔会有请求卡住直到读取超时，拉高p99。对冲策略记录最近请求的首字节延迟，
+当一次调用在该分布的指定百分位（如p95）时间内仍未返回首字节时，再发出一个相同的请求，
+取先返回者并取消另一个。
+
+为控制额外成本，对冲受全局预算约束：每次正常调用积累budget（如0.05）个额度，
+每次对冲消耗1个额度，因此额外调用长期不超过总调用数的budget比例。
+"""
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+
+class LatencyTracker:
+    """滑动窗口内的延迟样本，用于计算百分位"""
+
+    def __init__(self, window: int = 500):
+        self._samples = deque(maxlen=window)
+
+    def record(self, latency: float) -> None:
+        self._samples.append(latency)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, p: float) -> Optional[float]:
+        """返回第p百分位的延迟，没有样本时返回None"""
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(len(ordered) * p / 100))
+        return ordered[index]
+
+
+class HedgePolicy:
+    """按首字节延迟百分位触发对冲请求，并受全局预算约束"""
+
+    def __init__(self, name: str, percentile: float = 95, budget: float = 0.05, min_delay: float = 1.0,
+                 min_samples: int = 20, window: int = 500, max_credit: float = 10):
+        """
+        初始化对冲策略
+
+        Args:
+            name: 上游名称，用于日志和统计
+            percentile: 触发对冲的首字节延迟百分位
+            budget: 对冲请求占总调用数的比例上限
+            min_delay: 对冲等待时间下限（秒），避免在上游整体很快时频繁对冲
+            min_samples: 样本数达到该值后才开始对冲
+            window: 延迟样本窗口大小
+            max_credit: 预算额度累积上限，限制突发对冲数量
+        """
+        self.name = name
+        self.percentile = percentile
+        self.budget = budget
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.max_credit = max_credit
+        self.latency = LatencyTracker(window)
+        self._credit = 0.0
+        self._counters = {
+            'calls': 0,
+            'hedged': 0,
+            'hedge_wins': 0,
+            'budget_exhausted': 0
+        }
+
+    def hedge_delay(self) -> Optional[float]:
+        """当前的对冲等待时间，样本不足时返回None（不对冲）"""
+        if len(self.latency) < self.min_samples:
+            return None
+        return max(self.min_delay, self.latency.percentile(self.percentile))
+
+    async def run(self, call: Callable[[], Awaitable[T]],
+                  hedge_call: Optional[Callable[[], Awaitable[T]]] = None,
+                  discard: Optional[Callable[[T], Awaitable[Any]]] = None) -> T:
+        """
+        执行调用，超过对冲等待时间仍未返回时发出对冲请求
+
+        Args:
+            call: 发起调用的协程函数，返回首字节（响应头）到达后的结果
+            hedge_call: 对冲请求使用的协程函数，默认与call相同
+            discard: 释放落败调用结果的协程函数（如关闭响应）
+
+        Returns:
+            先完成的调用结果
+        """
+        self._counters['calls'] += 1
+        self._credit = min(self.max_credit, self._credit + self.budget)
+        started = time.monotonic()
+        primary = asyncio.ensure_future(call())
+        attempts = {primary: started}
+        try:
+            delay = self.hedge_delay()
+            if delay is not None:
+                await asyncio.wait({primary}, timeout=delay)
+            if delay is None or primary.done():
+                return await self._finish(primary, started)
+            if self._credit < 1:
+                self._counters['budget_exhausted'] += 1
+                return await self._finish(primary, started)
+
+            self._credit -= 1
+            self._counters['hedged'] += 1
+            logger.info(f"{self.name} 请求{delay:.2f}秒未返回首字节，发出对冲请求")
+            hedge = asyncio.ensure_future((hedge_call or call)())
+            attempts[hedge] = time.monotonic()
+            pending = set(attempts)
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                succeeded = [task for task in done if not task.cancelled() and task.exception() is None]
+                if not succeeded and pending:
+                    # 先结束的一方失败时继续等待另一方
+                    continue
+                winner = succeeded[0] if succeeded else next(iter(done))
+                if succeeded and winner is hedge:
+                    self._counters['hedge_wins'] += 1
+                # 被取消的一方只知道它至少耗时这么久，按此记录以免低估延迟分布
+                now = time.monotonic()
+                for task, task_started in attempts.items():
+                    if task is winner or task in pending:
+                        self.latency.record(now - task_started)
+                if discard is not None:
+                    for task in succeeded[1:]:
+                        await discard(task.result())
+                return winner.result()
+        finally:
+            # 取消落败或调用方已放弃的请求
+            for task in attempts:
+                if not task.done():
+                    task.cancel()
+                    if discard is not None:
+                        task.add_done_callback(self._discard_late(discard))
+
+    @staticmethod
+    def _discard_late(discard: Callable[[Any], Awaitable[Any]]) -> Callable[[asyncio.Task], None]:
+        """取消后仍返回了结果的调用（取消与完成竞争时）同样需要释放"""
+        def callback(task: asyncio.Task) -> None:
+            if not task.cancelled() and task.exception() is None:
+                asyncio.ensure_future(discard(task.result()))
+        return callback
+
+    async def _finish(self, primary: asyncio.Future, started: float) -> Any:
+        """等待未对冲的调用完成并记录延迟"""
+        result = await primary
+        self.latency.record(time.monotonic() - started)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        """返回调用数、对冲数、对冲胜出数和当前对冲等待时间"""
+        delay = self.hedge_delay()
+        return {
+            **self._counters,
+            'hedge_rate': round(self._counters['hedged'] / self._counters['calls'], 4)
+            if self._counters['calls'] else 0.0,
+            'hedge_delay': round(delay, 3) if delay is not None else None,
+            'samples': len(self.latency)
+        }
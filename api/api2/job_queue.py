@@ -0,0 +1,354 @@
+"""
+持久化异步任务队列 - SQLite任务存储 + 本地worker池
+
+重写+分析链路耗时常常超过网关超时，任务模式下提交后立即返回任务ID，
+由本地worker池在后台处理，任务状态和结果保存在SQLite中。
+
+worker通过带租约的原子认领获取任务，执行期间定期续租；
+进程正常关闭时会释放手中的任务，异常退出时任务在租约到期后被重新认领，
+因此任务可以在进程重启后继续执行，同一主机上的多个uvicorn worker也可以共享同一个队列。
+处理函数抛出暂时性错误（熔断、限流、上游超时等）时任务退回待处理状态，退避后重新执行，
+与异常退出后的重新认领一起受max_attempts限制。
+"""
+import json
+import time
+import uuid
+import sqlite3
+import asyncio
+import logging
+import threading
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 任务状态
+PENDING = 'pending'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+FINISHED_STATUSES = (SUCCEEDED, FAILED)
+
+
+class JobStore:
+    """基于SQLite(WAL)的任务存储"""
+
+    def __init__(self, db_path: str):
+        """
+        初始化任务存储
+
+        Args:
+            db_path: SQLite数据库路径
+        """
+        self.db_path = db_path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        """按需打开SQLite连接（调用方需持有_lock）"""
+        if self._conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10, check_same_thread=False, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS jobs ('
+                'id TEXT PRIMARY KEY, status TEXT NOT NULL, payload TEXT NOT NULL, '
+                'result TEXT, error TEXT, attempts INTEGER NOT NULL DEFAULT 0, '
+                'lease_until REAL NOT NULL DEFAULT 0, '
+                'created_at REAL NOT NULL, updated_at REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at)')
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        job = dict(row)
+        job['payload'] = json.loads(job['payload'])
+        job['result'] = json.loads(job['result']) if job['result'] is not None else None
+        return job
+
+    def create(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """新建待处理任务"""
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._connect().execute(
+                'INSERT INTO jobs (id, status, payload, created_at, updated_at) VALUES (?, ?, ?, ?, ?)',
+                (job_id, PENDING, json.dumps(payload, ensure_ascii=False), now, now)
+            )
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """查询任务"""
+        with self._lock:
+            row = self._connect().execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return self._to_dict(row) if row is not None else None
+
+    def claim(self, lease: float, max_attempts: int) -> Optional[Dict[str, Any]]:
+        """
+        原子认领最早的待处理任务（已到重试时间）或租约已过期的运行中任务
+
+        Args:
+            lease: 租约时长（秒）
+            max_attempts: 最大执行次数，超过后任务标记为失败
+
+        Returns:
+            被认领的任务，没有可认领任务时返回None
+        """
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            # BEGIN IMMEDIATE 在多个进程之间串行化认领操作
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                while True:
+                    row = conn.execute(
+                        'SELECT * FROM jobs WHERE (status = ? AND lease_until <= ?) OR (status = ? AND lease_until < ?) '
+                        'ORDER BY created_at LIMIT 1',
+                        (PENDING, now, RUNNING, now)
+                    ).fetchone()
+                    if row is None:
+                        conn.execute('COMMIT')
+                        return None
+                    if row['attempts'] >= max_attempts:
+                        conn.execute(
+                            'UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?',
+                            (FAILED, f"任务执行{row['attempts']}次后仍未完成", now, row['id'])
+                        )
+                        continue
+                    conn.execute(
+                        'UPDATE jobs SET status = ?, attempts = attempts + 1, lease_until = ?, updated_at = ? '
+                        'WHERE id = ?',
+                        (RUNNING, now + lease, now, row['id'])
+                    )
+                    conn.execute('COMMIT')
+                    job = self._to_dict(row)
+                    job['status'] = RUNNING
+                    job['attempts'] += 1
+                    return job
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+
+    def renew(self, job_id: str, lease: float) -> None:
+        """续租运行中的任务"""
+        with self._lock:
+            self._connect().execute(
+                'UPDATE jobs SET lease_until = ? WHERE id = ? AND status = ?',
+                (time.time() + lease, job_id, RUNNING)
+            )
+
+    def finish(self, job_id: str, result: Optional[Dict[str, Any]] = None, error: Optional[str] = None) -> None:
+        """记录任务结果"""
+        status = FAILED if error is not None else SUCCEEDED
+        with self._lock:
+            self._connect().execute(
+                'UPDATE jobs SET status = ?, result = ?, error = ?, lease_until = 0, updated_at = ? WHERE id = ?',
+                (status, json.dumps(result, ensure_ascii=False) if result is not None else None,
+                 error, time.time(), job_id)
+            )
+
+    def retry(self, job_id: str, error: str, delay: float) -> None:
+        """把暂时失败的运行中任务退回待处理状态，delay秒后才可被重新认领（计入执行次数）"""
+        now = time.time()
+        with self._lock:
+            self._connect().execute(
+                'UPDATE jobs SET status = ?, error = ?, lease_until = ?, updated_at = ? WHERE id = ? AND status = ?',
+                (PENDING, error, now + delay, now, job_id, RUNNING)
+            )
+
+    def release(self, job_ids: List[str]) -> None:
+        """释放运行中的任务，使其可被立即重新认领（不计入执行次数）"""
+        with self._lock:
+            conn = self._connect()
+            for job_id in job_ids:
+                conn.execute(
+                    'UPDATE jobs SET status = ?, attempts = MAX(attempts - 1, 0), lease_until = 0, updated_at = ? '
+                    'WHERE id = ? AND status = ?',
+                    (PENDING, time.time(), job_id, RUNNING)
+                )
+
+    def counts(self) -> Dict[str, int]:
+        """按状态统计任务数"""
+        with self._lock:
+            rows = self._connect().execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall()
+        return {status: count for status, count in rows}
+
+    def close(self) -> None:
+        """关闭SQLite连接"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class JobQueue:
+    """本地worker池，从JobStore认领并执行任务"""
+
+    def __init__(self, store: JobStore, handler: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]],
+                 workers: int = 4, lease: float = 60, max_attempts: int = 3, poll_interval: float = 1.0,
+                 is_transient: Optional[Callable[[Exception], bool]] = None, retry_delay: float = 5.0,
+                 max_retry_delay: float = 60.0):
+        """
+        初始化任务队列
+
+        Args:
+            store: 任务存储
+            handler: 处理任务负载的协程函数，返回结果字典
+            workers: worker数量
+            lease: 认领租约时长（秒），执行期间每1/3租约续租一次
+            max_attempts: 最大执行次数（暂时性错误后的重试和进程异常退出导致的重新认领都计入）
+            poll_interval: 空闲时轮询数据库的间隔（秒），用于发现其他进程提交的任务
+            is_transient: 判断处理函数抛出的异常是否为暂时性错误，为None时所有错误都直接标记任务失败
+            retry_delay: 暂时性错误后首次重试的等待时间（秒），之后每次翻倍
+            max_retry_delay: 重试等待时间上限（秒）
+        """
+        self.store = store
+        self.handler = handler
+        self.workers = workers
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.is_transient = is_transient
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+        self._running: Set[str] = set()
+        self._finished: Dict[str, asyncio.Event] = {}
+        # 各任务正在等待完成事件的get调用数，没有等待者时删除事件，避免长轮询超时后残留
+        self._waiters: Dict[str, int] = {}
+
+    async def start(self) -> None:
+        """启动worker池，会自动恢复未完成的任务"""
+        counts = await asyncio.to_thread(self.store.counts)
+        logger.info(f"任务队列启动: {self.workers}个worker, 现有任务 {counts}")
+        self._tasks = [asyncio.ensure_future(self._worker(i)) for i in range(self.workers)]
+
+    async def stop(self) -> None:
+        """停止worker池并释放运行中的任务，便于重启后立即继续"""
+        # 取消时_run会把任务移出_running，需先记下；期间已完成的任务不再是running状态，release不会影响
+        running = list(self._running)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if running:
+            logger.info(f"释放 {len(running)} 个运行中的任务")
+            await asyncio.to_thread(self.store.release, running)
+
+    async def submit(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        提交任务
+
+        Args:
+            payload: 任务负载
+
+        Returns:
+            新建的任务
+        """
+        job = await asyncio.to_thread(self.store.create, payload)
+        self._wakeup.set()
+        return job
+
+    async def get(self, job_id: str, wait: float = 0) -> Optional[Dict[str, Any]]:
+        """
+        查询任务，可选长轮询等待任务完成
+
+        Args:
+            job_id: 任务ID
+            wait: 最长等待时间（秒），0表示立即返回
+
+        Returns:
+            任务信息，不存在时返回None
+        """
+        deadline = time.monotonic() + wait
+        while True:
+            job = await asyncio.to_thread(self.store.get, job_id)
+            remaining = deadline - time.monotonic()
+            if job is None or job['status'] in FINISHED_STATUSES or remaining <= 0:
+                return job
+            # 本进程执行的任务完成时立即唤醒；其他进程执行的任务按轮询间隔检查
+            event = self._finished.setdefault(job_id, asyncio.Event())
+            self._waiters[job_id] = self._waiters.get(job_id, 0) + 1
+            try:
+                await asyncio.wait_for(event.wait(), timeout=min(remaining, self.poll_interval))
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                self._waiters[job_id] -= 1
+                if not self._waiters[job_id]:
+                    del self._waiters[job_id]
+                    if self._finished.get(job_id) is event:
+                        del self._finished[job_id]
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            try:
+                job = await asyncio.to_thread(self.store.claim, self.lease, self.max_attempts)
+            except sqlite3.Error as e:
+                logger.error(f"认领任务失败: {e}")
+                job = None
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(job, index)
+
+    async def _run(self, job: Dict[str, Any], index: int) -> None:
+        job_id = job['id']
+        self._running.add(job_id)
+        heartbeat = asyncio.ensure_future(self._heartbeat(job_id))
+        logger.info(f"worker-{index} 开始执行任务 {job_id} (第{job['attempts']}次)")
+        started = time.monotonic()
+        record = self.store.finish
+        try:
+            try:
+                outcome = {'result': await self.handler(job['payload'])}
+                logger.info(f"任务 {job_id} 完成，耗时 {time.monotonic() - started:.1f}秒")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                detail = getattr(e, 'detail', None) or str(e)
+                if (self.is_transient is not None and self.is_transient(e)
+                        and job['attempts'] < self.max_attempts):
+                    # 暂时性错误：退回待处理状态，退避后重新执行
+                    delay = min(self.retry_delay * 2 ** (job['attempts'] - 1), self.max_retry_delay)
+                    logger.warning(f"任务 {job_id} 暂时失败: {detail}，{delay:.0f}秒后重试")
+                    record, outcome = self.store.retry, {'error': detail, 'delay': delay}
+                else:
+                    logger.error(f"任务 {job_id} 失败: {detail}")
+                    outcome = {'error': detail}
+            try:
+                await asyncio.to_thread(record, job_id, **outcome)
+            except sqlite3.Error as e:
+                # 不再续租，租约到期后由其他worker重新认领执行
+                logger.error(f"记录任务 {job_id} 结果失败: {e}，租约到期后重新执行")
+        finally:
+            heartbeat.cancel()
+            self._running.discard(job_id)
+            event = self._finished.pop(job_id, None)
+            if event is not None:
+                event.set()
+
+    async def _heartbeat(self, job_id: str) -> None:
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            try:
+                await asyncio.to_thread(self.store.renew, job_id, self.lease)
+            except sqlite3.Error as e:
+                logger.warning(f"任务 {job_id} 续租失败: {e}")
+
+    async def stats(self) -> Dict[str, Any]:
+        """返回各状态任务数和本进程运行中的任务数"""
+        return {
+            'counts': await asyncio.to_thread(self.store.counts),
+            'running_here': len(self._running),
+            'workers': self.workers
+        }
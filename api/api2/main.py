@@ -1,9 +1,13 @@
 """
 新闻重写和分析API服务
 """
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Depends, Request, Query
+from fastapi.responses import StreamingResponse
+from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import List, Optional, Tuple
+from contextlib import asynccontextmanager
+import json
 import logging
 import sys
 import os
@@ -11,9 +15,22 @@ import os
 
 
 # 导入必要的模块
-from content_cleaner import clean_html_content
-from silicon_flow_analyzer import analyze_with_silicon_flow
+from config import config
+from content_cleaner import extract_paragraphs, looks_like_html, text_paragraphs
+from boilerplate import BoilerplateRemover
+from bulk_stream import iter_ndjson_lines, process_ndjson, NDJSONStreamingResponse
+from silicon_flow_analyzer import (analyze_with_silicon_flow, stream_analysis, cached_call,
+                                   start_http_client, close_http_client,
+                                   analysis_cache, analysis_flight, near_duplicate_index, silicon_flow_limiter,
+                                   silicon_flow_hedger, silicon_flow_breaker,
+                                   silicon_flow_router, cascade_stats, parse_fields,
+                                   json_repair_stats, fanout_stats, fit_input_budget, token_estimator, input_budget_stats,
+                                   combined_rewrite_fits, rewrite_and_analyze_combined)
 from news_rewriter import NewsRewriter
+from job_queue import JobStore, JobQueue
+from rate_limiter import AdaptiveRateLimiter
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from retry_policy import RetryPolicy, RetryableError, DeadlineExceeded, DeadlineMiddleware
 
 # 配置日志
 logging.basicConfig(
@@ -26,25 +43,109 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：启动时创建共享连接池和重写客户端，关闭时释放"""
+    await start_http_client()
+    app.state.news_rewriter = NewsRewriter(
+        input_parameter=config['coze_input_parameter'],
+        parameters=config['coze_parameters'],
+        run_mode=config['coze_run_mode'],
+        poll_initial_delay=config['coze_poll_initial_delay'],
+        poll_max_delay=config['coze_poll_max_delay'],
+        poll_multiplier=config['coze_poll_multiplier'],
+        async_timeout=config['coze_async_timeout'],
+        max_connections=config['coze_max_connections'],
+        max_keepalive_connections=config['coze_max_keepalive_connections'],
+        keepalive_expiry=config['coze_keepalive_expiry'],
+        rate_limiter=AdaptiveRateLimiter(
+            'coze',
+            requests_per_minute=config['coze_rpm'],
+            tokens_per_minute=config['coze_tpm']
+        ) if config['rate_limit_enabled'] else None,
+        circuit_breaker=CircuitBreaker(
+            'coze',
+            window_size=config['circuit_window_size'],
+            min_calls=config['circuit_min_calls'],
+            failure_rate=config['circuit_failure_rate'],
+            slow_call_duration=config['circuit_slow_call_duration'],
+            slow_call_rate=config['circuit_slow_call_rate'],
+            open_duration=config['circuit_open_duration'],
+            half_open_max_calls=config['circuit_half_open_max_calls']
+        ) if config['circuit_breaker_enabled'] else None,
+        retry_policy=RetryPolicy(
+            'coze',
+            max_attempts=config['retry_max_attempts'],
+            base_delay=config['retry_base_delay'],
+            max_delay=config['retry_max_delay']
+        )
+    )
+
+    async def run_job(payload: dict) -> dict:
+        response_data = await process_news(payload['content'], app.state.news_rewriter)
+        return jsonable_encoder(response_data)
+
+    app.state.job_queue = JobQueue(
+        JobStore(config['job_db_path']), run_job,
+        workers=config['job_workers'],
+        lease=config['job_lease'],
+        max_attempts=config['job_max_attempts'],
+        is_transient=is_transient_error,
+        retry_delay=config['job_retry_delay'],
+        max_retry_delay=config['job_max_retry_delay']
+    )
+    await app.state.job_queue.start()
+    yield
+    await app.state.job_queue.stop()
+    app.state.job_queue.store.close()
+    await app.state.news_rewriter.aclose()
+    await close_http_client()
+    if analysis_cache is not None:
+        analysis_cache.close()
+    if near_duplicate_index is not None:
+        near_duplicate_index.close()
+
 app = FastAPI(
     title="新闻重写和分析API",
-    description="先对新闻内容进行重写，然后分析生成标题、关键词、标签、内容导读等"
+    description="先对新闻内容进行重写，然后分析生成标题、关键词、标签、内容导读等",
+    lifespan=lifespan
 )
+# 为每个请求设置截止时间，重写和分析阶段的重试共用剩余时间
+app.add_middleware(DeadlineMiddleware, default_timeout=config['request_timeout'],
+                   max_timeout=config['request_max_timeout'])
+
+# 任务处理中视为暂时性错误的状态码：限流、上游不可用或重试后仍未成功、截止时间已到
+TRANSIENT_STATUS = frozenset({429, 502, 503, 504})
+
+def is_transient_error(e: Exception) -> bool:
+    """判断任务处理中的错误是否为暂时性错误（稍后重试可能成功）"""
+    if isinstance(e, (CircuitOpenError, DeadlineExceeded, RetryableError)):
+        return True
+    return isinstance(e, HTTPException) and e.status_code in TRANSIENT_STATUS
+
+def get_news_rewriter(request: Request) -> NewsRewriter:
+    """依赖注入：获取应用范围内共享的新闻重写客户端"""
+    return request.app.state.news_rewriter
+
+def get_job_queue(request: Request) -> JobQueue:
+    """依赖注入：获取应用范围内共享的任务队列"""
+    return request.app.state.job_queue
 
 class NewsContent(BaseModel):
     """新闻内容请求模型"""
     content: str = Field(..., description="新闻原始内容")
 
 class NewsAnalysisResponse(BaseModel):
-    """新闻分析响应模型"""
+    """新闻分析响应模型（请求指定fields时只包含原文、重写内容和所需字段）"""
     original_content: str = Field(..., description="原始新闻内容")
     rewritten_content: str = Field(..., description="重写后的新闻内容")
-    title: str = Field(..., description="分析生成的标题")
-    keywords: List[str] = Field(..., description="关键词列表")
-    tags: List[str] = Field(..., description="标签列表")
-    categoryName: str = Field(..., description="栏目名称")
-    aiIntroduction: str = Field(..., description="新闻概要（150字以内）")
-    markdown: str = Field(..., description="Markdown格式的分析报告")
+    title: Optional[str] = Field(None, description="分析生成的标题")
+    keywords: Optional[List[str]] = Field(None, description="关键词列表")
+    tags: Optional[List[str]] = Field(None, description="标签列表")
+    categoryName: Optional[str] = Field(None, description="栏目名称")
+    aiIntroduction: Optional[str] = Field(None, description="新闻概要（150字以内）")
+    markdown: Optional[str] = Field(None, description="Markdown格式的分析报告")
+    degraded: bool = Field(False, description="重写服务熔断时为true，此时rewritten_content为原文，分析基于原文")
 
 class APIResponse(BaseModel):
     """API统一响应格式"""
@@ -52,45 +153,162 @@ class APIResponse(BaseModel):
     msg: str = "success"
     data: Optional[NewsAnalysisResponse] = None
 
-@app.post("/analyze", response_model=APIResponse, 
+class JobInfo(BaseModel):
+    """异步任务信息"""
+    id: str = Field(..., description="任务ID")
+    status: str = Field(..., description="任务状态：pending、running、succeeded、failed")
+    attempts: int = Field(..., description="已执行次数")
+    created_at: float = Field(..., description="创建时间（Unix时间戳）")
+    updated_at: float = Field(..., description="最近更新时间（Unix时间戳）")
+    result: Optional[NewsAnalysisResponse] = Field(None, description="任务成功时的处理结果")
+    error: Optional[str] = Field(None, description="任务失败时的错误信息")
+
+class JobResponse(BaseModel):
+    """任务接口响应格式"""
+    code: int = 0
+    msg: str = "success"
+    data: Optional[JobInfo] = None
+
+# 流式接口逐个推送的分析字段
+STREAM_FIELDS = ('title', 'categoryName', 'keywords', 'tags', 'aiIntroduction', 'markdown')
+
+def format_sse(event: str, data) -> str:
+    """格式化一条服务端事件(SSE)"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+# 去除模板内容（在正文提取之后）
+boilerplate_remover = BoilerplateRemover(
+    link_density=config['boilerplate_link_density'],
+    repeat_articles=config['boilerplate_repeat_articles'],
+    repeat_window=config['boilerplate_repeat_window'],
+    extra_patterns=config['boilerplate_patterns']
+) if config['boilerplate_enabled'] else None
+
+def prepare_content(content: str) -> Tuple[str, str]:
+    """
+    检查内容是否含有HTML标签或实体，有则提取正文；启用时去除模板内容；最后按输入token预算截断或拒绝
+
+    Returns:
+        (清理后的内容, 计算缓存键所用的内容)。缓存键取去除模板内容之前的正文：跨文章重复段落的判断依赖
+        进程内学到的状态，同一篇文章在学到网站页眉页脚前后的清理结果可能不同，不能作为缓存键
+    """
+    if looks_like_html(content):
+        logger.info("检测到HTML标签，进行内容清理...")
+        paragraphs = extract_paragraphs(content)
+    elif boilerplate_remover is not None:
+        paragraphs = text_paragraphs(content)
+    else:
+        content = fit_input_budget(content)
+        return content, content
+    extracted = '\n'.join(paragraph.text for paragraph in paragraphs)
+    if boilerplate_remover is not None:
+        paragraphs = boilerplate_remover.strip(paragraphs)
+    content = '\n'.join(paragraph.text for paragraph in paragraphs)
+    logger.info(f"内容清理完成，清理后长度: {len(content)}")
+    return fit_input_budget(content), extracted
+
+async def rewrite_content(content: str, rewriter: NewsRewriter) -> str:
+    """调用Coze工作流重写新闻内容，失败时抛出异常"""
+    logger.info("开始重写新闻内容...")
+    rewrite_result = await rewriter.rewrite_news(content)
+    
+    if not rewrite_result:
+        # 重写客户端只在重试后仍未成功或等待执行结果超时时返回None
+        raise HTTPException(status_code=503, detail="新闻重写失败")
+        
+    logger.info("新闻重写完成")
+    return rewrite_result['rewritten_content']
+
+async def rewrite_and_analyze(content: str, rewriter: NewsRewriter,
+                              fields: Optional[Tuple[str, ...]] = None) -> dict:
+    """
+    重写新闻内容并分析重写后的内容
+
+    Args:
+        content: 清理后的新闻内容
+        rewriter: 新闻重写客户端
+        fields: 只生成这些分析字段，为None时生成全部字段
+
+    Returns:
+        包含重写内容和分析结果的字典
+    """
+    rewritten_content = await rewrite_content(content, rewriter)
+    
+    # 使用重写后的内容调用Silicon Flow服务进行分析
+    logger.info("开始调用Silicon Flow服务分析重写后的内容...")
+    analysis_result = await analyze_with_silicon_flow(rewritten_content, fields)
+    return {'rewritten_content': rewritten_content, **analysis_result}
+
+async def process_news(content: str, rewriter: NewsRewriter,
+                       fields: Optional[Tuple[str, ...]] = None) -> NewsAnalysisResponse:
+    """
+    清理、重写并分析单篇新闻
+
+    Args:
+        content: 新闻原始内容
+        rewriter: 新闻重写客户端
+        fields: 只生成并返回这些分析字段，为None时返回全部字段
+
+    Returns:
+        新闻分析响应数据
+    """
+    original_content, key_content = prepare_content(content)
+    
+    # 重写并分析；相同的原文直接复用之前的结果。重写稿逐字对应原文，不按近似重复复用
+    # （两次调用时重写后内容的分析仍按近似重复复用）
+    degraded = False
+    if config['pipeline_mode'] == 'combined' and combined_rewrite_fits(original_content):
+        # 一次调用同时重写和分析
+        namespace = 'rewrite_analysis_combined'
+        compute = lambda: rewrite_and_analyze_combined(original_content, fields)
+    else:
+        namespace = 'rewrite_analysis'
+        compute = lambda: rewrite_and_analyze(original_content, rewriter, fields)
+    if fields is not None:
+        namespace = f"{namespace}:{','.join(fields)}"
+    try:
+        analysis_result = await cached_call(original_content, namespace, compute, near_duplicate=False,
+                                            key_content=key_content)
+    except CircuitOpenError as e:
+        if not config['coze_degrade_on_open']:
+            raise
+        # 降级结果不写入重写分析缓存，熔断恢复后重新重写
+        logger.warning(f"{e}，降级为直接分析原文")
+        degraded = True
+        analysis_result = {'rewritten_content': original_content,
+                           **await analyze_with_silicon_flow(original_content, fields, key_content)}
+    
+    # 构建响应数据
+    data = {
+        'title': analysis_result.get('title', ''),
+        'keywords': analysis_result.get('keywords', []),
+        'tags': analysis_result.get('tags', []),
+        'aiIntroduction': analysis_result.get('aiIntroduction', ''),
+        'categoryName': analysis_result.get('categoryName', ''),
+        'markdown': analysis_result.get('markdown', '')
+    }
+    if fields is not None:
+        data = {name: value for name, value in data.items() if name in fields}
+    return NewsAnalysisResponse(
+        original_content=original_content,
+        rewritten_content=analysis_result['rewritten_content'],
+        degraded=degraded,
+        **data
+    )
+
+@app.post("/analyze", response_model=APIResponse, response_model_exclude_unset=True,
          summary="重写并分析新闻内容",
-         description="先重写新闻内容，然后分析生成标题、关键词、标签、内容导读等信息")
-async def analyze_news(news: NewsContent):
+         description="先重写新闻内容，然后分析生成标题、关键词、标签、内容导读等信息；"
+                     "fields参数可只请求部分字段（如fields=categoryName,keywords），分析提示词和响应随之精简")
+async def analyze_news(news: NewsContent, rewriter: NewsRewriter = Depends(get_news_rewriter),
+                       fields: Optional[str] = Query(None, description="只返回指定的分析字段，逗号分隔，可选："
+                                                     "title、keywords、tags、categoryName、aiIntroduction、markdown")):
     try:
-        original_content = news.content
-        
-        # 检查内容是否需要清理HTML标签
-        if any(tag in original_content.lower() for tag in ['<html', '<head', '<body', '<article']):
-            logger.info("检测到HTML标签，进行内容清理...")
-            original_content = clean_html_content(original_content)
-            logger.info(f"内容清理完成，清理后长度: {len(original_content)}")
-        
-        # 重写新闻内容
-        logger.info("开始重写新闻内容...")
-        rewriter = NewsRewriter()
-        rewrite_result = rewriter.rewrite_news(original_content)
-        
-        if not rewrite_result:
-            raise Exception("新闻重写失败")
-            
-        rewritten_content = rewrite_result['rewritten_content']
-        logger.info("新闻重写完成")
-        
-        # 使用重写后的内容调用Silicon Flow服务进行分析
-        logger.info("开始调用Silicon Flow服务分析重写后的内容...")
-        analysis_result = analyze_with_silicon_flow(rewritten_content)
-        
-        # 构建响应数据
-        response_data = NewsAnalysisResponse(
-            original_content=original_content,
-            rewritten_content=rewritten_content,
-            title=analysis_result.get('title', ''),
-            keywords=analysis_result.get('keywords', []),
-            tags=analysis_result.get('tags', []),
-            aiIntroduction=analysis_result.get('aiIntroduction', ''),
-            categoryName=analysis_result.get('categoryName', ''),
-            markdown=analysis_result.get('markdown', '')
-        )
+        projection = parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        response_data = await process_news(news.content, rewriter, projection)
         
         return APIResponse(
             code=0,
@@ -98,6 +316,21 @@ async def analyze_news(news: NewsContent):
             data=response_data
         )
         
+    except DeadlineExceeded as e:
+        logger.error(f"处理请求超时: {str(e)}")
+        return APIResponse(
+            code=504,
+            msg=f"处理超时: {str(e)}",
+            data=None
+        )
+    except HTTPException as e:
+        # 内容超过输入token预算(413)等
+        logger.error(f"处理请求时出错: {e.detail}")
+        return APIResponse(
+            code=e.status_code,
+            msg=f"处理失败: {e.detail}",
+            data=None
+        )
     except Exception as e:
         logger.error(f"处理请求时出错: {str(e)}")
         return APIResponse(
@@ -106,6 +339,141 @@ async def analyze_news(news: NewsContent):
             data=None
         )
 
+@app.post("/analyze/stream", summary="流式重写并分析新闻内容",
+          description="以服务端事件(SSE)流式返回结果：先推送rewritten_content事件，随后每个分析字段"
+                      "（title、categoryName、keywords等）生成完毕即推送一条以字段名为事件名的事件，"
+                      "最后推送done事件（完整结果）；出错时推送error事件")
+async def analyze_news_stream(news: NewsContent, rewriter: NewsRewriter = Depends(get_news_rewriter)):
+    original_content, key_content = prepare_content(news.content)
+
+    async def events():
+        fields = {}
+        degraded = False
+        try:
+            try:
+                rewritten_content = await rewrite_content(original_content, rewriter)
+            except CircuitOpenError as e:
+                if not config['coze_degrade_on_open']:
+                    raise
+                logger.warning(f"{e}，降级为直接分析原文")
+                rewritten_content = original_content
+                degraded = True
+            yield format_sse('rewritten_content', rewritten_content)
+            async for name, value in stream_analysis(rewritten_content, key_content if degraded else None):
+                if name in STREAM_FIELDS:
+                    fields[name] = value
+                    yield format_sse(name, value)
+            yield format_sse('done', jsonable_encoder(NewsAnalysisResponse(
+                original_content=original_content,
+                rewritten_content=rewritten_content,
+                title=fields.get('title', ''),
+                keywords=fields.get('keywords', []),
+                tags=fields.get('tags', []),
+                aiIntroduction=fields.get('aiIntroduction', ''),
+                categoryName=fields.get('categoryName', ''),
+                markdown=fields.get('markdown', ''),
+                degraded=degraded
+            )))
+        except Exception as e:
+            detail = getattr(e, 'detail', None) or str(e)
+            logger.error(f"流式分析出错: {detail}")
+            yield format_sse('error', {'code': 500, 'msg': f"处理失败: {detail}"})
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.post("/analyze/bulk", summary="批量重写并分析新闻内容",
+          description="请求体为NDJSON，每行一个{\"id\": ..., \"content\": ...}对象；"
+                      "以有界并发完成清理、重写和分析，并按完成顺序流式返回NDJSON结果")
+async def analyze_news_bulk(request: Request,
+                            concurrency: int = Query(config['bulk_concurrency'], ge=1,
+                                                     le=config['bulk_max_concurrency'],
+                                                     description="最大并发数"),
+                            rewriter: NewsRewriter = Depends(get_news_rewriter)):
+    async def handle(record: dict) -> dict:
+        response_data = await process_news(record['content'], rewriter)
+        return jsonable_encoder(response_data)
+
+    lines = iter_ndjson_lines(request.stream(), config['bulk_max_line_bytes'])
+    return NDJSONStreamingResponse(process_ndjson(lines, handle, concurrency))
+
+def to_job_info(job: dict) -> JobInfo:
+    """把任务存储中的记录转换为响应模型"""
+    return JobInfo(
+        id=job['id'],
+        status=job['status'],
+        attempts=job['attempts'],
+        created_at=job['created_at'],
+        updated_at=job['updated_at'],
+        result=job['result'],
+        error=job['error']
+    )
+
+@app.post("/jobs", response_model=JobResponse, summary="提交异步重写分析任务",
+          description="立即返回任务ID，由后台worker池完成清理、重写和分析；任务持久化保存，服务重启后继续执行")
+async def submit_job(news: NewsContent, job_queue: JobQueue = Depends(get_job_queue)):
+    job = await job_queue.submit({'content': news.content})
+    logger.info(f"已提交任务 {job['id']}")
+    return JobResponse(data=to_job_info(job))
+
+@app.get("/jobs/{job_id}", response_model=JobResponse, summary="查询异步任务",
+         description="返回任务状态和结果；指定wait时长轮询，任务完成或等待超时后返回")
+async def get_job(job_id: str,
+                  wait: float = Query(0, ge=0, le=config['job_max_wait'], description="最长等待秒数"),
+                  job_queue: JobQueue = Depends(get_job_queue)):
+    job = await job_queue.get(job_id, wait)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"任务不存在: {job_id}")
+    return JobResponse(data=to_job_info(job))
+
+@app.get("/admin/stats", summary="运行统计", description="查看分析结果缓存、近似重复检测、并发请求合并、对冲请求、模型级联、并发子提示词、JSON容错修复、模板内容去除、token预估、输入预算、上游限流、Coze异步执行和任务队列的统计计数")
+async def admin_stats(request: Request):
+    return {
+        "code": 0,
+        "msg": "success",
+        "data": {
+            "cache": analysis_cache.stats() if analysis_cache is not None else None,
+            "near_duplicate": near_duplicate_index.stats() if near_duplicate_index is not None else None,
+            "single_flight": {
+                "analysis": analysis_flight.stats(),
+                "rewrite": request.app.state.news_rewriter.flight.stats()
+            },
+            "hedging": {
+                "silicon_flow": silicon_flow_hedger.stats() if silicon_flow_hedger is not None else None
+            },
+            "cascade": cascade_stats.stats() if cascade_stats is not None else None,
+            "json_repair": dict(json_repair_stats),
+            "fanout": dict(fanout_stats),
+            "boilerplate": boilerplate_remover.stats() if boilerplate_remover is not None else None,
+            "tokens": {"estimator": token_estimator.stats(), "input_budget": dict(input_budget_stats)},
+            "rate_limit": {
+                "silicon_flow": silicon_flow_limiter.stats() if silicon_flow_limiter is not None else None,
+                "coze": (request.app.state.news_rewriter.rate_limiter.stats()
+                         if request.app.state.news_rewriter.rate_limiter is not None else None)
+            },
+            "rewrite": request.app.state.news_rewriter.stats(),
+            "jobs": await request.app.state.job_queue.stats()
+        }
+    }
+
+@app.get("/status/upstreams", summary="上游状态", description="查看各上游服务熔断器的状态（closed/open/half_open）、最近调用的失败率和各模型后端的路由统计")
+async def upstream_status(request: Request):
+    breaker = request.app.state.news_rewriter.circuit_breaker
+    return {
+        "code": 0,
+        "msg": "success",
+        "data": {
+            "silicon_flow": silicon_flow_breaker.status() if silicon_flow_breaker is not None else None,
+            "coze": breaker.status() if breaker is not None else None,
+            "backends": silicon_flow_router.status()
+        }
+    }
+
+@app.delete("/admin/cache", summary="清空分析结果缓存", description="清空内存层和SQLite层中的全部分析结果缓存")
+async def purge_cache():
+    purged = await analysis_cache.purge() if analysis_cache is not None else 0
+    return {"code": 0, "msg": "success", "data": {"purged": purged}}
+
 @app.get("/")
 def read_root():
     """API根路由"""
@@ -0,0 +1,135 @@
+"""
+本地模拟Coze工作流服务 - 同步执行、流式执行、异步提交和执行记录查询
+
+工作流把输入变量中的新闻内容加上"（重写）"前缀作为news字段返回，执行耗时为run_seconds秒，
+设置chars_per_second时再加上按输出（JSON）字数计算的生成耗时（模拟工作流中的大模型节点）。
+可模拟慢执行和失败的执行：
+  - 请求parameters中的mock_seconds覆盖本次执行的耗时，mock_fail为true时本次执行失败
+  - fail_first: 前N次执行失败；fail_rate: 其余执行按该比例随机失败
+异步执行提交后立即返回execute_id，执行记录在耗时到达前为Running，之后为Success或Fail。
+可通过httpx.ASGITransport在进程内使用（测试），也可单独启动用于本地联调（base_url设为http://127.0.0.1:8020）：
+    python mock_coze.py --port 8020 --run-seconds 5 --fail-rate 0.1
+"""
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+from typing import Any, Dict, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+# 模拟的工作流执行失败错误码
+FAILED_CODE = 720701013
+
+
+def create_app(run_seconds: float = 1.0, fail_first: int = 0, fail_rate: float = 0.0, input_parameter: str = 'input',
+               chars_per_second: float = 0.0, seed: Optional[int] = None) -> FastAPI:
+    """
+    创建模拟Coze应用
+
+    Args:
+        run_seconds: 每次执行的默认耗时（秒）
+        fail_first: 前N次执行失败
+        fail_rate: 其余执行随机失败的比例
+        input_parameter: 新闻内容对应的输入变量名
+        chars_per_second: 输出速度（字/秒），为0时执行耗时与输出长度无关
+        seed: 随机种子
+
+    Returns:
+        FastAPI应用，app.state.runs为各次执行记录，app.state.counters为各接口的调用次数
+    """
+    app = FastAPI(title="模拟Coze工作流")
+    app.state.runs = {}
+    app.state.counters = {'run': 0, 'stream_run': 0, 'async': 0, 'polls': 0}
+    rng = random.Random(seed)
+
+    def start_run(body: Dict[str, Any]) -> Dict[str, Any]:
+        """登记一次执行，确定耗时和是否失败"""
+        parameters = body.get('parameters') or {}
+        index = len(app.state.runs)
+        failed = bool(parameters.get('mock_fail')) or index < fail_first or rng.random() < fail_rate
+        news = f"（重写）{parameters.get(input_parameter, '')}"
+        output = json.dumps({'news': news}, ensure_ascii=False)
+        seconds = float(parameters.get('mock_seconds', run_seconds))
+        if chars_per_second:
+            seconds += len(output) / chars_per_second
+        run = {
+            'execute_id': uuid.uuid4().hex,
+            'started': time.monotonic(),
+            'seconds': seconds,
+            'failed': failed,
+            'output': output,
+            'usage': {'input_count': len(news), 'output_count': len(news), 'token_count': 2 * len(news)}
+        }
+        app.state.runs[run['execute_id']] = run
+        return run
+
+    def debug_url(run: Dict[str, Any]) -> str:
+        return f"https://www.coze.cn/work_flow?execute_id={run['execute_id']}"
+
+    @app.post("/v1/workflow/run")
+    async def workflow_run(request: Request):
+        body = await request.json()
+        run = start_run(body)
+        if body.get('is_async'):
+            app.state.counters['async'] += 1
+            return {'code': 0, 'msg': '', 'execute_id': run['execute_id'], 'debug_url': debug_url(run)}
+        app.state.counters['run'] += 1
+        await asyncio.sleep(run['seconds'])
+        if run['failed']:
+            return {'code': FAILED_CODE, 'msg': '工作流执行失败（模拟）', 'debug_url': debug_url(run)}
+        return {'code': 0, 'msg': '', 'data': run['output'], 'usage': run['usage'], 'debug_url': debug_url(run)}
+
+    @app.post("/v1/workflow/stream_run")
+    async def workflow_stream_run(request: Request):
+        run = start_run(await request.json())
+        app.state.counters['stream_run'] += 1
+
+        async def events():
+            await asyncio.sleep(run['seconds'])
+            if run['failed']:
+                data = {'error_code': FAILED_CODE, 'error_message': '工作流执行失败（模拟）'}
+                yield f"id: 0\nevent: Error\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+                return
+            data = {'node_title': 'End', 'content': run['output'], 'node_is_finish': True, 'usage': run['usage']}
+            yield f"id: 0\nevent: Message\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+            yield f"id: 1\nevent: Done\ndata: {json.dumps({'debug_url': debug_url(run)})}\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.get("/v1/workflows/{workflow_id}/run_histories/{execute_id}")
+    async def run_histories(workflow_id: str, execute_id: str):
+        app.state.counters['polls'] += 1
+        run = app.state.runs.get(execute_id)
+        if run is None:
+            return {'code': 4000, 'msg': f'execute_id不存在: {execute_id}', 'data': []}
+        history = {'execute_id': execute_id, 'execute_status': 'Running', 'output': '', 'error_code': '0',
+                   'error_message': '', 'usage': {}, 'debug_url': debug_url(run)}
+        if time.monotonic() - run['started'] >= run['seconds']:
+            if run['failed']:
+                history.update(execute_status='Fail', error_code=str(FAILED_CODE), error_message='工作流执行失败（模拟）')
+            else:
+                history.update(execute_status='Success', usage=run['usage'],
+                               output=json.dumps({'Output': run['output']}, ensure_ascii=False))
+        return {'code': 0, 'msg': '', 'data': [history]}
+
+    return app
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="模拟Coze工作流服务")
+    parser.add_argument('--port', type=int, default=8020, help="监听端口")
+    parser.add_argument('--run-seconds', type=float, default=1.0, help="每次执行的耗时（秒）")
+    parser.add_argument('--fail-first', type=int, default=0, help="前N次执行失败")
+    parser.add_argument('--fail-rate', type=float, default=0.0, help="随机失败的比例")
+    parser.add_argument('--input-parameter', default='input', help="新闻内容对应的输入变量名")
+    parser.add_argument('--chars-per-second', type=float, default=0.0, help="输出速度（字/秒），为0时不按字数计算耗时")
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.run_seconds, args.fail_first, args.fail_rate, args.input_parameter,
+                           args.chars_per_second),
+                host="0.0.0.0", port=args.port)
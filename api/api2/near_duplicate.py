@@ -0,0 +1,302 @@
+"""
+近似重复文章检测模块 - 基于字符shingle的SimHash + 分块索引
+
+通稿转载常常只改动电头、全角空格或结尾的◇等少量字符，精确哈希缓存无法命中。
+本模块对规范化后的正文计算64位SimHash指纹（按字符n-gram切片，适合中文），
+并按鸽巢原理把指纹切成 max_distance + 1 个块分别建立倒排表：
+汉明距离不超过max_distance的两个指纹至少有一个块完全相同，
+因此查询只需检查若干个桶内的候选指纹，在数百万篇文章规模下仍可在亚毫秒内完成。
+
+内存中每个块的桶使用array('Q')紧凑存储指纹；指纹到缓存键的映射保存在SQLite中，
+只有命中时才需要查询，进程重启后从SQLite重新加载索引。
+多个worker共享同一个SQLite数据库，各自在内存中保存一份索引；查询未命中时增量加载其他worker新登记的指纹后再查一次。
+"""
+import re
+import time
+import sqlite3
+import asyncio
+import hashlib
+import logging
+import threading
+import unicodedata
+from array import array
+from typing import Any, Dict, List, Optional, Tuple
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+FINGERPRINT_BITS = 64
+
+# 去除空白、标点和符号，只保留文字和数字参与指纹计算
+_NON_WORD_RE = re.compile(r'[\W_]+')
+
+# 每个比特位对应一张translate表：字节该位为1时映射为1，否则为0，用于在C层面统计各位出现次数
+_BIT_TABLES = [bytes((value >> bit) & 1 for value in range(256)) for bit in range(8)]
+
+
+def _normalize(text: str) -> str:
+    """统一全角/半角字符，去除空白、标点和符号"""
+    return _NON_WORD_RE.sub('', unicodedata.normalize('NFKC', text))
+
+
+def simhash(text: str, shingle_size: int = 4) -> int:
+    """
+    计算文本的64位SimHash指纹
+
+    Args:
+        text: 清理后的新闻内容
+        shingle_size: 字符n-gram长度
+
+    Returns:
+        64位无符号整数指纹
+    """
+    return _simhash(_normalize(text), shingle_size)
+
+
+def _simhash(text: str, shingle_size: int) -> int:
+    """计算规范化后文本的SimHash指纹"""
+    if len(text) <= shingle_size:
+        shingles = {text}
+    else:
+        shingles = {text[i:i + shingle_size] for i in range(len(text) - shingle_size + 1)}
+
+    data = b''.join(hashlib.blake2b(s.encode('utf-8'), digest_size=8).digest() for s in shingles)
+    half = len(shingles) / 2
+    fingerprint = 0
+    # 按字节列切片后逐位统计，避免在Python层面对每个shingle的64个比特做循环
+    for byte_index in range(8):
+        column = data[byte_index::8]
+        for bit in range(8):
+            if column.translate(_BIT_TABLES[bit]).count(1) > half:
+                fingerprint |= 1 << (byte_index * 8 + bit)
+    return fingerprint
+
+
+def _to_signed(value: int) -> int:
+    """SQLite INTEGER为有符号64位整数"""
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def _to_unsigned(value: int) -> int:
+    return value + (1 << 64) if value < 0 else value
+
+
+class NearDuplicateIndex:
+    """SimHash近似重复索引"""
+
+    def __init__(self, db_path: Optional[str], max_distance: int = 4, shingle_size: int = 4):
+        """
+        初始化索引
+
+        Args:
+            db_path: SQLite数据库路径，为None时只保存在内存中
+            max_distance: 判定为近似重复的最大汉明距离（0-63），越大越宽松、查询越慢
+            shingle_size: 字符n-gram长度
+        """
+        if not 0 <= max_distance < FINGERPRINT_BITS:
+            raise ValueError(f"max_distance必须在0到{FINGERPRINT_BITS - 1}之间")
+        self.db_path = db_path
+        self.max_distance = max_distance
+        self.shingle_size = shingle_size
+
+        # 将64位切成max_distance + 1个尽量等宽的块
+        blocks = max_distance + 1
+        self._blocks: List[Tuple[int, int]] = []
+        start = 0
+        for i in range(blocks):
+            width = FINGERPRINT_BITS // blocks + (1 if i < FINGERPRINT_BITS % blocks else 0)
+            self._blocks.append((start, (1 << width) - 1))
+            start += width
+
+        # scope -> 每个块一个 {块值: 指纹数组}
+        self._tables: Dict[str, List[Dict[int, array]]] = {}
+        self._keys: Dict[Tuple[str, int], str] = {}
+        self._size = 0
+        self._loaded = False
+        # 已加载到内存的SQLite最大rowid，查询未命中时从此处增量加载
+        self._last_rowid = 0
+        self._load_lock = asyncio.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._counters = {
+            'lookups': 0,
+            'hits': 0,
+            'reloads': 0,
+            'lookup_time_us': 0.0
+        }
+
+    def fingerprint(self, text: str) -> Optional[int]:
+        """计算文本指纹，去除空白和标点后为空时返回None（这类文本的指纹全部相同，不参与近似重复检测）"""
+        text = _normalize(text)
+        return _simhash(text, self.shingle_size) if text else None
+
+    def _connect(self) -> sqlite3.Connection:
+        """按需打开SQLite连接（调用方需持有_db_lock）"""
+        if self._conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS near_duplicate ('
+                'scope TEXT NOT NULL, fingerprint INTEGER NOT NULL, key TEXT NOT NULL, '
+                'PRIMARY KEY (scope, fingerprint))'
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _insert_memory(self, scope: str, fingerprint: int) -> None:
+        tables = self._tables.get(scope)
+        if tables is None:
+            tables = self._tables[scope] = [{} for _ in self._blocks]
+        shift, mask = self._blocks[0]
+        existing = tables[0].get((fingerprint >> shift) & mask)
+        if existing is not None and fingerprint in existing:
+            return
+        for table, (shift, mask) in zip(tables, self._blocks):
+            bucket = table.get((fingerprint >> shift) & mask)
+            if bucket is None:
+                table[(fingerprint >> shift) & mask] = array('Q', (fingerprint,))
+            else:
+                bucket.append(fingerprint)
+        self._size += 1
+
+    def _load_rows(self, after_rowid: int) -> List[Tuple[int, str, int]]:
+        with self._db_lock:
+            return self._connect().execute(
+                'SELECT rowid, scope, fingerprint FROM near_duplicate WHERE rowid > ? ORDER BY rowid',
+                (after_rowid,)
+            ).fetchall()
+
+    async def _load_new_rows(self) -> int:
+        """加载上次之后新增的指纹（含其他worker登记的），返回加载的条数"""
+        rows = await asyncio.to_thread(self._load_rows, self._last_rowid)
+        for rowid, scope, fingerprint in rows:
+            self._insert_memory(scope, _to_unsigned(fingerprint))
+            self._last_rowid = max(self._last_rowid, rowid)
+        return len(rows)
+
+    async def _ensure_loaded(self) -> None:
+        """首次使用时从SQLite加载索引"""
+        if self._loaded:
+            return
+        async with self._load_lock:
+            if self._loaded:
+                return
+            if self.db_path:
+                started = time.perf_counter()
+                count = await self._load_new_rows()
+                logger.info(f"近似重复索引加载完成: {count} 条, 耗时 {time.perf_counter() - started:.2f}秒")
+            self._loaded = True
+
+    def _nearest(self, scope: str, fingerprint: int) -> Optional[Tuple[int, int]]:
+        """在内存索引中查找汉明距离最近且不超过阈值的指纹"""
+        tables = self._tables.get(scope)
+        if tables is None:
+            return None
+        best: Optional[Tuple[int, int]] = None
+        for table, (shift, mask) in zip(tables, self._blocks):
+            bucket = table.get((fingerprint >> shift) & mask)
+            if bucket is None:
+                continue
+            for candidate in bucket:
+                distance = (candidate ^ fingerprint).bit_count()
+                if distance <= self.max_distance and (best is None or distance < best[1]):
+                    best = (candidate, distance)
+                    if distance == 0:
+                        return best
+        return best
+
+    def _lookup_key(self, scope: str, fingerprint: int) -> Optional[str]:
+        with self._db_lock:
+            row = self._connect().execute(
+                'SELECT key FROM near_duplicate WHERE scope = ? AND fingerprint = ?',
+                (scope, _to_signed(fingerprint))
+            ).fetchone()
+        return row[0] if row else None
+
+    def _store_key(self, scope: str, fingerprint: int, key: str) -> None:
+        with self._db_lock:
+            conn = self._connect()
+            conn.execute(
+                'INSERT OR REPLACE INTO near_duplicate (scope, fingerprint, key) VALUES (?, ?, ?)',
+                (scope, _to_signed(fingerprint), key)
+            )
+            conn.commit()
+
+    async def find(self, scope: str, fingerprint: int) -> Optional[Tuple[str, float]]:
+        """
+        查找近似重复文章
+
+        Args:
+            scope: 命名空间（如模型和提示词版本），不同命名空间互不匹配
+            fingerprint: 待查询文章的指纹
+
+        Returns:
+            (已缓存分析结果的缓存键, 相似度)，没有近似重复时返回None
+        """
+        await self._ensure_loaded()
+        started = time.perf_counter()
+        nearest = self._nearest(scope, fingerprint)
+        self._counters['lookups'] += 1
+        self._counters['lookup_time_us'] += (time.perf_counter() - started) * 1e6
+        if nearest is None and self.db_path:
+            # 未命中时加载其他worker新登记的指纹（按rowid增量查询）后再查一次
+            try:
+                if await self._load_new_rows():
+                    self._counters['reloads'] += 1
+                    nearest = self._nearest(scope, fingerprint)
+            except sqlite3.Error as e:
+                logger.warning(f"读取近似重复索引失败: {e}")
+        if nearest is None:
+            return None
+
+        candidate, distance = nearest
+        if self.db_path:
+            key = await asyncio.to_thread(self._lookup_key, scope, candidate)
+        else:
+            key = self._keys.get((scope, candidate))
+        if key is None:
+            return None
+        self._counters['hits'] += 1
+        return key, 1 - distance / FINGERPRINT_BITS
+
+    async def add(self, scope: str, fingerprint: int, key: str) -> None:
+        """
+        把已分析文章的指纹加入索引
+
+        Args:
+            scope: 命名空间
+            fingerprint: 文章指纹
+            key: 对应分析结果的缓存键
+        """
+        await self._ensure_loaded()
+        if self.db_path:
+            try:
+                await asyncio.to_thread(self._store_key, scope, fingerprint, key)
+            except sqlite3.Error as e:
+                logger.warning(f"写入近似重复索引失败: {e}")
+                return
+        else:
+            self._keys[(scope, fingerprint)] = key
+        self._insert_memory(scope, fingerprint)
+
+    def stats(self) -> Dict[str, Any]:
+        """返回索引规模、查询次数、命中次数和平均查询耗时"""
+        lookups = self._counters['lookups']
+        return {
+            'size': self._size,
+            'lookups': lookups,
+            'hits': self._counters['hits'],
+            'reloads': self._counters['reloads'],
+            'avg_lookup_us': round(self._counters['lookup_time_us'] / lookups, 2) if lookups else 0.0,
+            'max_distance': self.max_distance
+        }
+
+    def close(self) -> None:
+        """关闭SQLite连接"""
+        with self._db_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,137 @@
+"""
+增量JSON字段解析模块
+
+大模型以流式方式逐段输出一个JSON对象，本模块在文本到达时增量扫描，
+每当顶层对象中的某个字段值完整出现时立即将其解析出来，而无需等待整个对象结束。
+对象之前的说明文字或```json代码块标记会被跳过。
+"""
+import json
+from typing import Any, List, Tuple
+
+_WHITESPACE = ' \t\r\n'
+
+
+class IncrementalJSONFields:
+    """增量提取顶层JSON对象中已完整的字段"""
+
+    def __init__(self):
+        self._buf = ''
+        self._pos = 0
+        self._state = 'seek_object'
+        self._key_start = 0
+        self._key = None
+        self._value_start = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self.finished = False
+
+    def feed(self, text: str) -> List[Tuple[str, Any]]:
+        """
+        输入新到达的文本
+
+        Args:
+            text: 模型新输出的文本片段
+
+        Returns:
+            本次新完成的 (字段名, 字段值) 列表
+        """
+        if self.finished:
+            return []
+        self._buf += text
+        fields = []
+        buf = self._buf
+        pos = self._pos
+        length = len(buf)
+
+        while pos < length:
+            char = buf[pos]
+            state = self._state
+
+            if state == 'seek_object':
+                if char == '{':
+                    self._state = 'seek_key'
+            elif state == 'seek_key':
+                if char == '"':
+                    self._key_start = pos
+                    self._escape = False
+                    self._state = 'in_key'
+                elif char == '}':
+                    self.finished = True
+                    pos += 1
+                    break
+            elif state == 'in_key':
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._key = json.loads(buf[self._key_start:pos + 1])
+                    self._state = 'seek_colon'
+            elif state == 'seek_colon':
+                if char == ':':
+                    self._state = 'seek_value'
+            elif state == 'seek_value':
+                if char not in _WHITESPACE:
+                    self._value_start = pos
+                    self._escape = False
+                    self._in_string = False
+                    if char == '"':
+                        self._state = 'in_string_value'
+                    elif char in '{[':
+                        self._depth = 1
+                        self._state = 'in_nested_value'
+                    else:
+                        self._state = 'in_scalar_value'
+            elif state == 'in_string_value':
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    fields.append(self._complete(buf[self._value_start:pos + 1]))
+            elif state == 'in_nested_value':
+                if self._in_string:
+                    if self._escape:
+                        self._escape = False
+                    elif char == '\\':
+                        self._escape = True
+                    elif char == '"':
+                        self._in_string = False
+                elif char == '"':
+                    self._in_string = True
+                elif char in '{[':
+                    self._depth += 1
+                elif char in '}]':
+                    self._depth -= 1
+                    if self._depth == 0:
+                        fields.append(self._complete(buf[self._value_start:pos + 1]))
+            elif state == 'in_scalar_value':
+                if char in ',}' or char in _WHITESPACE:
+                    fields.append(self._complete(buf[self._value_start:pos].strip()))
+                    if char == '}':
+                        self.finished = True
+                        pos += 1
+                        break
+            pos += 1
+
+        # 丢弃已处理完的文本，只保留当前未完成的字段值
+        keep_from = pos
+        if self._state in ('in_key',):
+            keep_from = self._key_start
+        elif self._state in ('in_string_value', 'in_nested_value', 'in_scalar_value'):
+            keep_from = self._value_start
+        self._buf = buf[keep_from:]
+        self._key_start -= keep_from
+        self._value_start -= keep_from
+        self._pos = pos - keep_from
+        return [field for field in fields if field is not None]
+
+    def _complete(self, raw: str):
+        """解析一个完整的字段值并回到查找下一个键的状态"""
+        self._state = 'seek_key'
+        try:
+            # strict=False 允许字符串中出现未转义的换行等控制字符
+            return self._key, json.loads(raw, strict=False)
+        except json.JSONDecodeError:
+            return None
@@ -0,0 +1,170 @@
+"""
+自适应上游限流模块 - 请求数/token数双令牌桶 + Retry-After + AIMD
+
+上游（硅基流动、Coze）按每分钟请求数(RPM)和每分钟token数(TPM)限流，超出时返回429。
+每次调用前按预估token数同时从两个令牌桶中预留额度，额度不足时排队等待，而不是把请求打到上游再失败；
+收到429时按Retry-After暂停发送，并将速率乘性下降，之后每秒加性恢复(AIMD)，
+使实际发送速率稳定在配额上限附近。
+
+限流状态保存在进程内，多个worker进程部署时应按worker数拆分配额。
+"""
+import time
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """令牌桶，允许余额为负以按到达顺序预留未来的额度"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def reserve(self, amount: float, rate_scale: float, now: float) -> float:
+        """
+        预留额度
+
+        Args:
+            amount: 需要的令牌数（超过桶容量时按容量计算）
+            rate_scale: 当前速率系数（AIMD调整）
+            now: 当前单调时钟时间
+
+        Returns:
+            需要等待的秒数
+        """
+        rate = self.rate * rate_scale
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * rate)
+        self._updated = now
+        self._tokens -= min(amount, self.capacity)
+        return -self._tokens / rate if self._tokens < 0 else 0.0
+
+    def refund(self, amount: float) -> None:
+        """归还未使用的额度（也可为负，用于按实际用量修正预估）"""
+        self._tokens = min(self.capacity, self._tokens + min(amount, self.capacity))
+
+    def drain(self) -> None:
+        """清空额度，收到429说明上游认为当前窗口的配额已用尽"""
+        self._tokens = min(self._tokens, 0.0)
+
+
+class AdaptiveRateLimiter:
+    """按RPM和TPM双令牌桶限流，并根据429自适应调整速率"""
+
+    def __init__(self, name: str, requests_per_minute: float, tokens_per_minute: float = 0,
+                 min_rate_scale: float = 0.1, decrease_factor: float = 0.5, increase_step: float = 0.05):
+        """
+        初始化限流器
+
+        Args:
+            name: 上游名称，用于日志和统计
+            requests_per_minute: 每分钟请求数上限，0表示不限制
+            tokens_per_minute: 每分钟token数上限，0表示不限制
+            min_rate_scale: 速率系数下限
+            decrease_factor: 收到429时速率系数的乘性下降比例
+            increase_step: 未收到429时速率系数每秒的加性恢复量
+        """
+        self.name = name
+        self._requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self._tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.min_rate_scale = min_rate_scale
+        self.decrease_factor = decrease_factor
+        self.increase_step = increase_step
+        self.rate_scale = 1.0
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._last_increase = time.monotonic()
+        self._counters = {
+            'acquired': 0,
+            'delayed': 0,
+            'wait_time': 0.0,
+            'rate_limited': 0
+        }
+
+    async def acquire(self, tokens: int = 0) -> None:
+        """
+        在发送请求前预留额度，额度不足或处于Retry-After暂停期时等待
+
+        Args:
+            tokens: 本次请求的预估token数（输入 + 输出）
+        """
+        now = time.monotonic()
+        wait = 0.0
+        if self._requests is not None:
+            wait = self._requests.reserve(1, self.rate_scale, now)
+        if self._tokens is not None:
+            wait = max(wait, self._tokens.reserve(tokens, self.rate_scale, now))
+        wait = max(wait, self._paused_until - now)
+        self._counters['acquired'] += 1
+        if wait <= 0:
+            return
+        self._counters['delayed'] += 1
+        self._counters['wait_time'] += wait
+        try:
+            await asyncio.sleep(wait)
+        except asyncio.CancelledError:
+            if self._requests is not None:
+                self._requests.refund(1)
+            if self._tokens is not None:
+                self._tokens.refund(tokens)
+            raise
+
+    def settle(self, estimated: int, actual: int) -> None:
+        """按上游返回的实际token用量修正预估"""
+        if self._tokens is not None and actual:
+            self._tokens.refund(estimated - actual)
+
+    def on_success(self) -> None:
+        """请求成功：每秒最多加性恢复一次速率"""
+        now = time.monotonic()
+        if self.rate_scale < 1.0 and now - self._last_increase >= 1.0:
+            self.rate_scale = min(1.0, self.rate_scale + self.increase_step)
+            self._last_increase = now
+
+    def on_rate_limited(self, retry_after: Optional[float] = None) -> float:
+        """
+        收到429：暂停发送并乘性降低速率
+
+        Args:
+            retry_after: 上游给出的Retry-After秒数
+
+        Returns:
+            距离可以再次发送的秒数
+        """
+        now = time.monotonic()
+        self._counters['rate_limited'] += 1
+        if self._requests is not None:
+            self._requests.drain()
+        if self._tokens is not None:
+            self._tokens.drain()
+        # 同一批并发请求同时收到429时只降速一次
+        if now - self._last_decrease >= 1.0:
+            self.rate_scale = max(self.min_rate_scale, self.rate_scale * self.decrease_factor)
+            self._last_decrease = now
+            self._last_increase = now
+            logger.warning(f"{self.name} 触发上游限流，速率降至配额的 {self.rate_scale:.0%}")
+        if retry_after is not None:
+            self._paused_until = max(self._paused_until, now + retry_after)
+        if self._requests is None:
+            return max(self._paused_until - now, 0.0)
+        # 额度已清空，至少要等到请求数令牌桶恢复出一个令牌
+        return max(self._paused_until - now, 1 / (self._requests.rate * self.rate_scale))
+
+    def stats(self) -> Dict[str, Any]:
+        """返回当前速率系数和排队、限流计数"""
+        return {
+            'rate_scale': round(self.rate_scale, 3),
+            'requests_per_minute': self._requests.capacity if self._requests is not None else None,
+            'tokens_per_minute': self._tokens.capacity if self._tokens is not None else None,
+            'acquired': self._counters['acquired'],
+            'delayed': self._counters['delayed'],
+            'avg_wait': round(self._counters['wait_time'] / self._counters['delayed'], 3)
+            if self._counters['delayed'] else 0.0,
+            'rate_limited': self._counters['rate_limited']
+        }
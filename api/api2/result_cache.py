@@ -0,0 +1,293 @@
+"""
+分析结果缓存模块 - 内存LRU层 + SQLite(WAL)持久层
+
+缓存键由规范化后的新闻内容、模型名称和提示词模板版本共同哈希得到，
+相同文章重复提交时直接复用上次的分析结果，避免重复调用大模型。
+SQLite层开启WAL模式，同一主机上的多个uvicorn worker可以共享并在重启后保留。
+清空缓存时SQLite中的清空代数加一，各worker查询时（最多每generation_check_interval秒一次）发现代数变化即清空自己的内存层，
+其他worker在清空后最多继续命中该间隔内的旧条目。
+SQLite层查询时只过滤过期条目，每写入cleanup_interval条时顺带删除已过期的行，避免数据库无限增长。
+"""
+import re
+import json
+import time
+import sqlite3
+import asyncio
+import hashlib
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def normalize_content(content: str) -> str:
+    """
+    规范化新闻内容：统一全角/半角字符并合并空白
+
+    Args:
+        content: 清理后的新闻内容
+
+    Returns:
+        规范化后的内容
+    """
+    content = unicodedata.normalize('NFKC', content)
+    return _WHITESPACE_RE.sub(' ', content).strip()
+
+
+def make_cache_key(content: str, model: str, prompt_version: str) -> str:
+    """
+    计算缓存键
+
+    Args:
+        content: 清理后的新闻内容
+        model: 模型名称
+        prompt_version: 提示词模板版本
+
+    Returns:
+        十六进制SHA-256摘要
+    """
+    digest = hashlib.sha256()
+    for part in (model, prompt_version, normalize_content(content)):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\x00')
+    return digest.hexdigest()
+
+
+class AnalysisCache:
+    """两级分析结果缓存：进程内LRU（带TTL） + SQLite持久层"""
+
+    def __init__(self, db_path: Optional[str], max_entries: int = 1024, ttl: float = 86400,
+                 generation_check_interval: float = 1.0, cleanup_interval: int = 256):
+        """
+        初始化缓存
+
+        Args:
+            db_path: SQLite数据库路径，为None时只使用内存层
+            max_entries: 内存层最大条目数
+            ttl: 缓存有效期（秒）
+            generation_check_interval: 检查其他worker是否清空了缓存的最短间隔（秒）
+            cleanup_interval: 每写入多少条SQLite层条目删除一次过期行，为0时不删除
+        """
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.generation_check_interval = generation_check_interval
+        self.cleanup_interval = cleanup_interval
+        # 上次删除过期行之后写入SQLite层的条目数
+        self._writes_since_cleanup = 0
+        # 最近一次读到的清空代数及读取时间
+        self._generation: Optional[int] = None
+        self._generation_checked = 0.0
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._counters = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'expirations': 0,
+            'writes': 0,
+            'remote_purges': 0,
+            'disk_expired_deleted': 0
+        }
+
+    def _connect(self) -> sqlite3.Connection:
+        """按需打开SQLite连接（调用方需持有_db_lock）"""
+        if self._conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS analysis_cache ('
+                'key TEXT PRIMARY KEY, value TEXT NOT NULL, '
+                'created_at REAL NOT NULL, expires_at REAL NOT NULL)'
+            )
+            conn.execute('CREATE TABLE IF NOT EXISTS cache_meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+            conn.execute("INSERT OR IGNORE INTO cache_meta (name, value) VALUES ('generation', 0)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _memory_get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._memory.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.time():
+            del self._memory[key]
+            self._counters['expirations'] += 1
+            return None
+        self._memory.move_to_end(key)
+        return value
+
+    def _memory_set(self, key: str, value: Dict[str, Any], expires_at: float) -> None:
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._counters['evictions'] += 1
+
+    def _disk_get(self, key: str) -> Optional[tuple]:
+        with self._db_lock:
+            row = self._connect().execute(
+                'SELECT value, expires_at FROM analysis_cache WHERE key = ? AND expires_at > ?',
+                (key, time.time())
+            ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def _disk_set(self, key: str, value: Dict[str, Any], expires_at: float) -> None:
+        with self._db_lock:
+            conn = self._connect()
+            conn.execute(
+                'INSERT OR REPLACE INTO analysis_cache (key, value, created_at, expires_at) VALUES (?, ?, ?, ?)',
+                (key, json.dumps(value, ensure_ascii=False), time.time(), expires_at)
+            )
+            conn.commit()
+
+    def _disk_delete_expired(self) -> int:
+        with self._db_lock:
+            conn = self._connect()
+            deleted = conn.execute('DELETE FROM analysis_cache WHERE expires_at <= ?', (time.time(),)).rowcount
+            conn.commit()
+        return deleted
+
+    def _disk_generation(self) -> int:
+        with self._db_lock:
+            row = self._connect().execute("SELECT value FROM cache_meta WHERE name = 'generation'").fetchone()
+        return row[0] if row is not None else 0
+
+    def _disk_purge(self) -> tuple:
+        with self._db_lock:
+            conn = self._connect()
+            deleted = conn.execute('DELETE FROM analysis_cache').rowcount
+            conn.execute("UPDATE cache_meta SET value = value + 1 WHERE name = 'generation'")
+            generation = conn.execute("SELECT value FROM cache_meta WHERE name = 'generation'").fetchone()[0]
+            conn.commit()
+        return deleted, generation
+
+    async def _sync_generation(self) -> None:
+        """清空代数变化（其他worker清空了缓存）时清空内存层，最多每generation_check_interval秒查询一次"""
+        now = time.monotonic()
+        if not self.db_path or now - self._generation_checked < self.generation_check_interval:
+            return
+        self._generation_checked = now
+        try:
+            generation = await asyncio.to_thread(self._disk_generation)
+        except sqlite3.Error as e:
+            logger.warning(f"读取缓存数据库失败: {e}")
+            return
+        if self._generation is not None and generation != self._generation and self._memory:
+            logger.info(f"缓存已被其他进程清空，清除内存层 {len(self._memory)} 条")
+            self._memory.clear()
+            self._counters['remote_purges'] += 1
+        self._generation = generation
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        查询缓存，先查内存层，未命中再查SQLite层并回填内存
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            缓存的分析结果，未命中时返回None
+        """
+        await self._sync_generation()
+        value = self._memory_get(key)
+        if value is not None:
+            self._counters['memory_hits'] += 1
+            return value
+
+        if self.db_path:
+            try:
+                row = await asyncio.to_thread(self._disk_get, key)
+            except sqlite3.Error as e:
+                logger.warning(f"读取缓存数据库失败: {e}")
+                row = None
+            if row is not None:
+                value, expires_at = row
+                self._memory_set(key, value, expires_at)
+                self._counters['disk_hits'] += 1
+                return value
+
+        self._counters['misses'] += 1
+        return None
+
+    async def set(self, key: str, value: Dict[str, Any]) -> None:
+        """
+        写入缓存（内存层和SQLite层）
+
+        Args:
+            key: 缓存键
+            value: 分析结果
+        """
+        expires_at = time.time() + self.ttl
+        self._memory_set(key, value, expires_at)
+        self._counters['writes'] += 1
+        if self.db_path:
+            try:
+                await asyncio.to_thread(self._disk_set, key, value, expires_at)
+            except sqlite3.Error as e:
+                logger.warning(f"写入缓存数据库失败: {e}")
+                return
+            self._writes_since_cleanup += 1
+            if self.cleanup_interval and self._writes_since_cleanup >= self.cleanup_interval:
+                self._writes_since_cleanup = 0
+                try:
+                    deleted = await asyncio.to_thread(self._disk_delete_expired)
+                except sqlite3.Error as e:
+                    logger.warning(f"删除过期缓存失败: {e}")
+                    return
+                self._counters['disk_expired_deleted'] += deleted
+                if deleted:
+                    logger.info(f"已删除过期缓存 {deleted} 条")
+
+    async def purge(self) -> int:
+        """
+        清空全部缓存（其他worker的内存层在下一次检查清空代数时清空）
+
+        Returns:
+            被清除的条目数（SQLite层清空失败时只计内存层）
+        """
+        purged = len(self._memory)
+        self._memory.clear()
+        if self.db_path:
+            try:
+                deleted, self._generation = await asyncio.to_thread(self._disk_purge)
+            except sqlite3.Error as e:
+                logger.warning(f"清空缓存数据库失败: {e}")
+                return purged
+            self._generation_checked = time.monotonic()
+            purged = max(purged, deleted)
+        logger.info(f"分析结果缓存已清空，共清除 {purged} 条")
+        return purged
+
+    def stats(self) -> Dict[str, Any]:
+        """返回缓存命中/未命中/淘汰计数"""
+        lookups = self._counters['memory_hits'] + self._counters['disk_hits'] + self._counters['misses']
+        hits = self._counters['memory_hits'] + self._counters['disk_hits']
+        return {
+            **self._counters,
+            'hits': hits,
+            'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+            'memory_entries': len(self._memory),
+            'max_entries': self.max_entries,
+            'ttl': self.ttl
+        }
+
+    def close(self) -> None:
+        """关闭SQLite连接"""
+        with self._db_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
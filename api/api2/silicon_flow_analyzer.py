@@ -1,12 +1,30 @@
 import os
 import json
-import logging
 import time
-import requests
+import asyncio
+import hashlib
+import logging
+import functools
+from collections import Counter
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Optional, Tuple
 
+import httpx
 from fastapi import HTTPException
 
-
+from result_cache import AnalysisCache, make_cache_key
+from single_flight import SingleFlight
+from near_duplicate import NearDuplicateIndex
+from partial_json import IncrementalJSONFields
+from rate_limiter import AdaptiveRateLimiter
+from token_estimator import TokenEstimator, estimate_tokens, message_features, set_default_estimator, truncate_to_tokens
+from hedging import HedgePolicy
+from circuit_breaker import CircuitBreaker
+from retry_policy import RetryPolicy, RetryableError, DeadlineExceeded, is_retryable_status, parse_retry_after, remaining
+from model_router import Backend, ModelRouter, NoBackendAvailable
+from cascade import CATEGORIES, CascadeStats, validate_analysis
+from chunking import chunk_text
+from json_repair import JSONRepairError, match_choice, parse as parse_json
+from boilerplate import RULES_VERSION as BOILERPLATE_RULES_VERSION
 
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -20,33 +38,61 @@ SILICON_FLOW_API_KEY = config['api_key']
 SILICON_FLOW_API_URL = config['api_url']
 API_MODEL = config['api_model']
 
-def analyze_with_silicon_flow(content: str) -> dict:
+# 分析模式：single 单次调用生成全部字段；fanout 拆分为多个子提示词并发调用后合并；
+# cascade 先用小模型分析，结果未通过校验时再调用大模型
+ANALYSIS_MODE = config['analysis_mode']
+if ANALYSIS_MODE not in ('single', 'fanout', 'cascade'):
+    raise ValueError(f"不支持的分析模式: {ANALYSIS_MODE}")
+
+# 应用级共享的异步HTTP客户端（连接池），由FastAPI lifespan负责创建和关闭
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+async def start_http_client(transport: Optional[httpx.AsyncBaseTransport] = None) -> httpx.AsyncClient:
     """
-    调用硅基流动API分析新闻内容
-    
+    创建共享的异步HTTP客户端，应在应用启动时调用
+
     Args:
-        content: 新闻内容文本
-        
+        transport: 可选的自定义传输层（用于本地测试替身服务）
+
     Returns:
-        包含分析结果的字典
+        共享的httpx.AsyncClient实例
     """
-    if not SILICON_FLOW_API_KEY:
-        raise HTTPException(status_code=500, detail="硅基流动API密钥未配置，请检查.env文件")
+    global _http_client
+    if _http_client is None:
+        limits = httpx.Limits(
+            max_connections=config['max_connections'],
+            max_keepalive_connections=config['max_keepalive_connections'],
+            keepalive_expiry=config['keepalive_expiry']
+        )
+        # 连接超时10秒，读取超时30秒；连接池等待不设上限，由并发请求排队
+        timeout = httpx.Timeout(connect=10, read=30, write=30, pool=None)
+        _http_client = httpx.AsyncClient(
+            base_url=SILICON_FLOW_API_URL,
+            limits=limits,
+            timeout=timeout,
+            transport=transport
+        )
+    return _http_client
+
+
+async def close_http_client() -> None:
+    """关闭共享的异步HTTP客户端，应在应用关闭时调用"""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
 
-    # 构建请求头
-    headers = {
-        'Authorization': f'Bearer {SILICON_FLOW_API_KEY}',
-        'Content-Type': 'application/json',
-        'Accept': 'application/json'
-    }
-    
-    # 调试信息
-    logger.info(f"API密钥: {SILICON_FLOW_API_KEY[:8]}...{SILICON_FLOW_API_KEY[-4:]}")
-    logger.info(f"API地址: {SILICON_FLOW_API_URL}")
-    logger.info(f"使用模型: {API_MODEL}")
 
-    # 新闻分析提示词模板
-    ANALYSIS_PROMPT_TEMPLATE = """
+async def get_http_client() -> httpx.AsyncClient:
+    """获取共享的异步HTTP客户端，未启动时按需创建"""
+    if _http_client is None:
+        return await start_http_client()
+    return _http_client
+
+
+# 新闻分析提示词模板
+ANALYSIS_PROMPT_TEMPLATE = """
     你是一名专业的新闻信息整理助手，擅长将各类新闻内容进行简要总结，并提炼关键信息点，方便读者快速了解新闻的核心内容。
 
     分析以下新闻内容，提取关键信息并按要求格式化输出，以简体中文输出。
@@ -74,62 +120,1214 @@ def analyze_with_silicon_flow(content: str) -> dict:
     6. markdown格式中的换行使用\\n，列表项使用*号
     """
 
-    # 构建请求体
+# 精简提示词：与ANALYSIS_PROMPT_TEMPLATE相同，但不要求模型回显原文（回显的原文会被丢弃，却使输出token数翻倍）
+LEAN_ANALYSIS_PROMPT_TEMPLATE = """
+    你是一名专业的新闻信息整理助手，擅长将各类新闻内容进行简要总结，并提炼关键信息点，方便读者快速了解新闻的核心内容。
+
+    分析以下新闻内容，提取关键信息并按要求格式化输出，以简体中文输出。
+
+    新闻内容：{content}
+
+    请按以下结构分析并输出（保持JSON格式）：
+
+    {{
+        "title": "新闻标题（40字以内）",
+        "keywords": ["关键词1", "关键词2", "关键词3", "关键词4"],
+        "tags": ["标签1", "标签2", "标签3"],
+        "categoryName": "栏目分类（从以下选择：澳闻, 珠海, 港台, 国内, 国际, 旅游, 头条, 头条报, 看澳门, 视频, 贵州, 娱乐, 攻略, 运势, 美食, 外雇天地, 粤韵周刊）",
+        "aiIntroduction": "新闻概要（150字以内）",
+        "markdown": "# 新闻分析报告\\n\\n1. **新闻核心概括**\\n   - 标题：[15字以内的标题]\\n   - 内容：[提炼新闻核心主题，概括主要事件]\\n\\n2. **背景与概要**\\n   - 标题：[贴合内容的标题]\\n   - 内容：[用几句话概述新闻的背景、主要事件和核心信息]\\n\\n3. **关键要点**\\n   - 标题：[贴合内容的标题]\\n   - 要点：\\n     * [要点1，可用'背景'、'措施'、'影响'等作为提示词]\\n     * [要点2]\\n     * [要点3]\\n\\n4. **重要信息与指标**\\n   - 标题：[贴合内容的标题]\\n   - 信息：\\n     * [关键数据/时间/地点/指标1]\\n     * [事实2]\\n     * [事实3]\\n\\n5. **结论与趋势**\\n   - 标题：[体现总结性质的标题]\\n   - 内容：[总结新闻的整体趋势、意义、影响或未来发展方向]"
+    }}
+
+    注意事项：
+    1. 每个部分的标题需与新闻内容相关，不要使用固定的通用标题
+    2. 保持语言简洁、逻辑清晰，避免过多无关背景
+    3. 数据与指标应忠实于原文表述
+    4. 如果某部分信息不足，可以省略该部分，但保持整体结构完整
+    5. 只输出JSON，不要回显新闻原文；所有字符串使用双引号，特别注意转义字符
+    6. markdown格式中的换行使用\\n，列表项使用*号
+    """
+
+# 标准分析结果中由模型生成的字段
+ANALYSIS_FIELDS = ('title', 'keywords', 'tags', 'categoryName', 'aiIntroduction', 'markdown')
+
+# 各字段的输出token预算（按字数上限估算并留有余量），请求的max_tokens为所需字段预算之和
+FIELD_TOKEN_BUDGETS = {
+    'title': 80,
+    'keywords': 60,
+    'tags': 50,
+    'categoryName': 20,
+    'aiIntroduction': 300,
+    'markdown': 1200,
+    'summary': 600
+}
+# JSON结构本身（键名、引号、括号）的token预算
+JSON_OVERHEAD_TOKENS = 50
+
+# 字段投影：客户端只需要部分字段时，按所需字段生成精简的提示词和输出结构
+FIELD_SPECS = {
+    'title': '"title": "新闻标题（40字以内）"',
+    'keywords': '"keywords": ["关键词1", "关键词2", "关键词3", "关键词4"]',
+    'tags': '"tags": ["标签1", "标签2", "标签3"]',
+    'categoryName': ('"categoryName": "栏目分类（从以下选择：澳闻, 珠海, 港台, 国内, 国际, 旅游, 头条, 头条报, 看澳门, 视频, '
+                     '贵州, 娱乐, 攻略, 运势, 美食, 外雇天地, 粤韵周刊）"'),
+    'aiIntroduction': '"aiIntroduction": "新闻概要（150字以内）"',
+    'markdown': ('"markdown": "# 新闻分析报告\\n\\n1. **新闻核心概括**\\n   - 标题：[15字以内的标题]\\n   - 内容：[提炼新闻核心主题，概括主要事件]'
+                 '\\n\\n2. **背景与概要**\\n   - 标题：[贴合内容的标题]\\n   - 内容：[用几句话概述新闻的背景、主要事件和核心信息]'
+                 '\\n\\n3. **关键要点**\\n   - 标题：[贴合内容的标题]\\n   - 要点：\\n     * [要点1，可用\'背景\'、\'措施\'、\'影响\'等作为提示词]'
+                 '\\n     * [要点2]\\n     * [要点3]\\n\\n4. **重要信息与指标**\\n   - 标题：[贴合内容的标题]\\n   - 信息：'
+                 '\\n     * [关键数据/时间/地点/指标1]\\n     * [事实2]\\n     * [事实3]\\n\\n5. **结论与趋势**'
+                 '\\n   - 标题：[体现总结性质的标题]\\n   - 内容：[总结新闻的整体趋势、意义、影响或未来发展方向]"')
+}
+
+# 字段投影提示词模板，{schema}替换为所需字段的输出结构，{notes}替换为字段相关的注意事项
+PROJECTION_PROMPT_TEMPLATE = """
+    你是一名专业的新闻信息整理助手，擅长提炼新闻的关键信息。
+
+    分析以下新闻内容，只输出下面列出的字段，以简体中文输出。
+
+    新闻内容：{content}
+
+    请按以下结构输出（保持JSON格式）：
+
+    {{
+{schema}
+    }}
+
+    注意事项：{notes}确保JSON格式完全正确，所有字符串使用双引号，只输出JSON。
+    """
+
+# 要求输出分析报告时追加的注意事项
+MARKDOWN_NOTES = ("分析报告每个部分的标题需与新闻内容相关，不要使用固定的通用标题，数据与指标应忠实于原文表述，"
+                  "markdown格式中的换行使用\\n，列表项使用*号；")
+
+
+def parse_fields(value: Optional[str]) -> Optional[Tuple[str, ...]]:
+    """
+    解析客户端请求的字段列表（逗号分隔），按标准顺序排列
+
+    Args:
+        value: 如 "categoryName,keywords"，为空时表示全部字段
+
+    Returns:
+        所需字段元组，请求全部字段或未指定时返回None（不投影）
+
+    Raises:
+        ValueError: 包含不支持或重复的字段
+    """
+    if not value:
+        return None
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    requested = set(names)
+    if len(requested) != len(names):
+        duplicated = sorted({name for name in names if names.count(name) > 1})
+        raise ValueError(f"字段重复: {', '.join(duplicated)}")
+    unknown = requested - set(ANALYSIS_FIELDS)
+    if unknown:
+        raise ValueError(f"不支持的字段: {', '.join(sorted(unknown))}，可选字段: {', '.join(ANALYSIS_FIELDS)}")
+    fields = tuple(name for name in ANALYSIS_FIELDS if name in requested)
+    return None if not fields or fields == ANALYSIS_FIELDS else fields
+
+
+@functools.lru_cache(maxsize=64)
+def _projection_template(fields: Tuple[str, ...]) -> str:
+    """生成只要求指定字段的提示词模板"""
+    schema = ',\n'.join(f"        {FIELD_SPECS[name]}" for name in fields)
+    notes = MARKDOWN_NOTES if 'markdown' in fields else ''
+    return PROJECTION_PROMPT_TEMPLATE.replace('{schema}', schema).replace('{notes}', notes)
+
+# 合并模式（pipeline_mode=combined）的提示词：一次调用先输出重写后的新闻，再输出基于重写内容的分析字段，
+# {schema}和{notes}的替换方式与PROJECTION_PROMPT_TEMPLATE相同
+COMBINED_PROMPT_TEMPLATE = """
+    你是一名专业的新闻编辑，擅长改写新闻并提炼关键信息。
+
+    先重写以下新闻内容，再基于重写后的新闻提取关键信息，以简体中文输出。
+
+    新闻内容：{content}
+
+    请按以下结构输出（保持JSON格式，rewritten_content放在最前面）：
+
+    {{
+{schema}
+    }}
+
+    注意事项：重写时保留原文的全部事实、数据、人名、地名和时间，调整表述和语序，不添加原文没有的信息，段落之间用\\n分隔；{notes}确保JSON格式完全正确，所有字符串使用双引号，只输出JSON。
+    """
+
+# 合并模式中重写内容的输出结构
+REWRITE_SPEC = '"rewritten_content": "重写后的新闻全文"'
+# 重写内容的输出token预算与原文预估token数之比
+REWRITE_OUTPUT_RATIO = 1.5
+
+
+@functools.lru_cache(maxsize=64)
+def _combined_template(fields: Tuple[str, ...]) -> str:
+    """生成同时要求重写内容和指定分析字段的提示词模板"""
+    schema = ',\n'.join(f"        {spec}" for spec in (REWRITE_SPEC,) + tuple(FIELD_SPECS[name] for name in fields))
+    notes = MARKDOWN_NOTES if 'markdown' in fields else ''
+    return COMBINED_PROMPT_TEMPLATE.replace('{schema}', schema).replace('{notes}', notes)
+
+# 并发模式的子提示词：输出长度最长的markdown报告单独生成，不再排在其他字段之后串行输出
+METADATA_PROMPT_TEMPLATE = """
+    你是一名专业的新闻信息整理助手，擅长提炼新闻的关键信息。
+
+    分析以下新闻内容，提取标题、关键词、标签和栏目分类，以简体中文输出。
+
+    新闻内容：{content}
+
+    请按以下结构输出（保持JSON格式）：
+
+    {{
+        "title": "新闻标题（40字以内）",
+        "keywords": ["关键词1", "关键词2", "关键词3", "关键词4"],
+        "tags": ["标签1", "标签2", "标签3"],
+        "categoryName": "栏目分类（从以下选择：澳闻, 珠海, 港台, 国内, 国际, 旅游, 头条, 头条报, 看澳门, 视频, 贵州, 娱乐, 攻略, 运势, 美食, 外雇天地, 粤韵周刊）"
+    }}
+
+    注意事项：确保JSON格式完全正确，所有字符串使用双引号，只输出JSON。
+    """
+
+INTRODUCTION_PROMPT_TEMPLATE = """
+    你是一名专业的新闻信息整理助手，擅长将各类新闻内容进行简要总结。
+
+    为以下新闻撰写概要，以简体中文输出。
+
+    新闻内容：{content}
+
+    请按以下结构输出（保持JSON格式）：
+
+    {{
+        "aiIntroduction": "新闻概要（150字以内）"
+    }}
+
+    注意事项：概要需忠实于原文，语言简洁；确保JSON格式完全正确，只输出JSON。
+    """
+
+MARKDOWN_PROMPT_TEMPLATE = """
+    你是一名专业的新闻信息整理助手，擅长提炼关键信息点，方便读者快速了解新闻的核心内容。
+
+    为以下新闻撰写分析报告，以简体中文输出。
+
+    新闻内容：{content}
+
+    请按以下结构输出（保持JSON格式）：
+
+    {{
+        "markdown": "# 新闻分析报告\\n\\n1. **新闻核心概括**\\n   - 标题：[15字以内的标题]\\n   - 内容：[提炼新闻核心主题，概括主要事件]\\n\\n2. **背景与概要**\\n   - 标题：[贴合内容的标题]\\n   - 内容：[用几句话概述新闻的背景、主要事件和核心信息]\\n\\n3. **关键要点**\\n   - 标题：[贴合内容的标题]\\n   - 要点：\\n     * [要点1，可用'背景'、'措施'、'影响'等作为提示词]\\n     * [要点2]\\n     * [要点3]\\n\\n4. **重要信息与指标**\\n   - 标题：[贴合内容的标题]\\n   - 信息：\\n     * [关键数据/时间/地点/指标1]\\n     * [事实2]\\n     * [事实3]\\n\\n5. **结论与趋势**\\n   - 标题：[体现总结性质的标题]\\n   - 内容：[总结新闻的整体趋势、意义、影响或未来发展方向]"
+    }}
+
+    注意事项：
+    1. 每个部分的标题需与新闻内容相关，不要使用固定的通用标题
+    2. 保持语言简洁、逻辑清晰，避免过多无关背景
+    3. 数据与指标应忠实于原文表述
+    4. 如果某部分信息不足，可以省略该部分，但保持整体结构完整
+    5. 确保JSON格式完全正确，所有字符串使用双引号，特别注意转义字符
+    6. markdown格式中的换行使用\\n，列表项使用*号
+    """
+
+# 长文章分块摘要（map阶段）提示词
+CHUNK_SUMMARY_PROMPT_TEMPLATE = """
+    你是一名专业的新闻信息整理助手。下面是一篇长新闻中按原文顺序截取的一部分，请提炼这一部分的要点，以简体中文输出。
+
+    新闻内容：{content}
+
+    请按以下结构输出（保持JSON格式）：
+
+    {{
+        "summary": "本部分摘要（300字以内，保留关键事实、数据、时间、地点和人物）"
+    }}
+
+    注意事项：只依据本部分内容，不要编造；确保JSON格式完全正确，只输出JSON。
+    """
+
+# 长文章汇总（reduce阶段）提示词：基于各分块摘要生成标准分析结果（不回显原文）
+REDUCE_PROMPT_TEMPLATE = """
+    你是一名专业的新闻信息整理助手，擅长将各类新闻内容进行简要总结，并提炼关键信息点，方便读者快速了解新闻的核心内容。
+
+    下面是一篇长新闻按段落分块后各部分的摘要（按原文顺序排列），请基于这些摘要分析整篇新闻，提取关键信息并按要求格式化输出，以简体中文输出。
+
+    新闻内容：{content}
+
+    请按以下结构分析并输出（保持JSON格式）：
+
+    {{
+        "title": "新闻标题（40字以内）",
+        "keywords": ["关键词1", "关键词2", "关键词3", "关键词4"],
+        "tags": ["标签1", "标签2", "标签3"],
+        "categoryName": "栏目分类（从以下选择：澳闻, 珠海, 港台, 国内, 国际, 旅游, 头条, 头条报, 看澳门, 视频, 贵州, 娱乐, 攻略, 运势, 美食, 外雇天地, 粤韵周刊）",
+        "aiIntroduction": "新闻概要（150字以内）",
+        "markdown": "# 新闻分析报告\\n\\n1. **新闻核心概括**\\n   - 标题：[15字以内的标题]\\n   - 内容：[提炼新闻核心主题，概括主要事件]\\n\\n2. **背景与概要**\\n   - 标题：[贴合内容的标题]\\n   - 内容：[用几句话概述新闻的背景、主要事件和核心信息]\\n\\n3. **关键要点**\\n   - 标题：[贴合内容的标题]\\n   - 要点：\\n     * [要点1，可用'背景'、'措施'、'影响'等作为提示词]\\n     * [要点2]\\n     * [要点3]\\n\\n4. **重要信息与指标**\\n   - 标题：[贴合内容的标题]\\n   - 信息：\\n     * [关键数据/时间/地点/指标1]\\n     * [事实2]\\n     * [事实3]\\n\\n5. **结论与趋势**\\n   - 标题：[体现总结性质的标题]\\n   - 内容：[总结新闻的整体趋势、意义、影响或未来发展方向]"
+    }}
+
+    注意事项：
+    1. 每个部分的标题需与新闻内容相关，不要使用固定的通用标题
+    2. 保持语言简洁、逻辑清晰，避免过多无关背景
+    3. 数据与指标应忠实于摘要中的表述
+    4. 如果某部分信息不足，可以省略该部分，但保持整体结构完整
+    5. 确保JSON格式完全正确，所有字符串使用双引号，特别注意转义字符
+    6. markdown格式中的换行使用\\n，列表项使用*号
+    """
+
+# 容错修复后仍无法解析时，请模型只修正格式
+JSON_FIX_PROMPT_TEMPLATE = """以下文本应为一个JSON对象，但格式有误无法解析。请只修正JSON格式（引号、转义、逗号、括号），不要增删或改写任何内容，只输出修正后的JSON：
+
+{content}"""
+
+# 并发模式的子提示词及其负责的字段
+FANOUT_PROMPTS = (
+    (METADATA_PROMPT_TEMPLATE, ('title', 'keywords', 'tags', 'categoryName')),
+    (INTRODUCTION_PROMPT_TEMPLATE, ('aiIntroduction',)),
+    (MARKDOWN_PROMPT_TEMPLATE, ('markdown',))
+)
+
+
+def _prompt_version() -> str:
+    """由全部提示词模板和影响模型输出的配置计算提示词版本，任一项变化时旧缓存自动失效"""
+    parts = [ANALYSIS_PROMPT_TEMPLATE, LEAN_ANALYSIS_PROMPT_TEMPLATE, PROJECTION_PROMPT_TEMPLATE, MARKDOWN_NOTES,
+             COMBINED_PROMPT_TEMPLATE, REWRITE_SPEC, CHUNK_SUMMARY_PROMPT_TEMPLATE, REDUCE_PROMPT_TEMPLATE]
+    parts += [template for template, _ in FANOUT_PROMPTS]
+    parts += [f"{name}={FIELD_SPECS[name]}" for name in sorted(FIELD_SPECS)]
+    parts += [f"{name}={config[name]!r}" for name in ('lean_prompt', 'json_mode', 'analysis_mode')]
+    return hashlib.sha256('\x00'.join(parts).encode('utf-8')).hexdigest()[:12]
+
+
+# 提示词模板版本，作为缓存键的一部分
+PROMPT_VERSION = _prompt_version()
+
+def _cleaning_version() -> str:
+    """由模板内容去除的规则和配置计算清理版本，任一项变化时以清理前正文为键的旧缓存自动失效"""
+    parts = [BOILERPLATE_RULES_VERSION]
+    parts += [f"{name}={config[name]!r}" for name in ('boilerplate_enabled', 'boilerplate_link_density',
+                                                      'boilerplate_repeat_articles', 'boilerplate_repeat_window',
+                                                      'boilerplate_patterns')]
+    return hashlib.sha256('\x00'.join(parts).encode('utf-8')).hexdigest()[:12]
+
+
+# 清理版本，缓存键取清理前的正文（key_content）时作为缓存键的一部分
+CLEANING_VERSION = _cleaning_version()
+
+# 分析结果缓存（内存LRU + SQLite持久层）
+analysis_cache = AnalysisCache(
+    config['cache_db_path'],
+    max_entries=config['cache_max_entries'],
+    ttl=config['cache_ttl']
+) if config['cache_enabled'] else None
+
+# 合并相同内容的并发分析请求
+analysis_flight = SingleFlight('analysis')
+
+# 硅基流动RPM/TPM限流（429时按Retry-After暂停并自适应降速）
+silicon_flow_limiter = AdaptiveRateLimiter(
+    'silicon_flow',
+    requests_per_minute=config['silicon_flow_rpm'],
+    tokens_per_minute=config['silicon_flow_tpm']
+) if config['rate_limit_enabled'] else None
+
+# 对冲请求：首字节延迟超过近期分布的指定百分位时再发一个相同请求，额外调用受预算约束
+silicon_flow_hedger = HedgePolicy(
+    'silicon_flow',
+    percentile=config['hedge_percentile'],
+    budget=config['hedge_budget'],
+    min_delay=config['hedge_min_delay'],
+    min_samples=config['hedge_min_samples']
+) if config['hedge_enabled'] else None
+
+
+
+def _make_breaker(name: str) -> Optional[CircuitBreaker]:
+    """按配置创建熔断器，未启用时返回None"""
+    if not config['circuit_breaker_enabled']:
+        return None
+    return CircuitBreaker(
+        name,
+        window_size=config['circuit_window_size'],
+        min_calls=config['circuit_min_calls'],
+        failure_rate=config['circuit_failure_rate'],
+        slow_call_duration=config['circuit_slow_call_duration'],
+        slow_call_rate=config['circuit_slow_call_rate'],
+        open_duration=config['circuit_open_duration'],
+        half_open_max_calls=config['circuit_half_open_max_calls']
+    )
+
+
+# 熔断器：上游失败率或慢调用率过高时快速失败，避免请求堆积在重试流程中
+silicon_flow_breaker = _make_breaker('silicon_flow')
+
+
+def _build_backends() -> List[Backend]:
+    """主后端（api_url + api_model）加上model_backends中配置的其他OpenAI兼容后端"""
+    backends = [Backend('silicon_flow', SILICON_FLOW_API_URL, SILICON_FLOW_API_KEY, API_MODEL,
+                        weight=config['api_weight'], limiter=silicon_flow_limiter, breaker=silicon_flow_breaker,
+                        window=config['router_window'], json_mode=config['json_mode'])]
+    for item in config['model_backends']:
+        name = item['name']
+        limiter = AdaptiveRateLimiter(
+            name,
+            requests_per_minute=item['rpm'],
+            tokens_per_minute=item.get('tpm', 0)
+        ) if config['rate_limit_enabled'] and item.get('rpm') else None
+        backends.append(Backend(name, item['api_url'], item.get('api_key', ''), item['model'],
+                                weight=item.get('weight', 1.0), limiter=limiter, breaker=_make_breaker(name),
+                                window=config['router_window'], json_mode=item.get('json_mode', False)))
+    return backends
+
+
+# 多后端路由：按滚动延迟和错误率选择后端，失败后重试时切换到其他后端
+silicon_flow_router = ModelRouter(
+    _build_backends(),
+    error_penalty=config['router_error_penalty'],
+    explore_rate=config['router_explore_rate']
+)
+
+# 级联模式的小模型后端（默认与主后端使用同一服务地址和API密钥）及级联统计
+cascade_router = ModelRouter([Backend(
+    'cascade_small',
+    config['cascade_small_api_url'] or SILICON_FLOW_API_URL,
+    config['cascade_small_api_key'] or SILICON_FLOW_API_KEY,
+    config['cascade_small_model'],
+    limiter=AdaptiveRateLimiter(
+        'cascade_small',
+        requests_per_minute=config['silicon_flow_rpm'],
+        tokens_per_minute=config['silicon_flow_tpm']
+    ) if config['rate_limit_enabled'] else None,
+    breaker=_make_breaker('cascade_small'),
+    json_mode=config['json_mode']
+)]) if ANALYSIS_MODE == 'cascade' else None
+cascade_stats = CascadeStats(
+    small_price=config['cascade_small_price'],
+    large_price=config['cascade_large_price']
+) if ANALYSIS_MODE == 'cascade' else None
+
+# 模型输出JSON的解析结果计数：clean 无需修复、repaired 容错修复、reasked 请模型修正、failed 无法解析
+json_repair_stats = Counter()
+
+# token预估（限流、长文章判断、分块和输入预算共用），启用校准时按上游返回的实际prompt_tokens拟合权重
+token_estimator = TokenEstimator(
+    config['token_estimator_weights'],
+    calibrate=config['token_calibration_enabled'],
+    refit_every=config['token_calibration_refit']
+)
+set_default_estimator(token_estimator)
+
+# 并发子提示词模式的计数：partial 有字段缺失的文章数、failed_parts 调用失败的子提示词数、
+# missing_fields 缺失的字段数（子提示词失败或输出中缺少该字段）
+fanout_stats = Counter()
+
+# 输入token预算的处理计数：articles 检查的文章数、input_tokens 预估输入token总数、trimmed 截断、rejected 拒绝
+input_budget_stats = Counter()
+
+# 重试策略：429、5xx、连接失败和超时按指数退避加抖动重试，不超过请求的截止时间
+silicon_flow_retry = RetryPolicy(
+    'silicon_flow',
+    max_attempts=config['retry_max_attempts'],
+    base_delay=config['retry_base_delay'],
+    max_delay=config['retry_max_delay'],
+    attempt_timeout=30
+)
+
+# 近似重复文章索引（依赖分析结果缓存保存被复用的结果）
+near_duplicate_index = NearDuplicateIndex(
+    config['cache_db_path'],
+    max_distance=config['near_duplicate_max_distance'],
+    shingle_size=config['near_duplicate_shingle_size']
+) if config['cache_enabled'] and config['near_duplicate_enabled'] else None
+
+
+def _build_headers(api_key: str = SILICON_FLOW_API_KEY) -> dict:
+    """构建请求头"""
+    return {
+        'Authorization': f'Bearer {api_key}',
+        'Content-Type': 'application/json',
+        'Accept': 'application/json'
+    }
+
+
+def _max_tokens(fields: Tuple[str, ...]) -> int:
+    """按输出字段计算max_tokens"""
+    return JSON_OVERHEAD_TOKENS + sum(FIELD_TOKEN_BUDGETS[name] for name in fields)
+
+
+def _build_payload(content: str, template: Optional[str] = None, fields: Optional[Tuple[str, ...]] = None) -> dict:
+    """
+    构建分析请求体
+
+    Args:
+        content: 填入提示词的内容
+        template: 提示词模板，默认按lean_prompt配置选择标准分析提示词
+        fields: 模板要求输出的字段，用于计算max_tokens；要求回显原文时不设max_tokens
+
+    Returns:
+        请求体（启用json_mode时要求JSON输出，不支持的后端发送前会去掉该参数）
+    """
+    if template is None:
+        if config['lean_prompt']:
+            template, fields = LEAN_ANALYSIS_PROMPT_TEMPLATE, ANALYSIS_FIELDS
+        else:
+            template, fields = ANALYSIS_PROMPT_TEMPLATE, ANALYSIS_FIELDS + ('content',)
     payload = {
         'model': API_MODEL,
         'messages': [
             {'role': 'system', 'content': '你是一个新闻编辑助手。'},
-            {'role': 'user', 'content': ANALYSIS_PROMPT_TEMPLATE.format(content=content)}
+            {'role': 'user', 'content': template.format(content=content)}
         ]
     }
+    if config['json_mode']:
+        payload['response_format'] = {'type': 'json_object'}
+    # 回显原文的输出长度与原文相当，不设上限
+    if fields is not None and 'content' not in fields:
+        payload['max_tokens'] = _max_tokens(fields)
+    return payload
 
-    # 重试机制配置
-    max_retries = 3
-    retry_delay = 2  # 初始重试延迟(秒)
-    retry_count = 0
-    response = None
 
-    while retry_count < max_retries:
-        try:
-            # 发送API请求
-            response = requests.post(
-                f"{SILICON_FLOW_API_URL}/chat/completions",
-                json=payload,
-                headers=headers,
-                timeout=(10, 30)  # 连接超时10秒，读取超时30秒
-            )
-            response.raise_for_status()
-            result = response.json()
-            break
-        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
-            retry_count += 1
-            logger.warning(f"API调用失败(第{retry_count}/{max_retries}次): {str(e)}，将在{retry_delay}秒后重试")
-            time.sleep(retry_delay)
-            retry_delay *= 2  # 指数退避
-        except requests.exceptions.RequestException as e:
-            logger.error(f"API调用失败(不可重试): {str(e)}")
-            raise HTTPException(status_code=500, detail=f"调用Silicon Flow API失败: {str(e)}")
-
-    if retry_count >= max_retries and response is None:
-        raise HTTPException(status_code=500, detail=f"API调用超时，已重试{max_retries}次")
+def _estimate_payload_tokens(payload: dict) -> int:
+    """预估一次调用消耗的token数（输入提示词 + 预期输出，设置了max_tokens时按其计算）"""
+    prompt_tokens = token_estimator.estimate_messages(payload['messages'])
+    return prompt_tokens + payload.get('max_tokens', config['rate_limit_output_tokens'])
+
+
+def _attempt_timeout(timeout: float) -> httpx.Timeout:
+    """单次尝试的超时：读写不超过本次可用时间，连接最多10秒；有截止时间时连接池等待也计入"""
+    return httpx.Timeout(timeout, connect=min(10, timeout), pool=None if remaining() is None else timeout)
+
+
+async def _open(client: httpx.AsyncClient, backend: Backend, payload: dict, estimated_tokens: int,
+                timeout: float) -> httpx.Response:
+    """发出请求并在响应头到达后返回（响应体未读取），启用对冲时首字节过慢的请求会被对冲"""
+    body = {**payload, 'model': backend.model}
+    if not backend.json_mode:
+        body.pop('response_format', None)
+
+    def send() -> Awaitable[httpx.Response]:
+        request = client.build_request('POST', f"{backend.api_url}/chat/completions", json=body,
+                                       headers=_build_headers(backend.api_key), timeout=_attempt_timeout(timeout))
+        return client.send(request, stream=True)
+
+    if silicon_flow_hedger is None:
+        return await send()
+
+    async def hedge_send() -> httpx.Response:
+        # 对冲请求同样占用限流额度
+        if backend.limiter is not None:
+            await backend.limiter.acquire(estimated_tokens)
+        return await send()
+
+    return await silicon_flow_hedger.run(send, hedge_send, discard=lambda response: response.aclose())
+
+
+async def _attempt(router: ModelRouter, payload: dict, estimated_tokens: int, timeout: float, stream: bool,
+                   tried: List[Backend]) -> Tuple[httpx.Response, Backend]:
+    """
+    选择后端并发送一次聊天补全请求：熔断检查、限流并记录后端的延迟和健康状况
 
+    Args:
+        router: 选择后端的路由器
+        payload: 请求体
+        estimated_tokens: 预估token数
+        timeout: 本次尝试可用的超时秒数
+        stream: 是否以流式方式读取响应体
+        tried: 本次请求已尝试过的后端，选中的后端会追加到其中
+
+    Returns:
+        上游响应和处理该请求的后端
+
+    Raises:
+        RetryableError: 连接失败、超时、429或5xx
+    """
+    try:
+        backend = router.choose(exclude=tried)
+    except NoBackendAvailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    tried.append(backend)
+    if backend.limiter is not None:
+        await backend.limiter.acquire(estimated_tokens)
+    client = await get_http_client()
+    started = time.monotonic()
     try:
-        # 解析JSON响应内容
-        analysis_result = json.loads(result['choices'][0]['message']['content'])
+        response = await _open(client, backend, payload, estimated_tokens, timeout)
+        if not stream:
+            try:
+                await response.aread()
+            finally:
+                await response.aclose()
+    except httpx.TransportError as e:
+        # 连接失败、超时等网络错误
+        backend.record_failure(time.monotonic() - started)
+        raise RetryableError(f"{backend.name} {type(e).__name__}: {e}",
+                             failover=router.has_alternative(tried)) from e
 
-        # 处理返回结果
-        return {
-            "title": analysis_result.get('title', '')[:40],  # 限制标题长度
-            "keywords": analysis_result.get('keywords', [])[:4],  # 限制关键词数量
-            "tags": analysis_result.get('tags', [])[:3],  # 限制标签数量
-            "categoryName": analysis_result.get('categoryName', '')[:10],  # 限制栏目名称长度
-            "content": analysis_result.get('content', ''),  # 清理后的新闻内容
-            "aiIntroduction": analysis_result.get('aiIntroduction', '')[:150],  # 新闻概要，限制150字
-            "markdown": analysis_result.get('markdown', '')  # Markdown格式的分析报告
-        }
-    except (json.JSONDecodeError, KeyError) as e:
+    duration = time.monotonic() - started
+    if response.status_code == 429:
+        # 429说明上游可用，只是超出配额：熔断器不计为失败，路由时降低该后端的优先级
+        backend.record_rate_limited(duration)
+    elif response.status_code >= 500:
+        backend.record_failure(duration)
+    else:
+        backend.record_success(duration)
+
+    if is_retryable_status(response.status_code):
+        await response.aclose()
+        retry_after = parse_retry_after(response.headers.get('Retry-After'))
+        if response.status_code == 429 and backend.limiter is not None:
+            backend.limiter.on_rate_limited(retry_after)
+        raise RetryableError(f"{backend.name} HTTP {response.status_code}", retry_after,
+                             failover=router.has_alternative(tried))
+    if backend.limiter is not None and response.is_success:
+        backend.limiter.on_success()
+    return response, backend
+
+
+async def _send(payload: dict, estimated_tokens: int, stream: bool = False,
+                router: Optional[ModelRouter] = None) -> Tuple[httpx.Response, Backend]:
+    """
+    按重试策略发送聊天补全请求，429、5xx、连接失败和超时时退避重试（有其他可用后端时立即切换），
+    不超过当前请求的截止时间
+
+    Args:
+        payload: 请求体
+        estimated_tokens: 预估token数
+        stream: 是否以流式方式读取响应体（调用方负责关闭响应）
+        router: 选择后端的路由器，默认为主路由器
+
+    Returns:
+        上游响应（不可重试的状态码也会返回，由调用方处理）和处理该请求的后端
+    """
+    router = router or silicon_flow_router
+    tried: List[Backend] = []
+    try:
+        return await silicon_flow_retry.run(
+            lambda timeout: _attempt(router, payload, estimated_tokens, timeout, stream, tried)
+        )
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except RetryableError as e:
+        raise HTTPException(status_code=503, detail=f"调用Silicon Flow API失败，重试后仍未成功: {e}")
+
+
+async def _call_silicon_flow(payload: dict, router: Optional[ModelRouter] = None) -> dict:
+    """
+    发送聊天补全请求，可重试的失败按重试策略退避重试
+
+    Args:
+        payload: 请求体
+        router: 选择后端的路由器，默认为主路由器
+
+    Returns:
+        API返回的JSON
+    """
+    estimated_tokens = _estimate_payload_tokens(payload)
+
+    # 发送API请求（复用连接池，不阻塞事件循环）
+    response, backend = await _send(payload, estimated_tokens, router=router)
+    try:
+        response.raise_for_status()
+    except httpx.HTTPStatusError as e:
+        logger.error(f"API调用失败(不可重试): {str(e)}")
+        raise HTTPException(status_code=500, detail=f"调用Silicon Flow API失败: {str(e)}")
+    result = response.json()
+    if backend.limiter is not None:
+        backend.limiter.settle(estimated_tokens, _usage_tokens(result))
+    _observe_prompt_tokens(payload, result)
+    return result
+
+
+def _usage_tokens(result: dict) -> int:
+    """API返回的实际token用量"""
+    return (result.get('usage') or {}).get('total_tokens', 0)
+
+
+def _observe_prompt_tokens(payload: dict, result: dict) -> None:
+    """记录输入token的预估值和实际值，用于校准token预估"""
+    actual = (result.get('usage') or {}).get('prompt_tokens')
+    if not isinstance(actual, int) or actual <= 0:
+        return
+    features = message_features(payload['messages'])
+    logger.info(f"输入token: 预估{token_estimator.estimate_features(features)}，实际{actual}")
+    token_estimator.observe(features, actual)
+
+
+def fit_input_budget(content: str) -> str:
+    """
+    按输入token预算检查清理后的内容，在调用任何上游服务之前截断或拒绝超长文章
+
+    Args:
+        content: 清理后的新闻内容
+
+    Returns:
+        不超过预算的内容（未超过时原样返回）
+
+    Raises:
+        HTTPException: 超过预算且input_budget_policy为reject时返回413
+    """
+    tokens = estimate_tokens(content)
+    input_budget_stats['articles'] += 1
+    input_budget_stats['input_tokens'] += tokens
+    budget = config['max_input_tokens']
+    if not budget or tokens <= budget:
+        logger.info(f"内容预估输入token: {tokens}")
+        return content
+    if config['input_budget_policy'] == 'reject':
+        input_budget_stats['rejected'] += 1
+        logger.warning(f"内容预估{tokens}个token，超过输入预算{budget}，拒绝处理")
+        raise HTTPException(status_code=413, detail=f"内容过长: 预估{tokens}个token，超过上限{budget}")
+    trimmed = truncate_to_tokens(content, budget)
+    input_budget_stats['trimmed'] += 1
+    logger.warning(f"内容预估{tokens}个token，超过输入预算{budget}，截断为{estimate_tokens(trimmed)}个token")
+    return trimmed
+
+
+# 各字段的长度（字符串）或数量（列表）上限
+FIELD_LIMITS = {
+    'title': 40,  # 限制标题长度
+    'keywords': 4,  # 限制关键词数量
+    'tags': 3,  # 限制标签数量
+    'categoryName': 10,  # 限制栏目名称长度
+    'aiIntroduction': 150  # 新闻概要，限制150字
+}
+
+
+def _match_category(value: Any) -> Any:
+    """将栏目名称模糊匹配到固定分类（如"【澳闻】"→"澳闻"），无法匹配时原样返回"""
+    if not isinstance(value, str) or value in CATEGORIES:
+        return value
+    matched = match_choice(value, CATEGORIES)
+    return value if matched is None else matched
+
+
+def _normalize_field(name: str, value: Any) -> Any:
+    """按字段上限截断单个字段值，栏目名称匹配到固定分类"""
+    if name == 'categoryName':
+        value = _match_category(value)
+    limit = FIELD_LIMITS.get(name)
+    if limit is not None and isinstance(value, (str, list)):
+        return value[:limit]
+    return value
+
+
+def _normalize_analysis(analysis_result: dict) -> dict:
+    """补全缺失字段并按上限截断"""
+    return {
+        "title": _normalize_field('title', analysis_result.get('title', '')),
+        "keywords": _normalize_field('keywords', analysis_result.get('keywords', [])),
+        "tags": _normalize_field('tags', analysis_result.get('tags', [])),
+        "categoryName": _normalize_field('categoryName', analysis_result.get('categoryName', '')),
+        "content": analysis_result.get('content', ''),  # 清理后的新闻内容
+        "aiIntroduction": _normalize_field('aiIntroduction', analysis_result.get('aiIntroduction', '')),
+        "markdown": analysis_result.get('markdown', '')  # Markdown格式的分析报告
+    }
+
+
+def _load_output(text: str) -> Tuple[dict, str]:
+    """
+    容错解析模型输出的JSON对象，并将栏目名称模糊匹配到固定分类
+
+    Returns:
+        (解析结果, 'clean' 或 'repaired')
+
+    Raises:
+        ValueError: 修复后仍无法解析或不是JSON对象
+    """
+    analysis_result, repaired = parse_json(text)
+    outcome = 'repaired' if repaired else 'clean'
+    if not isinstance(analysis_result, dict):
+        raise JSONRepairError("输出不是JSON对象")
+    if 'categoryName' in analysis_result:
+        analysis_result['categoryName'] = _match_category(analysis_result['categoryName'])
+    return analysis_result, outcome
+
+
+async def _reask_json(text: str) -> dict:
+    """请模型只修正输出的JSON格式，仍无法解析时抛出ValueError"""
+    payload = _build_payload(text, JSON_FIX_PROMPT_TEMPLATE)
+    payload['max_tokens'] = estimate_tokens(text) + JSON_OVERHEAD_TOKENS
+    result = await _call_silicon_flow(payload)
+    analysis_result, _ = _load_output(result['choices'][0]['message']['content'])
+    return analysis_result
+
+
+async def _parse_completion(result: dict, reask: bool = True) -> dict:
+    """
+    解析API返回的JSON输出
+
+    先按标准JSON解析，失败时容错修复；仍无法解析且启用了json_reask_enabled时请模型修正格式（只修正一次）。
+
+    Args:
+        result: API返回的JSON
+        reask: 是否允许请模型修正格式（级联的小模型输出无法解析时直接升级，不再修正）
+
+    Returns:
+        模型输出的JSON对象
+
+    Raises:
+        HTTPException: 输出无法解析
+    """
+    try:
+        text = result['choices'][0]['message']['content']
+        analysis_result, outcome = _load_output(text)
+        json_repair_stats[outcome] += 1
+        if outcome == 'repaired':
+            logger.warning("模型输出的JSON格式有误，已容错修复")
+        return analysis_result
+    except (KeyError, IndexError, TypeError) as e:
+        json_repair_stats['failed'] += 1
         logger.error(f"API返回格式异常: {str(e)}")
         raise HTTPException(status_code=500, detail=f"解析API响应失败: {str(e)}")
+    except ValueError as e:
+        # 输出中完全没有JSON对象（如拒绝回答）时修正格式也无济于事
+        if not (reask and config['json_reask_enabled'] and '{' in text):
+            json_repair_stats['failed'] += 1
+            logger.error(f"API返回格式异常: {str(e)}")
+            raise HTTPException(status_code=500, detail=f"解析API响应失败: {str(e)}")
+        logger.warning(f"模型输出的JSON无法修复（{str(e)}），请模型修正格式")
+
+    try:
+        analysis_result = await _reask_json(text)
+    except (KeyError, IndexError, TypeError, ValueError) as e:
+        json_repair_stats['failed'] += 1
+        logger.error(f"修正后的JSON仍无法解析: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"解析API响应失败: {str(e)}")
+    json_repair_stats['reasked'] += 1
+    return analysis_result
+
+
+async def _parse_analysis(result: dict, content: str) -> dict:
+    """
+    解析API返回的分析结果
+
+    Args:
+        result: API返回的JSON
+        content: 分析的新闻内容，模型未回显原文时作为结果的content字段
+
+    Returns:
+        规整后的分析结果字典
+    """
+    # 解析JSON响应内容
+    analysis_result = await _parse_completion(result)
+    try:
+        # 处理返回结果
+        return _normalize_analysis({'content': content, **analysis_result})
     except Exception as e:
         logger.error(f"分析结果处理失败: {str(e)}")
         raise HTTPException(status_code=500, detail=f"处理分析结果失败: {str(e)}")
+
+
+def _check_api_key() -> None:
+    """检查API密钥并输出调试信息"""
+    if not SILICON_FLOW_API_KEY:
+        raise HTTPException(status_code=500, detail="硅基流动API密钥未配置，请检查.env文件")
+
+    # 调试信息
+    logger.info(f"API密钥: {SILICON_FLOW_API_KEY[:8]}...{SILICON_FLOW_API_KEY[-4:]}")
+    logger.info(f"API地址: {SILICON_FLOW_API_URL}")
+    logger.info(f"使用模型: {API_MODEL}")
+
+
+async def _analyze_uncached(content: str) -> dict:
+    """调用硅基流动API分析新闻内容（不经过缓存）"""
+    _check_api_key()
+    result = await _call_silicon_flow(_build_payload(content))
+    return await _parse_analysis(result, content)
+
+
+async def _analyze_part(content: str, template: str, names: Tuple[str, ...]) -> dict:
+    """调用一个子提示词，只保留其负责的字段"""
+    result = await _parse_completion(await _call_silicon_flow(_build_payload(content, template, names)))
+    return {name: _normalize_field(name, result[name]) for name in names if name in result}
+
+
+async def _gather_parts(content: str) -> AsyncIterator[dict]:
+    """
+    并发调用全部子提示词，按完成顺序产出各部分结果
+
+    单个子提示词失败时记录并跳过，其余部分照常产出；全部失败或请求超过截止时间时抛出异常并取消其余调用。
+
+    Args:
+        content: 新闻内容文本
+
+    Yields:
+        子提示词负责的字段字典（只含输出中存在的字段）
+
+    Raises:
+        HTTPException: 全部子提示词失败，或请求超过截止时间(504)
+    """
+    tasks = [asyncio.ensure_future(_analyze_part(content, template, names)) for template, names in FANOUT_PROMPTS]
+    errors: List[HTTPException] = []
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            try:
+                part = await next_done
+            except HTTPException as e:
+                if e.status_code == 504:
+                    raise
+                fanout_stats['failed_parts'] += 1
+                logger.warning(f"子提示词分析失败，其余字段照常返回: {e.detail}")
+                errors.append(e)
+                continue
+            yield part
+        if len(errors) == len(tasks):
+            raise errors[0]
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def _merge_parts(content: str, merged: dict) -> dict:
+    """
+    规整各子提示词合并后的结果，有字段缺失时在missing_fields中列出
+
+    Args:
+        content: 新闻内容文本
+        merged: 各子提示词产出的字段
+
+    Returns:
+        规整后的分析结果字典
+    """
+    result = _normalize_analysis({'content': content, **merged})
+    missing = [name for _, names in FANOUT_PROMPTS for name in names if name not in merged]
+    if missing:
+        fanout_stats['partial'] += 1
+        fanout_stats['missing_fields'] += len(missing)
+        logger.warning(f"并发分析结果缺少字段: {', '.join(missing)}")
+        result['missing_fields'] = missing
+    return result
+
+
+async def _analyze_fanout(content: str) -> dict:
+    """以多个子提示词并发分析新闻内容并合并结果（不经过缓存）；部分子提示词失败时保留其余字段"""
+    _check_api_key()
+    merged = {}
+    async for part in _gather_parts(content):
+        merged.update(part)
+    return _merge_parts(content, merged)
+
+
+async def _analyze_cascade(content: str) -> dict:
+    """先用小模型分析，结果未通过校验时升级到大模型（不经过缓存）"""
+    _check_api_key()
+    payload = _build_payload(content)
+    started = time.monotonic()
+    try:
+        result = await _call_silicon_flow(payload, cascade_router)
+        analysis_result = await _parse_completion(result, reask=False)
+    except HTTPException as e:
+        if e.status_code == 504:
+            # 请求已超过截止时间，升级也来不及
+            raise
+        cascade_stats.record_small_error(time.monotonic() - started, 'small_model_error')
+        logger.warning(f"小模型分析失败，升级到大模型: {e.detail}")
+    else:
+        problems = validate_analysis(analysis_result)
+        cascade_stats.record_small(time.monotonic() - started, _usage_tokens(result), problems)
+        if not problems:
+            return _normalize_analysis({'content': content, **analysis_result})
+        logger.info(f"小模型结果未通过校验({', '.join(problems)})，升级到大模型")
+
+    started = time.monotonic()
+    result = await _call_silicon_flow(payload)
+    cascade_stats.record_large(time.monotonic() - started, _usage_tokens(result))
+    return await _parse_analysis(result, content)
+
+
+def _is_long_article(content: str) -> bool:
+    """清理后内容的预估token数是否超过长文章阈值"""
+    return config['long_article_enabled'] and estimate_tokens(content) > config['long_article_threshold']
+
+
+async def _summarize_chunks(content: str) -> str:
+    """
+    长文章map阶段：按段落分块并发摘要
+
+    Args:
+        content: 新闻内容文本
+
+    Returns:
+        按原文顺序拼接的各分块摘要
+    """
+    chunks = chunk_text(content, config['long_article_chunk_tokens'])
+    logger.info(f"长文章预估{estimate_tokens(content)}个token，切分为{len(chunks)}个分块并发摘要")
+    semaphore = asyncio.Semaphore(config['long_article_max_concurrency'])
+
+    async def summarize(chunk: str) -> str:
+        async with semaphore:
+            payload = _build_payload(chunk, CHUNK_SUMMARY_PROMPT_TEMPLATE, ('summary',))
+            result = await _parse_completion(await _call_silicon_flow(payload))
+        summary = result.get('summary')
+        if not isinstance(summary, str) or not summary.strip():
+            raise HTTPException(status_code=500, detail="解析API响应失败: 分块摘要为空")
+        return summary.strip()
+
+    tasks = [asyncio.ensure_future(summarize(chunk)) for chunk in chunks]
+    try:
+        summaries = await asyncio.gather(*tasks)
+    finally:
+        # 任一分块失败时取消其余调用
+        for task in tasks:
+            task.cancel()
+    return '\n\n'.join(f"第{index}部分：{summary}" for index, summary in enumerate(summaries, 1))
+
+
+async def _analyze_long(content: str) -> dict:
+    """长文章map-reduce分析：分块并发摘要后基于摘要生成标准结果（不经过缓存）"""
+    _check_api_key()
+    summaries = await _summarize_chunks(content)
+    result = await _parse_completion(await _call_silicon_flow(_build_payload(summaries, REDUCE_PROMPT_TEMPLATE, ANALYSIS_FIELDS)))
+    return _normalize_analysis({**result, 'content': content})
+
+
+async def _analyze_projection(content: str, fields: Tuple[str, ...]) -> dict:
+    """只生成指定字段（不经过缓存），长文章先分块摘要再基于摘要生成"""
+    _check_api_key()
+    text = await _summarize_chunks(content) if _is_long_article(content) else content
+    result = await _parse_completion(await _call_silicon_flow(_build_payload(text, _projection_template(fields), fields)))
+    analysis = _normalize_analysis({'content': content, **result})
+    return {name: analysis[name] for name in ('content',) + fields}
+
+
+def combined_rewrite_fits(content: str) -> bool:
+    """内容是否适合在一次调用中同时重写和分析（长文章的重写输出过长，仍分两次调用）"""
+    return not _is_long_article(content)
+
+
+async def rewrite_and_analyze_combined(content: str, fields: Optional[Tuple[str, ...]] = None) -> dict:
+    """
+    一次调用同时重写新闻并分析重写后的内容（不经过缓存）
+
+    Args:
+        content: 清理后的新闻内容，应先经combined_rewrite_fits确认不是长文章
+        fields: 只生成这些分析字段，为None时生成全部字段
+
+    Returns:
+        包含rewritten_content、content和分析字段的字典，格式与两次调用时相同
+
+    Raises:
+        HTTPException: 调用失败、输出无法解析或重写内容为空
+    """
+    _check_api_key()
+    names = fields or ANALYSIS_FIELDS
+    payload = _build_payload(content, _combined_template(names), names)
+    payload['max_tokens'] += int(estimate_tokens(content) * REWRITE_OUTPUT_RATIO)
+    result = await _parse_completion(await _call_silicon_flow(payload))
+    rewritten_content = result.get('rewritten_content')
+    if not isinstance(rewritten_content, str) or not rewritten_content.strip():
+        raise HTTPException(status_code=500, detail="解析API响应失败: 重写内容为空")
+    analysis = _normalize_analysis({**result, 'content': content})
+    return {'rewritten_content': rewritten_content.strip(), **{name: analysis[name] for name in ('content',) + names}}
+
+
+# 各分析模式的缓存命名空间（不同模式的结果分开缓存），long为长文章map-reduce分析，
+# projection为字段投影（命名空间后附所需字段）
+CACHE_NAMESPACES = {
+    'single': 'analysis',
+    'fanout': 'analysis_fanout',
+    'cascade': 'analysis_cascade',
+    'long': 'analysis_long',
+    'projection': 'analysis_fields'
+}
+
+
+class _CacheSlot:
+    """一次缓存查询的上下文，未命中时用于回写结果"""
+
+    def __init__(self, content: str, namespace: str, near_duplicate: bool = True, key_content: Optional[str] = None):
+        self.scope = f"{namespace}:{API_MODEL}:{PROMPT_VERSION}"
+        if key_content is None:
+            self.key = make_cache_key(content, f"{namespace}:{API_MODEL}", PROMPT_VERSION)
+        else:
+            # 清理前的正文不能反映清理方式，清理版本不同的结果不能互相复用
+            self.key = make_cache_key(key_content, f"{namespace}:{API_MODEL}:{CLEANING_VERSION}", PROMPT_VERSION)
+        self.content = content
+        self.near_duplicate = near_duplicate and near_duplicate_index is not None
+        self.fingerprint: Optional[int] = None
+
+    async def lookup(self) -> Optional[dict]:
+        """依次查询精确缓存和近似重复索引"""
+        if analysis_cache is None:
+            return None
+        cached = await analysis_cache.get(self.key)
+        if cached is not None:
+            logger.info(f"命中分析结果缓存: {self.key[:12]}")
+            return cached
+
+        if self.near_duplicate:
+            self.fingerprint = near_duplicate_index.fingerprint(self.content)
+        if self.fingerprint is not None:
+            match = await near_duplicate_index.find(self.scope, self.fingerprint)
+            if match is not None:
+                similar_key, similarity = match
+                cached = await analysis_cache.get(similar_key)
+                if cached is not None:
+                    logger.info(f"命中近似重复文章: {similar_key[:12]} (相似度 {similarity:.3f})")
+                    return cached
+        return None
+
+    async def store(self, result: dict) -> None:
+        """写入缓存并登记近似重复指纹"""
+        if analysis_cache is None:
+            return
+        await analysis_cache.set(self.key, result)
+        if self.fingerprint is not None:
+            await near_duplicate_index.add(self.scope, self.fingerprint, self.key)
+
+
+async def cached_call(content: str, namespace: str, compute: Callable[[], Awaitable[dict]],
+                      near_duplicate: bool = True, key_content: Optional[str] = None) -> dict:
+    """
+    带缓存的调用：依次查询精确缓存、近似重复索引，未命中时合并并发请求后执行compute并写入缓存
+
+    Args:
+        content: 作为缓存依据的新闻内容
+        namespace: 缓存命名空间，区分不同的处理流程
+        compute: 未命中缓存时执行的上游调用
+        near_duplicate: 是否查询和登记近似重复文章；结果中含有逐字对应原文的内容（如重写稿）时应关闭，
+                        否则转载稿会拿到另一篇文章的电头、署名和不同的事实
+        key_content: 计算精确缓存键（及合并并发请求）所用的内容，默认为content；
+                     content经过依赖进程内状态的清理（如去除跨文章重复的模板段落）时，应传入清理前的正文，
+                     此时缓存键还包含模板内容去除的规则和配置（CLEANING_VERSION）
+
+    Returns:
+        处理结果字典
+    """
+    slot = _CacheSlot(content, namespace, near_duplicate, key_content)
+    cached = await slot.lookup()
+    if cached is not None:
+        return cached
+
+    async def compute_and_store() -> dict:
+        result = await compute()
+        # 有字段缺失的结果不写入缓存，下次重新分析
+        if not result.get('missing_fields'):
+            await slot.store(result)
+        return result
+
+    return await analysis_flight.do(slot.key, compute_and_store)
+
+
+async def analyze_with_silicon_flow(content: str, fields: Optional[Tuple[str, ...]] = None,
+                                    key_content: Optional[str] = None) -> dict:
+    """
+    调用硅基流动API分析新闻内容，相同或近似重复的内容优先返回缓存结果，
+    并发的相同请求只发起一次上游调用
+    
+    Args:
+        content: 新闻内容文本
+        fields: 只生成这些字段（由parse_fields解析），为None时生成全部字段
+        key_content: 计算缓存键所用的内容，默认为content（见cached_call）
+        
+    Returns:
+        包含分析结果的字典（指定fields时只包含content和所需字段）
+    """
+    if fields is not None:
+        namespace = f"{CACHE_NAMESPACES['projection']}:{','.join(fields)}"
+        return await cached_call(content, namespace, lambda: _analyze_projection(content, fields),
+                                 key_content=key_content)
+    if _is_long_article(content):
+        return await cached_call(content, CACHE_NAMESPACES['long'], lambda: _analyze_long(content),
+                                 key_content=key_content)
+    if ANALYSIS_MODE == 'fanout':
+        return await cached_call(content, CACHE_NAMESPACES['fanout'], lambda: _analyze_fanout(content),
+                                 key_content=key_content)
+    if ANALYSIS_MODE == 'cascade':
+        return await cached_call(content, CACHE_NAMESPACES['cascade'], lambda: _analyze_cascade(content),
+                                 key_content=key_content)
+    return await cached_call(content, CACHE_NAMESPACES['single'], lambda: _analyze_uncached(content),
+                             key_content=key_content)
+
+
+async def stream_analysis(content: str, key_content: Optional[str] = None) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    以流式方式调用硅基流动API分析新闻内容，每个字段完整生成后立即产出
+
+    Args:
+        content: 新闻内容文本
+        key_content: 计算缓存键所用的内容，默认为content（见cached_call）
+
+    Yields:
+        (字段名, 字段值)
+    """
+    long_article = _is_long_article(content)
+    slot = _CacheSlot(content, CACHE_NAMESPACES['long' if long_article else ANALYSIS_MODE], key_content=key_content)
+    cached = await slot.lookup()
+    if cached is not None:
+        for name, value in cached.items():
+            yield name, value
+        return
+
+    _check_api_key()
+    fields = {}
+    if long_article:
+        # 长文章先并发摘要各分块，再以流式方式基于摘要生成最终结果
+        fields['content'] = content
+        yield 'content', content
+        summaries = await _summarize_chunks(content)
+        payload = {**_build_payload(summaries, REDUCE_PROMPT_TEMPLATE, ANALYSIS_FIELDS), 'stream': True}
+    elif ANALYSIS_MODE == 'fanout':
+        # 并发模式下每个子提示词完成即产出其负责的字段
+        merged = {}
+        async for part in _gather_parts(content):
+            merged.update(part)
+            for name, value in part.items():
+                yield name, value
+        result = _merge_parts(content, merged)
+        if 'missing_fields' in result:
+            yield 'missing_fields', result['missing_fields']
+        else:
+            await slot.store(result)
+        return
+    elif ANALYSIS_MODE == 'cascade':
+        # 级联模式需校验完整输出后才能决定是否升级，完成后一次性产出全部字段
+        result = await _analyze_cascade(content)
+        for name, value in result.items():
+            yield name, value
+        await slot.store(result)
+        return
+    else:
+        payload = {**_build_payload(content), 'stream': True}
+    parser = IncrementalJSONFields()
+    output = []
+
+    try:
+        response, _ = await _send(payload, _estimate_payload_tokens(payload), stream=True)
+        try:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                # 服务端事件格式: "data: {...}"，以 "data: [DONE]" 结束
+                if not line.startswith('data:'):
+                    continue
+                data = line[5:].strip()
+                if data == '[DONE]':
+                    break
+                chunk = json.loads(data)
+                choices = chunk.get('choices') or [{}]
+                delta = (choices[0].get('delta') or {}).get('content') or ''
+                output.append(delta)
+                for name, value in parser.feed(delta):
+                    value = _normalize_field(name, value)
+                    fields[name] = value
+                    yield name, value
+        finally:
+            await response.aclose()
+    except httpx.HTTPError as e:
+        logger.error(f"流式API调用失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"调用Silicon Flow API失败: {str(e)}")
+    except (json.JSONDecodeError, KeyError, IndexError) as e:
+        logger.error(f"流式API返回格式异常: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"解析API响应失败: {str(e)}")
+
+    if not parser.finished or any(name not in fields for name in ANALYSIS_FIELDS):
+        # 输出被截断或有字段无法增量解析时，容错修复完整输出后补发缺少的字段
+        try:
+            repaired, outcome = _load_output(''.join(output))
+        except ValueError as e:
+            json_repair_stats['failed'] += 1
+            logger.error(f"流式输出的JSON无法修复: {str(e)}")
+            raise HTTPException(status_code=500, detail="解析API响应失败: 输出的JSON不完整")
+        json_repair_stats[outcome] += 1
+        if outcome == 'repaired':
+            logger.warning("流式输出的JSON格式有误，已容错修复")
+        for name, value in repaired.items():
+            if name not in fields:
+                value = _normalize_field(name, value)
+                fields[name] = value
+                yield name, value
+    else:
+        json_repair_stats['clean'] += 1
+    await slot.store(_normalize_analysis({'content': content, **fields}))
@@ -0,0 +1,142 @@
+import os
+import time
+import asyncio
+import tempfile
+import unittest
+
+from job_queue import JobStore, JobQueue, PENDING, RUNNING, SUCCEEDED, FAILED
+
+
+class TestJobStore(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.store = JobStore(os.path.join(self.tmpdir.name, 'jobs.db'))
+
+    def tearDown(self):
+        self.store.close()
+        self.tmpdir.cleanup()
+
+    def test_claim_order_and_max_attempts(self):
+        """按提交顺序认领；租约过期且已达最大执行次数的任务标记为失败"""
+        first = self.store.create({'content': 'a'})
+        time.sleep(0.01)
+        second = self.store.create({'content': 'b'})
+
+        job = self.store.claim(lease=0.05, max_attempts=1)
+        self.assertEqual((job['id'], job['status'], job['attempts']), (first['id'], RUNNING, 1))
+        time.sleep(0.1)
+        job = self.store.claim(lease=60, max_attempts=1)
+        self.assertEqual(job['id'], second['id'])
+        self.assertEqual(self.store.get(first['id'])['status'], FAILED)
+        self.assertIsNone(self.store.claim(lease=60, max_attempts=1))
+
+    def test_reclaim_after_lease_expires(self):
+        """租约未到期时不会被重复认领，到期后重新认领并计入执行次数"""
+        created = self.store.create({'content': 'a'})
+        self.store.claim(lease=0.05, max_attempts=3)
+        self.assertIsNone(self.store.claim(lease=0.05, max_attempts=3))
+        time.sleep(0.1)
+        job = self.store.claim(lease=60, max_attempts=3)
+        self.assertEqual((job['id'], job['attempts']), (created['id'], 2))
+
+    def test_retry_waits_for_delay(self):
+        """退回待处理的任务在等待时间到达前不会被认领"""
+        created = self.store.create({'content': 'a'})
+        self.store.claim(lease=60, max_attempts=3)
+        self.store.retry(created['id'], '熔断中', delay=0.05)
+        self.assertEqual(self.store.get(created['id'])['status'], PENDING)
+        self.assertIsNone(self.store.claim(lease=60, max_attempts=3))
+        time.sleep(0.1)
+        self.assertEqual(self.store.claim(lease=60, max_attempts=3)['attempts'], 2)
+
+
+class TestJobQueue(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.store = JobStore(os.path.join(self.tmpdir.name, 'jobs.db'))
+
+    def tearDown(self):
+        self.store.close()
+        self.tmpdir.cleanup()
+
+    def make_queue(self, handler, **kwargs):
+        options = {'workers': 2, 'lease': 60, 'poll_interval': 0.02, 'retry_delay': 0}
+        options.update(kwargs)
+        return JobQueue(self.store, handler, **options)
+
+    def test_stop_releases_running_jobs(self):
+        """停止时释放运行中的任务，不计入执行次数"""
+        async def run():
+            started = asyncio.Event()
+
+            async def handler(payload):
+                started.set()
+                await asyncio.sleep(60)
+
+            queue = self.make_queue(handler)
+            await queue.start()
+            job = await queue.submit({'content': 'a'})
+            await asyncio.wait_for(started.wait(), timeout=5)
+            await queue.stop()
+            released = self.store.get(job['id'])
+            self.assertEqual((released['status'], released['attempts']), (PENDING, 0))
+        asyncio.run(run())
+
+    def test_get_wait_wakes_on_completion(self):
+        """长轮询在任务完成时立即返回，结束后不残留等待事件"""
+        async def run():
+            proceed = asyncio.Event()
+
+            async def handler(payload):
+                await proceed.wait()
+                return {'title': payload['content']}
+
+            queue = self.make_queue(handler, poll_interval=10)
+            await queue.start()
+            job = await queue.submit({'content': 'a'})
+            # 超时返回的长轮询同样清理等待事件
+            self.assertEqual((await queue.get(job['id'], wait=0.05))['status'], RUNNING)
+            self.assertEqual((queue._finished, queue._waiters), ({}, {}))
+
+            waiting = asyncio.ensure_future(queue.get(job['id'], wait=5))
+            await asyncio.sleep(0.05)
+            started = time.monotonic()
+            proceed.set()
+            finished = await waiting
+            self.assertLess(time.monotonic() - started, 1)
+            self.assertEqual((finished['status'], finished['result']), (SUCCEEDED, {'title': 'a'}))
+            self.assertEqual((queue._finished, queue._waiters), ({}, {}))
+            await queue.stop()
+        asyncio.run(run())
+
+    def test_transient_errors_are_retried(self):
+        """暂时性错误退回待处理状态重试，直到最大执行次数；其他错误直接失败"""
+        async def run():
+            calls = {}
+
+            async def handler(payload):
+                calls[payload['content']] = calls.get(payload['content'], 0) + 1
+                if payload['content'] == 'flaky' and calls['flaky'] < 2:
+                    raise ConnectionError('熔断中')
+                if payload['content'] == 'down':
+                    raise ConnectionError('熔断中')
+                if payload['content'] == 'bad':
+                    raise ValueError('内容格式错误')
+                return {'title': payload['content']}
+
+            queue = self.make_queue(handler, max_attempts=3,
+                                    is_transient=lambda e: isinstance(e, ConnectionError))
+            await queue.start()
+            jobs = {content: await queue.submit({'content': content}) for content in ('flaky', 'down', 'bad')}
+            results = {content: await queue.get(job['id'], wait=5) for content, job in jobs.items()}
+            await queue.stop()
+
+            self.assertEqual((results['flaky']['status'], results['flaky']['attempts']), (SUCCEEDED, 2))
+            self.assertEqual((results['down']['status'], results['down']['attempts']), (FAILED, 3))
+            self.assertEqual((results['bad']['status'], results['bad']['attempts']), (FAILED, 1))
+            self.assertEqual(calls, {'flaky': 2, 'down': 3, 'bad': 1})
+        asyncio.run(run())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,150 @@
+import json
+import asyncio
+import unittest
+
+import httpx
+
+from circuit_breaker import CircuitBreaker, CircuitOpenError, OPEN
+from mock_coze import create_app
+from news_rewriter import NewsRewriter
+from retry_policy import RetryPolicy
+
+CONTENT = '澳门特区政府日前公布新一轮旅游推广计划。'
+
+
+def sse(*events) -> bytes:
+    """按Coze stream_run的格式拼接服务端事件"""
+    return ''.join(f"id: {index}\nevent: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+                   for index, (event, data) in enumerate(events)).encode('utf-8')
+
+
+class TestNewsRewriter(unittest.TestCase):
+    def rewrite(self, handler, **kwargs):
+        async def run():
+            rewriter = NewsRewriter(transport=httpx.MockTransport(handler),
+                                    retry_policy=RetryPolicy('coze', base_delay=0.01), **kwargs)
+            try:
+                return await rewriter.rewrite_news(CONTENT)
+            finally:
+                await rewriter.aclose()
+        return asyncio.run(run())
+
+    def test_content_sent_once(self):
+        """内容只按输入变量名发送一次，请求体为不转义中文的UTF-8"""
+        requests = []
+
+        def handler(request):
+            requests.append(request)
+            return httpx.Response(200, json={'code': 0, 'data': json.dumps({'news': '重写后'}), 'usage': {}})
+
+        result = self.rewrite(handler, input_parameter='content', parameters={'style': '简洁'})
+        self.assertEqual(result['rewritten_content'], '重写后')
+        body = requests[0].content
+        self.assertEqual(requests[0].url.path, '/v1/workflow/run')
+        self.assertEqual(body.count(CONTENT.encode('utf-8')), 1)
+        self.assertEqual(json.loads(body)['parameters'], {'style': '简洁', 'content': CONTENT})
+
+    def test_retry_policy_sets_attempts(self):
+        """未指定max_retries时按重试策略的最大尝试次数重试"""
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            return httpx.Response(503)
+
+        async def run():
+            rewriter = NewsRewriter(transport=httpx.MockTransport(handler),
+                                    retry_policy=RetryPolicy('coze', max_attempts=5, base_delay=0.01))
+            try:
+                return await rewriter.rewrite_news(CONTENT)
+            finally:
+                await rewriter.aclose()
+        self.assertIsNone(asyncio.run(run()))
+        self.assertEqual(len(calls), 5)
+
+    def test_stream_run(self):
+        """流式执行时拼接结束节点的消息，中间节点的输出不计入结果"""
+        def handler(request):
+            self.assertEqual(request.url.path, '/v1/workflow/stream_run')
+            return httpx.Response(200, content=sse(
+                ('Message', {'node_title': '输出', 'content': '中间结果', 'node_is_finish': True}),
+                ('PING', {}),
+                ('Message', {'node_title': 'End', 'content': '{"news": "重写', 'node_is_finish': False}),
+                ('Message', {'node_title': 'End', 'content': '后"}', 'node_is_finish': True,
+                             'usage': {'token_count': 10}}),
+                ('Done', {'debug_url': 'https://www.coze.cn/debug'})
+            ), headers={'content-type': 'text/event-stream'})
+
+        result = self.rewrite(handler, run_mode='stream')
+        self.assertEqual(result['rewritten_content'], '重写后')
+        self.assertEqual(result['usage'], {'token_count': 10})
+
+    def test_stream_error_retried(self):
+        """流式执行收到Error事件时按可重试错误处理"""
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            if len(calls) == 1:
+                return httpx.Response(200, content=sse(('Error', {'error_code': 4013, 'error_message': '限流'})))
+            return httpx.Response(200, content=sse(('Message', {'node_title': 'End', 'content': '{"news": "好"}'}),
+                                                   ('Done', {})))
+
+        self.assertEqual(self.rewrite(handler, run_mode='stream')['rewritten_content'], '好')
+        self.assertEqual(len(calls), 2)
+
+    def test_workflow_errors_open_breaker(self):
+        """工作流返回错误码（HTTP 200或流式Error事件）计为熔断器失败，限流错误码不计"""
+        for run_mode, response in (
+                ('run', lambda: httpx.Response(200, json={'code': 720701013, 'msg': '工作流执行失败'})),
+                ('stream', lambda: httpx.Response(200, content=sse(('Error', {'error_code': 720701013}))))):
+            breaker = CircuitBreaker('coze', window_size=4, min_calls=2, failure_rate=0.5)
+            with self.subTest(run_mode=run_mode), self.assertRaises(CircuitOpenError):
+                self.rewrite(lambda request: response(), run_mode=run_mode, circuit_breaker=breaker)
+            self.assertEqual(breaker.state, OPEN)
+
+        breaker = CircuitBreaker('coze', window_size=4, min_calls=2, failure_rate=0.5)
+        rate_limited = self.rewrite(lambda request: httpx.Response(200, json={'code': 4013, 'msg': '限流'}),
+                                    circuit_breaker=breaker)
+        self.assertIsNone(rate_limited)
+        self.assertEqual(breaker.status()['window_calls'], 0)
+
+    def rewrite_async(self, app, **kwargs):
+        async def run():
+            rewriter = NewsRewriter(transport=httpx.ASGITransport(app=app), run_mode='async', poll_initial_delay=0.02,
+                                    poll_max_delay=0.1, retry_policy=RetryPolicy('coze', base_delay=0.01), **kwargs)
+            try:
+                return await rewriter.rewrite_news(CONTENT), rewriter.stats()
+            finally:
+                await rewriter.aclose()
+        return asyncio.run(run())
+
+    def test_async_poll(self):
+        """异步提交后轮询执行记录，执行完成前不重新提交"""
+        app = create_app(run_seconds=0.3)
+        result, stats = self.rewrite_async(app)
+        self.assertEqual(result['rewritten_content'], '（重写）' + CONTENT)
+        self.assertEqual(app.state.counters['async'], 1)
+        self.assertGreater(stats['polls'], 1)
+        self.assertEqual(stats['pending'], 0)
+        self.assertEqual(stats['succeeded'], 1)
+
+    def test_async_failed_run_resubmitted(self):
+        """执行失败时重新提交"""
+        app = create_app(run_seconds=0.05, fail_first=1)
+        result, stats = self.rewrite_async(app)
+        self.assertEqual(result['rewritten_content'], '（重写）' + CONTENT)
+        self.assertEqual(app.state.counters['async'], 2)
+        self.assertEqual(stats['failed'], 1)
+
+    def test_async_timeout(self):
+        """超过async_timeout仍未完成时放弃等待"""
+        app = create_app(run_seconds=5)
+        result, stats = self.rewrite_async(app, async_timeout=0.2)
+        self.assertIsNone(result)
+        self.assertEqual(stats['timeouts'], 1)
+        self.assertEqual(app.state.counters['async'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
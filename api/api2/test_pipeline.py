@@ -0,0 +1,147 @@
+import json
+import asyncio
+import unittest
+from unittest import mock
+
+import httpx
+from fastapi import HTTPException
+
+import main
+import silicon_flow_analyzer as analyzer
+from mock_upstream import build_output
+from retry_policy import RetryPolicy
+
+CONTENT = '澳门特区政府日前公布新一轮旅游推广计划，将围绕国际客源市场拓展、文旅融合产品开发和智慧旅游建设三个方向推出多项措施。'
+REWRITTEN = '澳门特区政府近日推出新一轮旅游推广计划，从国际客源市场、文旅融合产品和智慧旅游建设三方面推出多项措施。'
+
+
+def completion(text: str) -> httpx.Response:
+    """OpenAI兼容接口的聊天补全响应"""
+    return httpx.Response(200, json={'choices': [{'message': {'content': text}}], 'usage': {'total_tokens': 100}})
+
+
+def requested_output(request: httpx.Request) -> dict:
+    """按请求的提示词生成示例输出（见mock_upstream.build_output）"""
+    prompt = json.loads(request.content)['messages'][-1]['content']
+    return json.loads(build_output(prompt))
+
+
+class PipelineTestCase(unittest.TestCase):
+    """以httpx.MockTransport替代上游，关闭缓存、对冲、熔断和限流"""
+
+    def setUp(self):
+        patches = [
+            mock.patch.object(analyzer, 'SILICON_FLOW_API_KEY', 'sk-test'),
+            mock.patch.object(analyzer, 'analysis_cache', None),
+            mock.patch.object(analyzer, 'near_duplicate_index', None),
+            mock.patch.object(analyzer, 'silicon_flow_hedger', None),
+            mock.patch.object(analyzer, 'silicon_flow_retry', RetryPolicy('silicon_flow', base_delay=0.01)),
+            mock.patch.object(analyzer, 'ANALYSIS_MODE', 'single'),
+            mock.patch.dict(analyzer.config, {'json_reask_enabled': False})
+        ]
+        for backend in analyzer.silicon_flow_router.backends:
+            patches += [mock.patch.object(backend, 'breaker', None), mock.patch.object(backend, 'limiter', None)]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.requests = []
+
+    def run_analyzer(self, handler, call):
+        """以handler作为上游执行call()"""
+        def record(request: httpx.Request) -> httpx.Response:
+            self.requests.append(json.loads(request.content))
+            return handler(request)
+
+        async def run():
+            await analyzer.start_http_client(transport=httpx.MockTransport(record))
+            try:
+                return await call()
+            finally:
+                await analyzer.close_http_client()
+        return asyncio.run(run())
+
+
+class TestCombinedOutput(PipelineTestCase):
+    def combined(self, handler, fields=None):
+        return self.run_analyzer(handler, lambda: analyzer.rewrite_and_analyze_combined(CONTENT, fields))
+
+    def test_parse_output(self):
+        """输出中的重写内容和分析字段分别返回，content为重写前的内容；重写内容计入max_tokens"""
+        def handler(request):
+            output = dict(requested_output(request), rewritten_content=f'  {REWRITTEN}\n')
+            return completion(json.dumps(output, ensure_ascii=False))
+
+        result = self.combined(handler)
+        self.assertEqual(result['rewritten_content'], REWRITTEN)
+        self.assertEqual(result['content'], CONTENT)
+        self.assertEqual(result['categoryName'], '澳闻')
+        self.assertEqual(set(result), {'rewritten_content', 'content', *analyzer.ANALYSIS_FIELDS})
+        analysis_only = analyzer._build_payload(CONTENT, analyzer._combined_template(analyzer.ANALYSIS_FIELDS),
+                                                analyzer.ANALYSIS_FIELDS)
+        self.assertGreater(self.requests[0]['max_tokens'], analysis_only['max_tokens'])
+
+    def test_fenced_and_projected_output(self):
+        """代码块包裹的输出经容错解析，字段投影时只返回所需字段"""
+        def handler(request):
+            return completion(f"```json\n{json.dumps(requested_output(request), ensure_ascii=False)}\n```")
+
+        result = self.combined(handler, ('title', 'keywords'))
+        self.assertEqual(set(result), {'rewritten_content', 'content', 'title', 'keywords'})
+        self.assertEqual(result['rewritten_content'], CONTENT)
+        prompt = self.requests[0]['messages'][-1]['content']
+        self.assertEqual(set(json.loads(build_output(prompt))), {'rewritten_content', 'title', 'keywords'})
+
+    def test_missing_rewrite_rejected(self):
+        """输出中没有重写内容时报错，不把分析结果当作重写结果返回"""
+        for output in ({}, {'rewritten_content': ' '}, {'rewritten_content': ['段落']}):
+            with self.subTest(output=output):
+                def handler(request):
+                    fields = requested_output(request)
+                    del fields['rewritten_content']
+                    return completion(json.dumps({**fields, **output}, ensure_ascii=False))
+
+                with self.assertRaises(HTTPException) as raised:
+                    self.combined(handler)
+                self.assertEqual(raised.exception.status_code, 500)
+
+    def test_long_article_does_not_fit(self):
+        """长文章的重写输出过长，不使用合并模式"""
+        self.assertTrue(analyzer.combined_rewrite_fits(CONTENT))
+        with mock.patch.dict(analyzer.config, {'long_article_enabled': True, 'long_article_threshold': 10}):
+            self.assertFalse(analyzer.combined_rewrite_fits(CONTENT))
+
+
+class TestPipelineMode(PipelineTestCase):
+    def process(self, pipeline_mode, fits=True):
+        """按pipeline_mode处理一篇新闻，返回响应数据和重写客户端"""
+        rewriter = mock.Mock(rewrite_news=mock.AsyncMock(return_value={'rewritten_content': REWRITTEN}))
+        with mock.patch.dict(main.config, {'pipeline_mode': pipeline_mode}), \
+                mock.patch.object(main, 'combined_rewrite_fits', return_value=fits):
+            data = self.run_analyzer(lambda request: completion(json.dumps(requested_output(request),
+                                                                           ensure_ascii=False)),
+                                     lambda: main.process_news(CONTENT, rewriter))
+        return data, rewriter
+
+    def test_combined_skips_coze(self):
+        """合并模式只调用一次大模型，不经过Coze工作流"""
+        data, rewriter = self.process('combined')
+        rewriter.rewrite_news.assert_not_called()
+        self.assertEqual(len(self.requests), 1)
+        self.assertEqual((data.original_content, data.rewritten_content), (CONTENT, CONTENT))
+        self.assertFalse(data.degraded)
+
+    def test_fallback_to_two_calls(self):
+        """合并模式下内容不适合一次调用时，与two_call一样先经Coze重写再分析重写后的内容"""
+        for pipeline_mode, fits in (('combined', False), ('two_call', True)):
+            self.requests.clear()
+            with self.subTest(pipeline_mode=pipeline_mode, fits=fits):
+                data, rewriter = self.process(pipeline_mode, fits)
+                rewriter.rewrite_news.assert_awaited_once_with(CONTENT)
+                self.assertEqual(len(self.requests), 1)
+                self.assertIn(REWRITTEN, self.requests[0]['messages'][-1]['content'])
+                self.assertEqual(data.rewritten_content, REWRITTEN)
+                self.assertEqual(data.categoryName, '澳闻')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,9 @@
 import json
 import logging
-import time
 import requests
-from typing import Dict
+from typing import Dict, Optional
+
+from retry_policy import RetryPolicy, RetryableError, DeadlineExceeded, is_retryable_status, parse_retry_after
 
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -16,7 +17,8 @@ API_MODEL = 'Qwen/Qwen2.5-32B-Instruct'
 class NewsSummarizer:
     """新闻概要生成器"""
     
-    def __init__(self, api_key: str = API_KEY, api_url: str = API_URL, api_model: str = API_MODEL):
+    def __init__(self, api_key: str = API_KEY, api_url: str = API_URL, api_model: str = API_MODEL,
+                 retry_policy: Optional[RetryPolicy] = None):
         self.api_key = api_key
         self.api_url = api_url
         self.api_model = api_model
@@ -25,6 +27,8 @@ class NewsSummarizer:
             'Content-Type': 'application/json',
             'Accept': 'application/json'
         }
+        # 重试策略：连接失败、超时、429和5xx按指数退避加抖动重试
+        self.retry_policy = retry_policy or RetryPolicy('silicon_flow', max_attempts=3, base_delay=2)
 
     def _create_prompt(self, content: str) -> str:
         """创建提示词"""
@@ -56,34 +60,37 @@ class NewsSummarizer:
             ]
         }
 
-        max_retries = 3
-        retry_delay = 2
-        
-        for retry in range(max_retries):
+        def attempt(timeout: float) -> Dict:
             try:
                 response = requests.post(
                     f"{self.api_url}/chat/completions",
                     json=payload,
                     headers=self.headers,
-                    timeout=(10, 30)
+                    timeout=(min(10, timeout), timeout)
                 )
-                response.raise_for_status()
-                result = response.json()
-                
-                # 解析返回的JSON内容
-                analysis_result = json.loads(result['choices'][0]['message']['content'])
-                return {
-                    'summary': analysis_result.get('summary', '')[:150],
-                    'aiIntroduction': analysis_result.get('aiIntroduction', '')[:200]
-                }
-                
             except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
-                if retry == max_retries - 1:
-                    raise Exception(f"API调用失败，已重试{max_retries}次: {str(e)}")
-                time.sleep(retry_delay)
-                retry_delay *= 2
-            except Exception as e:
-                raise Exception(f"API调用或处理失败: {str(e)}")
+                raise RetryableError(str(e)) from e
+            if is_retryable_status(response.status_code):
+                raise RetryableError(f"HTTP {response.status_code}", parse_retry_after(response.headers.get('Retry-After')))
+            response.raise_for_status()
+            return response.json()
+
+        try:
+            result = self.retry_policy.run_sync(attempt)
+        except (RetryableError, DeadlineExceeded) as e:
+            raise Exception(f"API调用失败，重试后仍未成功: {str(e)}")
+        except Exception as e:
+            raise Exception(f"API调用或处理失败: {str(e)}")
+
+        try:
+            # 解析返回的JSON内容
+            analysis_result = json.loads(result['choices'][0]['message']['content'])
+            return {
+                'summary': analysis_result.get('summary', '')[:150],
+                'aiIntroduction': analysis_result.get('aiIntroduction', '')[:200]
+            }
+        except Exception as e:
+            raise Exception(f"API调用或处理失败: {str(e)}")
 
     def analyze(self, content: str) -> Dict[str, str]:
         """